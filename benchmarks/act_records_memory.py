@@ -0,0 +1,61 @@
+"""
+Benchmark the memory used to hold parsed acts in memory.
+Compare the previous representation, one dictionary per act,
+with the current one, one slotted Act record per act with interned region names and dates.
+The acts of a day are loaded several times, to simulate holding many days in memory.
+
+Usage:
+    python3 benchmarks/act_records_memory.py PATH_TO_ACTS_JSONL [--copies N]
+"""
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+# pylint: disable=wrong-import-position
+from utils.act_record import Act
+
+
+def measure(load: Callable[[], list]) -> tuple[int, int]:
+    """Return the number of objects loaded and the memory they use, in bytes."""
+    tracemalloc.start()
+    objects = load()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(objects), memory
+
+
+@click.command()
+@click.argument("path_to_acts", type=click.Path(exists=True, dir_okay=False))
+@click.option("-c", "--copies", type=int, default=250)
+def main(path_to_acts: str, copies: int) -> None:
+    """Load the acts as dictionaries and as records, print the memory used by each one."""
+    with open(path_to_acts, "r", encoding="utf-8") as file:
+        lines = file.read().splitlines() * copies
+
+    # Each line is decoded again, as if every act had been parsed from a pdf
+    def dicts() -> list[dict]:
+        return [json.loads(line) for line in lines]
+
+    def records() -> list[Act]:
+        return [Act.from_dict(json.loads(line)) for line in lines]
+
+    # Both representations must hold the same acts
+    assert [Act.from_dict(d) for d in dicts()[:1000]] == records()[:1000]
+
+    print(f"{path_to_acts} x {copies}")
+    for name, load in [("dict", dicts), ("Act", records)]:
+        num_of_acts, memory = measure(load)
+        print(
+            f"  {name:<6} {num_of_acts} acts, {memory / 1024**2:.1f} MB,"
+            + f" {memory / num_of_acts:.0f} B per act"
+        )
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,70 @@
+"""
+Benchmark the removal of the headers and footnotes from the text of a pdf of the BORME registry.
+Compare the previous implementation, which split and searched the whole text once per pattern,
+with the current implementation, which classifies every line against all the patterns
+in a single pass.
+
+Usage:
+    python3 benchmarks/drop_headers_and_footnotes.py PATH_TO_PDF [--number N]
+"""
+import logging
+import re
+import sys
+from datetime import date
+from pathlib import Path
+from timeit import repeat
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+# pylint: disable=wrong-import-position
+from crawler import drop_headers_and_footnotes, get_headers_and_footnotes_patterns
+from utils.write_and_read_files import read_pdf
+
+
+def previous_drop_headers_and_footnotes(pdf_text: str, num_of_pages: int) -> str:
+    """Previous implementation: one split and one re.search per line for each pattern."""
+    line_patterns, (section_header, _) = get_headers_and_footnotes_patterns(
+        num_of_pages
+    )
+    result_text = pdf_text
+    for pattern, _ in line_patterns:
+        lines = result_text.split("\n")
+        filtered_lines = [line for line in lines if not re.search(pattern, line)]
+        result_text = "\n".join(filtered_lines)
+
+    section_free_text = re.sub(section_header, "", result_text)
+
+    return section_free_text.strip()
+
+
+@click.command()
+@click.argument("path_to_pdf", type=click.Path(exists=True, dir_okay=False))
+@click.option("-n", "--number", type=int, default=100)
+def main(path_to_pdf: str, number: int) -> None:
+    """Time both implementations on the text of the same pdf, print the time per call."""
+    # Unexpected number of matches are irrelevant for the benchmark
+    logging.disable(logging.WARNING)
+
+    num_of_pages, pages_text = read_pdf(path_to_pdf)
+    pdf_text = "".join(pages_text)
+    date_ = date.today()
+
+    def current() -> str:
+        return drop_headers_and_footnotes(pdf_text, num_of_pages, date_, path_to_pdf)
+
+    def previous() -> str:
+        return previous_drop_headers_and_footnotes(pdf_text, num_of_pages)
+
+    # Both implementations must return the same result
+    assert current() == previous()
+
+    print(f"{path_to_pdf}: {num_of_pages} pages, {len(pdf_text.splitlines())} lines")
+    for name, func in [("previous", previous), ("current", current)]:
+        best = min(repeat(func, number=number, repeat=3)) / number
+        print(f"  {name:<10} {best * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,49 @@
+"""
+Benchmark the extraction of the links to the pdfs from saved BORME index pages.
+Compare the previous implementation, which builds the whole BeautifulSoup tree of the page,
+with the current one, which scans the page once with an html parser without building any tree.
+Both implementations return the same list of links, as checked by tests/test_borme_website.py
+on a sample page, and the pages whose links differ are reported.
+
+Usage:
+    python3 benchmarks/extract_pdf_links.py PATH_TO_HTML [PATH_TO_HTML ...] [--number N]
+"""
+import sys
+from pathlib import Path
+from timeit import repeat
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+# pylint: disable=wrong-import-position
+from utils.borme_website import extract_pdf_hrefs, extract_pdf_hrefs_with_soup
+
+
+@click.command()
+@click.argument(
+    "paths_to_html",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+)
+@click.option("-n", "--number", type=int, default=20)
+def main(paths_to_html: tuple[str, ...], number: int) -> None:
+    """Print the time per page of both implementations."""
+    for path in paths_to_html:
+        content = Path(path).read_bytes()
+        soup_hrefs = extract_pdf_hrefs_with_soup(content)
+        if extract_pdf_hrefs(content) != soup_hrefs:
+            print(f"{path}: the links are different")
+
+        print(f"{path}: {len(content) / 1024:.0f} KB, {len(soup_hrefs)} links")
+        for name, func in [
+            ("soup", extract_pdf_hrefs_with_soup),
+            ("scan", extract_pdf_hrefs),
+        ]:
+            best = min(repeat(lambda: func(content), number=number, repeat=3)) / number
+            print(f"  {name:<10} {best * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
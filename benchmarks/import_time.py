@@ -0,0 +1,79 @@
+"""
+Benchmark the startup of the scripts: the time spent importing each one,
+measured with `python -X importtime`, and the heavy dependencies that it loads.
+The crawler must start without loading the http and html stack (requests, urllib3, bs4),
+and no script should load pypdf, jsonlines or pyfiglet before using them.
+
+Usage:
+    python3 benchmarks/import_time.py [SCRIPT ...] [--number N]
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import click
+
+BORME_DIR = Path(__file__).parent.parent / "src" / "borme"
+
+HEAVY_PACKAGES = ("requests", "urllib3", "bs4", "pypdf", "jsonlines", "pyfiglet")
+# Packages that each script must not load when it is imported
+FORBIDDEN_PACKAGES = {
+    "crawler": {"requests", "urllib3", "bs4", "pypdf", "jsonlines", "pyfiglet"},
+    "company_lookup": {"requests", "urllib3", "bs4", "pypdf", "jsonlines", "pyfiglet"},
+    "spyder": {"bs4", "pypdf", "jsonlines", "pyfiglet"},
+    "main": {"bs4", "pypdf", "jsonlines", "pyfiglet"},
+}
+
+
+def import_time(module: str) -> tuple[float, dict[str, float]]:
+    """
+    Import the module in a new interpreter with -X importtime,
+    return the total import time of the module and the cumulative time of each top level package,
+    in milliseconds.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BORME_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    packages: dict[str, float] = {}
+    total = 0.0
+    # Each line is: import time: self [us] | cumulative | imported package
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name.split(".")[0] == name:
+            packages[name] = int(cumulative) / 1000
+        if name == module:
+            total = int(cumulative) / 1000
+    return total, packages
+
+
+@click.command()
+@click.argument("scripts", nargs=-1)
+@click.option("-n", "--number", type=int, default=5)
+def main(scripts: tuple[str, ...], number: int) -> None:
+    """Print the best import time of every script and the heavy packages it loads."""
+    failed = False
+    for script in scripts or tuple(FORBIDDEN_PACKAGES):
+        runs = [import_time(script) for _ in range(number)]
+        total, packages = min(runs, key=lambda run: run[0])
+        loaded = [name for name in HEAVY_PACKAGES if name in packages]
+        print(
+            f"{script:<16}{total:>8.1f} ms   loads: "
+            + (", ".join(f"{name} ({packages[name]:.1f} ms)" for name in loaded) or "-")
+        )
+        forbidden = FORBIDDEN_PACKAGES.get(script, set()).intersection(loaded)
+        if forbidden:
+            print(f"  {script} should not load {', '.join(sorted(forbidden))}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
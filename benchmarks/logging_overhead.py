@@ -0,0 +1,79 @@
+"""
+Benchmark the time spent by the threads that log a warning,
+e.g. log_unexpected_num_of_matches, which is logged for many pdfs.
+Compare the previous setup, where the root logger writes each record to the log file and stderr
+in the thread that logs it, with the current one, where the record is only put in a queue
+and a listener thread writes it.
+
+Usage:
+    python3 benchmarks/logging_overhead.py [--records N] [--threads N]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from logging import FileHandler, Formatter, StreamHandler, getLogger
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+
+def log_records(num_of_records: int, threads: int) -> float:
+    """Log the records from several threads, return the seconds spent logging them."""
+    # pylint: disable=import-outside-toplevel
+    from logs import log_unexpected_num_of_matches
+
+    def log(_) -> None:
+        for i in range(num_of_records // threads):
+            log_unexpected_num_of_matches(
+                "Verificable en https://www.boe.es", i, 50, date(2023, 11, 27), "a.pdf"
+            )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(log, range(threads)))
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("-n", "--records", type=int, default=20_000)
+@click.option("-t", "--threads", type=int, default=4)
+def main(records: int, threads: int) -> None:
+    """Print the time per record spent by the logging threads, with and without the queue."""
+    data_dir = tempfile.mkdtemp()
+    os.environ["BORME_DATA_DIR"] = data_dir
+    # pylint: disable=import-outside-toplevel
+    from logs import TEXT_LOG_FORMAT, set_up_root_logger
+
+    # Keep the terminal clean, the records printed to stderr are discarded.
+    # It stays open until the listener has written every record, when the process exits
+    # pylint: disable-next=consider-using-with
+    sys.stderr = open(os.devnull, "w", encoding="utf-8")
+
+    # Previous setup: the handlers write each record in the thread that logs it
+    root_logger = getLogger()
+    handlers = [FileHandler(f"{data_dir}/sync.log"), StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(Formatter(TEXT_LOG_FORMAT))
+        root_logger.addHandler(handler)
+    root_logger.setLevel("INFO")
+    sync_seconds = log_records(records, threads)
+    for handler in handlers:
+        root_logger.removeHandler(handler)
+        handler.close()
+
+    # Current setup: the records are put in a queue, written by the listener thread
+    set_up_root_logger()
+    queue_seconds = log_records(records, threads)
+
+    print(f"{records} records, {threads} threads")
+    for name, seconds in [("handlers", sync_seconds), ("queue", queue_seconds)]:
+        print(f"  {name:<10} {seconds * 1e6 / records:.1f} us per record")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,82 @@
+"""
+Benchmark the parsing of the descriptions of all the acts of a day into their entries.
+Compare a naive implementation, which searches the description once per kind of entry,
+with the current implementation, which finds the start of every entry
+with a single regex in a single pass.
+
+Usage:
+    python3 benchmarks/parse_act_descriptions.py PATH_TO_ACTS_JSONL [--number N]
+"""
+import re
+import sys
+from pathlib import Path
+from timeit import repeat
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+# pylint: disable=wrong-import-position
+from utils.act_description import (
+    ENTRY_KINDS,
+    ActEntry,
+    _parse_fields,
+    parse_act_description,
+)
+from utils.write_and_read_files import read_jsonl_to_list_of_dict
+
+# One pattern per kind of entry, as a parser written with a regex per kind would do
+KIND_PATTERNS = [
+    (kind, re.compile(r"(?:^|(?<=\s))" + re.escape(kind) + r"\."))
+    for kind in ENTRY_KINDS
+]
+
+
+def naive_parse_act_description(description: str) -> list[ActEntry]:
+    """Naive implementation: one pass over the description per kind of entry."""
+    starts = []
+    for kind, pattern in KIND_PATTERNS:
+        for match in pattern.finditer(description):
+            # A kind that is the prefix of another one matches at the same position
+            if not any(start == match.start() for start, _, _ in starts):
+                starts.append((match.start(), match.end(), kind))
+            elif len(kind) > next(len(k) for s, _, k in starts if s == match.start()):
+                starts = [s for s in starts if s[0] != match.start()]
+                starts.append((match.start(), match.end(), kind))
+    starts.sort()
+
+    entries = []
+    ends = [start for start, _, _ in starts[1:]] + [len(description)]
+    for (_, end_of_kind, kind), end in zip(starts, ends):
+        text = " ".join(description[end_of_kind:end].split())
+        entries.append(ActEntry(kind, text, _parse_fields(kind, text)))
+    return entries
+
+
+@click.command()
+@click.argument("path_to_acts", type=click.Path(exists=True, dir_okay=False))
+@click.option("-n", "--number", type=int, default=10)
+def main(path_to_acts: str, number: int) -> None:
+    """Time both implementations on the descriptions of the acts of the same day."""
+    descriptions = [
+        act["description"] for act in read_jsonl_to_list_of_dict(path_to_acts)
+    ]
+
+    def current() -> list[list[ActEntry]]:
+        return [parse_act_description(d) for d in descriptions]
+
+    def naive() -> list[list[ActEntry]]:
+        return [naive_parse_act_description(d) for d in descriptions]
+
+    # Both implementations must return the same entries
+    assert current() == naive()
+
+    num_of_entries = sum(len(entries) for entries in current())
+    print(f"{path_to_acts}: {len(descriptions)} acts, {num_of_entries} entries")
+    for name, func in [("naive", naive), ("current", current)]:
+        best = min(repeat(func, number=number, repeat=3)) / number
+        print(f"  {name:<10} {best * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,56 @@
+"""
+Benchmark the reading of a pdf of the BORME registry.
+Compare the previous implementation, which opened the pdf twice
+and joined the text of the pages with a reduce of string concatenations,
+with the current implementation, which reads the pdf once with read_pdf.
+
+Usage:
+    python3 benchmarks/read_pdf.py PATH_TO_PDF [--repeat N]
+
+The difference is more noticeable on long pdfs (hundreds of pages).
+"""
+import sys
+from functools import reduce
+from pathlib import Path
+from timeit import repeat
+
+import click
+from pypdf import PdfReader
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+from utils.write_and_read_files import read_pdf  # pylint: disable=wrong-import-position
+
+
+def read_pdf_twice(path_to_pdf: str) -> tuple[int, str]:
+    """Previous implementation: one reader for the text and another for the num of pages."""
+    reader = PdfReader(path_to_pdf)
+    pages_text = [page.extract_text() for page in reader.pages]
+    pdf_text = reduce(lambda x, y: x + y, pages_text)
+    num_of_pages = len(PdfReader(path_to_pdf).pages)
+    return num_of_pages, pdf_text
+
+
+def read_pdf_once(path_to_pdf: str) -> tuple[int, str]:
+    """Current implementation: a single reader, linear time join."""
+    num_of_pages, pages_text = read_pdf(path_to_pdf)
+    return num_of_pages, "".join(pages_text)
+
+
+@click.command()
+@click.argument("path_to_pdf", type=click.Path(exists=True, dir_okay=False))
+@click.option("-r", "--repeat", "repeat_", type=int, default=3)
+def main(path_to_pdf: str, repeat_: int) -> None:
+    """Time both implementations on the same pdf, print the best time of each one."""
+    # Both implementations must return the same result
+    assert read_pdf_twice(path_to_pdf) == read_pdf_once(path_to_pdf)
+
+    num_of_pages, _ = read_pdf_once(path_to_pdf)
+    print(f"{path_to_pdf}: {num_of_pages} pages")
+    for func in [read_pdf_twice, read_pdf_once]:
+        best = min(repeat(lambda: func(path_to_pdf), number=1, repeat=repeat_))
+        print(f"  {func.__name__:<16} {best:.3f} s")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,71 @@
+"""
+Record a corpus of BORME index pages and pdfs, to be replayed by the benchmarks.
+The files are saved under the corpus directory with the path of their url,
+e.g. CORPUS/borme/dias/2023/11/27/index.php and CORPUS/borme/dias/2023/11/27/pdfs/*.pdf,
+so the corpus can be served as is by any static http server.
+
+Usage:
+    python3 benchmarks/record_corpus.py DATES... [--corpus DIR] [--base-url URL]
+"""
+import os
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+import click
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+DEFAULT_CORPUS_DIR = Path(__file__).parent / "corpus"
+
+
+def get_corpus_path(corpus_dir: Path, url: str) -> Path:
+    """Return the path of the file of a url inside the corpus."""
+    return corpus_dir / urlparse(url).path.lstrip("/")
+
+
+@click.command()
+@click.argument("input_dates", nargs=-1, required=True)
+@click.option(
+    "--corpus",
+    "corpus_dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=DEFAULT_CORPUS_DIR,
+    help="Directory of the corpus. Defaults to benchmarks/corpus.",
+)
+@click.option(
+    "--base-url",
+    default="https://www.boe.es",
+    help="Url of the website to record. Defaults to https://www.boe.es.",
+)
+def main(input_dates: tuple[str, ...], corpus_dir: Path, base_url: str) -> None:
+    """Save the index page and the pdfs of every date (YYYYMMDD or ranges) to the corpus."""
+    # The base url is read when the modules are imported
+    os.environ["BORME_BASE_URL"] = base_url
+    # pylint: disable=import-outside-toplevel
+    from spyder import get_pdf_urls
+    from utils.borme_website import construct_borme_daily_url, download_pdf, get_session
+    from utils.type_casting import uniq_dates_in_list
+
+    session = get_session()
+    for date_ in uniq_dates_in_list(input_dates):
+        pdf_urls = get_pdf_urls(date_, session=session)
+        if len(pdf_urls) == 0:
+            continue
+
+        index_url = construct_borme_daily_url(date_)
+        index_path = get_corpus_path(corpus_dir, index_url)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.write_bytes(session.get(index_url, timeout=5).content)
+
+        num_of_bytes = 0
+        for url in pdf_urls:
+            path = get_corpus_path(corpus_dir, url)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            entry = download_pdf(url, str(path), date_, session=session)
+            num_of_bytes += entry["size"]
+        print(f"{date_}: {len(pdf_urls)} pdfs, {num_of_bytes / 1024**2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,350 @@
+"""
+Benchmark the whole pipeline and its main stages on a recorded corpus of BORME pages and pdfs
+(see record_corpus.py), replayed by a local http server, so that the results do not depend
+on the network and can be compared between commits.
+
+The stages get_pdf_urls, parse_pdf, drop_headers_and_footnotes, split_text_by_acts
+and parse_act are timed in this process, on every date and pdf of the corpus.
+The end to end throughput is measured by running main.py on every date of the corpus,
+in a subprocess with a temporary data directory and the http cache disabled.
+
+The results are written as json, with the commit, the corpus and the time of every stage,
+and can be compared with the results of a previous run.
+
+Usage:
+    python3 benchmarks/run_benchmarks.py [--corpus DIR] [--output PATH] [--compare PATH]
+"""
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+from typing import Callable, Iterator
+
+import click
+
+REPO_DIR = Path(__file__).parent.parent
+BORME_DIR = REPO_DIR / "src" / "borme"
+DEFAULT_CORPUS_DIR = Path(__file__).parent / "corpus"
+DEFAULT_RESULTS_DIR = Path(__file__).parent / "results"
+
+sys.path.insert(0, str(BORME_DIR))
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Serve the corpus without logging every request"""
+
+    def log_message(self, format, *args) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+
+def serve_corpus(corpus_dir: Path) -> ThreadingHTTPServer:
+    """Serve the corpus from a thread, on a free port of localhost."""
+    handler = partial(QuietHandler, directory=str(corpus_dir))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def find_corpus_dates(corpus_dir: Path) -> list[date]:
+    """Return the dates of the index pages of the corpus."""
+    return sorted(
+        datetime.strptime("".join(path.parts[-4:-1]), "%Y%m%d").date()
+        for path in corpus_dir.glob("borme/dias/*/*/*/index.php")
+    )
+
+
+def get_git_commit() -> tuple[str | None, bool]:
+    """Return the hash of the current commit and whether the tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, status != ""
+
+
+def time_stage(
+    calls: Callable[[], Iterator[int]], number: int
+) -> dict[str, float | int]:
+    """
+    Run the calls of a stage `number` times, return the best total time,
+    the number of items processed and the time per item.
+    Each call yields the number of items it processed.
+    """
+    best, items = float("inf"), 0
+    for _ in range(number):
+        start = time.perf_counter()
+        items = sum(calls())
+        best = min(best, time.perf_counter() - start)
+    return {
+        "items": items,
+        "seconds": best,
+        "ms_per_item": best * 1000 / items if items else 0.0,
+    }
+
+
+def benchmark_stages(
+    dates: list[date], pdf_paths: list[tuple[Path, date]], number: int
+) -> dict[str, dict]:
+    """Time the main stages of the pipeline on the dates and pdfs of the corpus."""
+    # pylint: disable=import-outside-toplevel
+    from crawler import (
+        drop_headers_and_footnotes,
+        parse_act,
+        parse_pdf,
+        split_text_by_acts,
+    )
+    from spyder import get_pdf_urls
+    from utils.borme_website import get_session
+    from utils.write_and_read_files import read_pdf
+
+    session = get_session()
+
+    def get_pdf_urls_calls() -> Iterator[int]:
+        for date_ in dates:
+            get_pdf_urls(date_, session=session, retries=0, rate=0)
+            yield 1
+
+    # Inputs of each stage, computed once so that only the stage itself is timed
+    pdfs = []
+    for path, date_ in pdf_paths:
+        num_of_pages, pages_text = read_pdf(str(path))
+        pdfs.append((str(path), date_, num_of_pages, "".join(pages_text)))
+    cleaned_texts = [
+        (drop_headers_and_footnotes(text, num_of_pages, date_, path), date_)
+        for path, date_, num_of_pages, text in pdfs
+    ]
+    acts_texts = []
+    for cleaned_text, date_ in cleaned_texts:
+        region_name = cleaned_text.split("\n")[0]
+        acts_texts.append(
+            (cleaned_text.replace(region_name, "", 1), region_name, date_)
+        )
+    acts = [
+        (act, region_name, date_)
+        for acts_text, region_name, date_ in acts_texts
+        for act in split_text_by_acts(acts_text)
+    ]
+
+    def parse_pdf_calls() -> Iterator[int]:
+        for path, date_ in pdf_paths:
+            parse_pdf(str(path), date_)
+            yield 1
+
+    def drop_headers_and_footnotes_calls() -> Iterator[int]:
+        for path, date_, num_of_pages, text in pdfs:
+            drop_headers_and_footnotes(text, num_of_pages, date_, path)
+            yield 1
+
+    def split_text_by_acts_calls() -> Iterator[int]:
+        for acts_text, _, _ in acts_texts:
+            yield len(split_text_by_acts(acts_text))
+
+    def parse_act_calls() -> Iterator[int]:
+        for act, region_name, date_ in acts:
+            parse_act(act, region_name, date_)
+            yield 1
+
+    return {
+        "get_pdf_urls": time_stage(get_pdf_urls_calls, number),
+        "parse_pdf": time_stage(parse_pdf_calls, number),
+        "drop_headers_and_footnotes": time_stage(
+            drop_headers_and_footnotes_calls, number
+        ),
+        "split_text_by_acts": time_stage(split_text_by_acts_calls, number),
+        "parse_act": time_stage(parse_act_calls, number),
+    }
+
+
+def benchmark_end_to_end(
+    dates: list[date], env: dict[str, str], runs: int, main_args: tuple[str, ...]
+) -> dict[str, float | int]:
+    """
+    Run main.py on every date of the corpus, each run with an empty data directory,
+    return the best time and the throughput in pdfs, MB and acts per second.
+    """
+    best = float("inf")
+    num_of_pdfs = num_of_bytes = num_of_acts = 0
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as data_dir:
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "main.py"]
+                + [date_.strftime("%Y%m%d") for date_ in dates]
+                + ["--cache-size", "0", "--rate", "0"]
+                + list(main_args),
+                cwd=BORME_DIR,
+                env={**env, "BORME_DATA_DIR": data_dir},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            best = min(best, time.perf_counter() - start)
+
+            output_dir = Path(data_dir) / "output"
+            pdf_paths = list(output_dir.glob("*/*.pdf"))
+            num_of_pdfs = len(pdf_paths)
+            num_of_bytes = sum(path.stat().st_size for path in pdf_paths)
+            num_of_acts = 0
+            for path in output_dir.glob("*/acts.jsonl"):
+                with open(path, "rb") as file:
+                    num_of_acts += sum(1 for _ in file)
+
+    return {
+        "runs": runs,
+        "seconds": best,
+        "pdfs": num_of_pdfs,
+        "bytes": num_of_bytes,
+        "acts": num_of_acts,
+        "pdfs_per_second": num_of_pdfs / best,
+        "mb_per_second": num_of_bytes / 1024**2 / best,
+        "acts_per_second": num_of_acts / best,
+    }
+
+
+def print_comparison(results: dict, previous: dict) -> None:
+    """Print the time of every stage in both runs and the speedup of the current one."""
+    print(
+        f"{'stage':<28}{'previous (s)':>14}{'current (s)':>14}{'speedup':>10}"
+        + f"   ({(previous.get('commit') or '?')[:12]} -> {(results['commit'] or '?')[:12]})"
+    )
+    for name, stage_result in {
+        **results["stages"],
+        "end_to_end": results["end_to_end"],
+    }.items():
+        previous_result = {
+            **previous.get("stages", {}),
+            "end_to_end": previous.get("end_to_end"),
+        }.get(name)
+        if not previous_result:
+            continue
+        before, after = previous_result["seconds"], stage_result["seconds"]
+        print(
+            f"{name:<28}{before:>14.4f}{after:>14.4f}"
+            + f"{before / after if after else float('inf'):>9.2f}x"
+        )
+
+
+@click.command(
+    context_settings={"ignore_unknown_options": True, "allow_extra_args": True}
+)
+@click.option(
+    "--corpus",
+    "corpus_dir",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    default=DEFAULT_CORPUS_DIR,
+    help="Directory of the corpus. Defaults to benchmarks/corpus.",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Path of the json results. Defaults to benchmarks/results/COMMIT.json.",
+)
+@click.option(
+    "--compare",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Json results of a previous run, to compare with.",
+)
+@click.option("-n", "--number", type=int, default=3, help="Repetitions of each stage.")
+@click.option("-r", "--runs", type=int, default=3, help="Runs of main.py.")
+@click.pass_context
+def main(
+    ctx: click.Context,
+    corpus_dir: Path,
+    output: Path | None,
+    compare: Path | None,
+    number: int,
+    runs: int,
+) -> None:
+    """
+    Benchmark the stages and the end to end throughput on the corpus, write the json results.
+    Extra arguments are passed to main.py, e.g. `-- -p 4 --pipeline`.
+    """
+    dates = find_corpus_dates(corpus_dir)
+    if len(dates) == 0:
+        raise click.UsageError(f"{corpus_dir} has no index pages, see record_corpus.py")
+    pdf_paths = [
+        (path, date_)
+        for date_ in dates
+        for path in sorted(
+            corpus_dir.glob(f"borme/dias/{date_.strftime('%Y/%m/%d')}/pdfs/*.pdf")
+        )
+    ]
+
+    server = serve_corpus(corpus_dir)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    with tempfile.TemporaryDirectory() as data_dir:
+        # The base url and the data dir are read when the modules are imported
+        os.environ["BORME_BASE_URL"] = base_url
+        os.environ["BORME_DATA_DIR"] = data_dir
+        # The warnings of the stages are not part of the benchmark
+        logging.disable(logging.WARNING)
+        stages = benchmark_stages(dates, pdf_paths, number)
+        end_to_end = benchmark_end_to_end(
+            dates, dict(os.environ), runs, tuple(ctx.args)
+        )
+    server.shutdown()
+
+    commit, dirty = get_git_commit()
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "main_args": ctx.args,
+        "corpus": {
+            "dates": [date_.strftime("%Y-%m-%d") for date_ in dates],
+            "pdfs": len(pdf_paths),
+            "bytes": sum(path.stat().st_size for path, _ in pdf_paths),
+        },
+        "stages": stages,
+        "end_to_end": end_to_end,
+    }
+
+    if output is None:
+        output = DEFAULT_RESULTS_DIR / f"{(commit or 'unknown')[:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+    for name, stage_result in stages.items():
+        print(
+            f"{name:<28}{stage_result['items']:>8} items"
+            + f"{stage_result['seconds']:>10.4f} s{stage_result['ms_per_item']:>10.3f} ms/item"
+        )
+    print(
+        f"{'end_to_end':<28}{end_to_end['pdfs_per_second']:>8.1f} pdfs/s"
+        + f"{end_to_end['mb_per_second']:>8.2f} MB/s{end_to_end['acts_per_second']:>10.0f} acts/s"
+    )
+    print(f"Results written to {output}")
+
+    if compare is not None:
+        print_comparison(results, json.loads(compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
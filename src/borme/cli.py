@@ -11,10 +11,165 @@ from logs import (
 )
 from utils.cli_help_message import construct_help_message
 
+# Options shared by the scripts that accept them.
+# They are passed to dates_cli, which forwards their values to the function of dates.
+workers_option = click.Option(
+    ["-w", "--workers"],
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of pdfs downloaded concurrently. Defaults to 1.",
+)
+max_per_host_option = click.Option(
+    ["--max-per-host"],
+    type=click.IntRange(min=1),
+    default=4,
+    help="Max number of simultaneous connections to the same host. Defaults to 4.",
+)
+
+retries_option = click.Option(
+    ["--retries"],
+    type=click.IntRange(min=0),
+    default=3,
+    help="Number of times a failed request is retried, with exponential backoff."
+    + " Defaults to 3.",
+)
+rate_option = click.Option(
+    ["--rate"],
+    type=click.FloatRange(min=0),
+    default=5.0,
+    help="Max number of requests per second sent to the same host, 0 means no limit."
+    + " Defaults to 5.",
+)
+async_option = click.Option(
+    ["--async", "use_async"],
+    is_flag=True,
+    default=False,
+    help="Schedule the downloads with an asyncio event loop.",
+)
+
+profile_option = click.Option(
+    ["--profile"],
+    is_flag=True,
+    default=False,
+    help="Record the time spent in each stage (http requests, pdf reading, parsing,"
+    + " writing...) and log a summary table at the end.",
+)
+profile_output_option = click.Option(
+    ["--profile-output"],
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Implies --profile. Dump a cProfile of the main thread to this path,"
+    + " and the record of every stage to PATH.stages.jsonl.",
+)
+report_option = click.Option(
+    ["--report"],
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Path of the json report of the run, with the pdfs, acts, warnings and stages"
+    + " of every date. Defaults to data/reports/TIMESTAMP_SCRIPT.json.",
+)
+metrics_file_option = click.Option(
+    ["--metrics-file"],
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Path of the metrics of the run, in the text format of Prometheus."
+    + " Defaults to data/metrics/borme_SCRIPT.prom.",
+)
 
-def dates_cli(func_of_dates: Callable[[tuple[str, ...]], None]) -> click.Command:
-    """Add cli functionality to a function that accepts a list of dates as argument."""
-    set_up_root_logger()
+processes_option = click.Option(
+    ["-p", "--processes"],
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes used to parse the pdfs in parallel. Defaults to 1.",
+)
+
+stream_option = click.Option(
+    ["--stream"],
+    is_flag=True,
+    default=False,
+    help="Read the pdfs page by page and write each act as soon as it is parsed."
+    + " The pdfs are parsed in a single process.",
+)
+
+cache_size_option = click.Option(
+    ["--cache-size"],
+    type=click.IntRange(min=0),
+    default=512,
+    help="Max size in MB of the on-disk cache of http responses. 0 disables the cache."
+    + " Defaults to 512.",
+)
+revalidate_option = click.Option(
+    ["--revalidate"],
+    is_flag=True,
+    default=False,
+    help="Request the webpage and the pdfs again, even if they were already downloaded."
+    + " Unchanged responses are reused from the cache.",
+)
+
+reparse_option = click.Option(
+    ["--reparse"],
+    is_flag=True,
+    default=False,
+    help="Parse every pdf again, even if it did not change since it was last parsed.",
+)
+
+pipeline_option = click.Option(
+    ["--pipeline"],
+    is_flag=True,
+    default=False,
+    help="Parse the pdfs while the next ones are being downloaded."
+    + " The pdfs are parsed in memory, it cannot be combined with --stream"
+    + " or --concurrent-dates.",
+)
+
+concurrent_dates_option = click.Option(
+    ["--concurrent-dates"],
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of dates processed at the same time."
+    + " They share the limits of --max-per-host and --processes. Defaults to 1.",
+)
+
+parquet_option = click.Option(
+    ["--parquet"],
+    is_flag=True,
+    default=False,
+    help="Also write the acts to a parquet dataset in data/parquet/acts,"
+    + " partitioned by date and region. Requires pyarrow.",
+)
+
+sqlite_option = click.Option(
+    ["--sqlite"],
+    is_flag=True,
+    default=False,
+    help="Also insert the acts in the SQLite database data/acts.sqlite."
+    + " Running a date again updates its acts instead of duplicating them.",
+)
+
+index_option = click.Option(
+    ["--index"],
+    is_flag=True,
+    default=False,
+    help="Also add the acts to the company index data/company_index.sqlite,"
+    + " used by company_lookup.py to find the acts of a company by its name.",
+)
+
+structured_option = click.Option(
+    ["--structured"],
+    is_flag=True,
+    default=False,
+    help="Add to each act the entries listed in its description,"
+    + " e.g. Constitución or Nombramientos, with their fields.",
+)
+
+
+def dates_cli(
+    func_of_dates: Callable[..., None], *options: click.Option
+) -> click.Command:
+    """
+    Add cli functionality to a function that accepts a list of dates as argument.
+    The value of every extra option is passed to the function as a keyword argument.
+    """
 
     class CmdWithCustomHelpMessage(click.Command):
         """
@@ -23,7 +178,7 @@ def dates_cli(func_of_dates: Callable[[tuple[str, ...]], None]) -> click.Command
         """
 
         def format_help(self, ctx, formatter):
-            click.echo(construct_help_message(func_of_dates))
+            click.echo(construct_help_message(func_of_dates, list(options)))
 
     @click.command(cls=CmdWithCustomHelpMessage)
     @click.argument("input_dates", nargs=-1, type=str)
@@ -32,7 +187,12 @@ def dates_cli(func_of_dates: Callable[[tuple[str, ...]], None]) -> click.Command
         "--file",
         type=click.File("r"),
     )
-    def func_of_dates_with_cli(input_dates: tuple[str, ...], file: TextIOWrapper):
+    def func_of_dates_with_cli(
+        input_dates: tuple[str, ...], file: TextIOWrapper, **kwargs
+    ):
+        # The logger is set up when the command runs, so --help writes no log file
+        set_up_root_logger()
+
         # Cannot pass dates from both the command line and a text file
         if file is not None and len(input_dates) != 0:
             log_dates_from_cl_and_file()
@@ -42,6 +202,9 @@ def dates_cli(func_of_dates: Callable[[tuple[str, ...]], None]) -> click.Command
             contents = file.read()
             input_dates = tuple(contents.splitlines())
 
-        func_of_dates(input_dates)
+        func_of_dates(input_dates, **kwargs)
+
+    # Register the extra options in the command
+    func_of_dates_with_cli.params.extend(options)
 
     return func_of_dates_with_cli
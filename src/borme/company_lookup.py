@@ -0,0 +1,76 @@
+"""
+Find the acts of a company by its name, using the company index built by the crawler.
+Print the acts found, one json object per line.
+"""
+import json
+
+import click
+
+from logs import (
+    set_up_root_logger,
+    log_company_index_does_not_exist,
+    log_stale_company_index_entry,
+)
+from utils.paths import COMPANY_INDEX_PATH, OUTPUT_DIR
+from utils.company_index import index_acts_file, lookup_company, read_act_at_offset
+
+
+def reindex_all_dates() -> None:
+    """Add the acts.jsonl file of every date in the output directory to the company index."""
+    for acts_path in sorted(OUTPUT_DIR.glob("*/acts.jsonl")):
+        index_acts_file(str(COMPANY_INDEX_PATH), str(acts_path))
+
+
+@click.command()
+@click.argument("company_name", type=str)
+@click.option(
+    "-m",
+    "--mode",
+    type=click.Choice(["exact", "prefix", "fuzzy"]),
+    default="prefix",
+    help="exact: same name, prefix: names that start with the given name,"
+    + " fuzzy: the most similar names, allowing typos. Defaults to prefix.",
+)
+@click.option(
+    "-n",
+    "--limit",
+    type=click.IntRange(min=1),
+    default=100,
+    help="Max number of acts printed. Defaults to 100.",
+)
+@click.option(
+    "--reindex",
+    is_flag=True,
+    default=False,
+    help="Index the acts.jsonl file of every date before the lookup.",
+)
+def main(company_name: str, mode: str, limit: int, reindex: bool) -> None:
+    """
+    Print the acts of the companies whose name matches COMPANY_NAME.
+    Names are compared ignoring case, accents and punctuation.
+    """
+    set_up_root_logger()
+
+    if reindex:
+        reindex_all_dates()
+
+    if not COMPANY_INDEX_PATH.is_file():
+        log_company_index_does_not_exist(str(COMPANY_INDEX_PATH))
+        return
+
+    for entry in lookup_company(str(COMPANY_INDEX_PATH), company_name, mode, limit):
+        acts_path = OUTPUT_DIR / entry["borme_date"] / "acts.jsonl"
+        act = (
+            read_act_at_offset(acts_path, entry["offset"])
+            if acts_path.is_file()
+            else None
+        )
+        # The acts.jsonl file was written again without updating the index
+        if act is None or act["id"] != entry["act_id"]:
+            log_stale_company_index_entry(str(acts_path), entry["act_id"])
+            continue
+        click.echo(json.dumps(act, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()  # pylint: disable=no-value-for-parameter
@@ -2,36 +2,96 @@
 Given a series of dates, read all the pdfs of the BORME registry webpage for each date,
 and write one jsonl file per date with the information obtained from parsing the pdfs.
 """
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import date
+from itertools import chain, repeat
 from pathlib import Path
 import re
-from os import listdir
-
-
-from cli import dates_cli
+import json
+from os import listdir, replace
+from os.path import basename, getsize
+from typing import Iterable, Iterator
+
+from cli import (
+    dates_cli,
+    parquet_option,
+    processes_option,
+    profile_option,
+    profile_output_option,
+    report_option,
+    metrics_file_option,
+    index_option,
+    reparse_option,
+    sqlite_option,
+    stream_option,
+    structured_option,
+)
 from logs import (
     set_up_root_logger,
+    set_up_worker_logger,
+    worker_logs_listener,
+    collecting_unexpected_num_of_matches,
     log_no_dates_read,
     log_date_data_dir_does_not_exist,
     log_no_pdfs_in_dir,
     log_finished_daily_crawler,
+    log_reused_parsed_pdfs,
+    log_unexpected_num_of_matches,
+)
+from utils.act_description import act_entries_to_list_of_dict, parse_act_description
+from utils.act_record import (
+    Act,
+    acts_to_columns,
+    read_acts_from_jsonl,
+    write_acts_to_jsonl,
 )
+from utils.acts_database import upsert_acts
+from utils.paths import (
+    ACTS_DATABASE_PATH,
+    COMPANY_INDEX_PATH,
+    OUTPUT_DIR,
+    PARQUET_DIR,
+)
+from utils.run_report import run_report
+from utils.profiling import (
+    add_records,
+    call_and_collect_records,
+    is_profiling_enabled,
+    profiling,
+    stage,
+)
+from utils.company_index import index_acts_file
 from utils.type_casting import uniq_dates_in_list, flatten
-from utils.text_filtering import drop_lines_with_pattern, drop_pattern
+from utils.text_filtering import (
+    drop_lines_with_patterns,
+    drop_lines_with_patterns_lazily,
+    drop_pattern,
+    drop_text_lazily,
+    iter_lines,
+)
 from utils.write_and_read_files import (
-    get_pages_in_pdf,
-    read_text_from_pdf,
-    write_list_of_dict_to_jsonl,
+    get_file_sha256,
+    read_manifest,
+    read_pdf,
+    stream_pdf,
+    write_columns_to_parquet,
 )
 
+# Version of the output of parse_pdf, part of the key of the parsed pdfs cache.
+# Increase it whenever a change in the parser changes its output,
+# so that the pdfs parsed by previous versions are parsed again.
+PARSER_VERSION = 2
 
-def drop_headers_and_footnotes(
-    pdf_text: str, num_of_pages: int, date_: date, pdf: str
-) -> str:
+
+def get_headers_and_footnotes_patterns(
+    num_of_pages: int,
+) -> tuple[list[tuple[str, int]], tuple[str, int]]:
     """
-    Given the text content of a pdf of the BORME registry,
-    use regex patterns to find the headers and footnotes inside of the pdf text,
-    drop them.
+    Return the (pattern, expected_num_of_matches) of the headers and footnotes
+    of a pdf of the BORME registry with the given number of pages.
+    The first element is the list of patterns of the lines that have to be dropped,
+    the second one is the pattern of the section header, which has to be removed from the text.
     """
     # Define pattern, expected_num_of_matches for the filler texts that we want to remove
     final_footnote = (
@@ -44,18 +104,21 @@ def drop_headers_and_footnotes(
     footnote_1 = (r"cve: BORME-[A-Za-z]-\d+-\d+-\d+", num_of_pages)
     footnote_2 = ("Verificable en https://www.boe.es", num_of_pages)
 
-    # Remove lines that contain the specified patterns
-    result_text = pdf_text
-    for pattern, expected_num_of_matches in [
-        final_footnote,
-        header,
-        subheader,
-        footnote_1,
-        footnote_2,
-    ]:
-        result_text = drop_lines_with_pattern(
-            result_text, pattern, expected_num_of_matches, date_, pdf
-        )
+    return [final_footnote, header, subheader, footnote_1, footnote_2], section_header
+
+
+def drop_headers_and_footnotes(
+    pdf_text: str, num_of_pages: int, date_: date, pdf: str
+) -> str:
+    """
+    Given the text content of a pdf of the BORME registry,
+    use regex patterns to find the headers and footnotes inside of the pdf text,
+    drop them.
+    """
+    line_patterns, section_header = get_headers_and_footnotes_patterns(num_of_pages)
+
+    # Remove lines that contain the specified patterns, in a single pass over the lines
+    result_text = drop_lines_with_patterns(pdf_text, line_patterns, date_, pdf)
 
     # Remove occurrences of the specified pattern
     result_text = drop_pattern(result_text, *section_header, date_, pdf)
@@ -87,10 +150,50 @@ def split_text_by_acts(acts_text: str) -> list[str]:
     return acts
 
 
-def parse_act(act: str, region_name: str, date_: date) -> dict:
+def drop_headers_and_footnotes_lazily(
+    lines: Iterable[str], num_of_pages: int, date_: date, pdf: str
+) -> Iterator[str]:
+    """
+    Lazy version of drop_headers_and_footnotes,
+    yield the lines of the pdf text that are not part of a header or a footnote.
+    """
+    line_patterns, section_header = get_headers_and_footnotes_patterns(num_of_pages)
+
+    # Remove lines that contain the specified patterns
+    lines = drop_lines_with_patterns_lazily(lines, line_patterns, date_, pdf)
+
+    # Remove occurrences of the section header, which spans multiple lines
+    return drop_text_lazily(lines, *section_header, date_, pdf)
+
+
+def split_lines_by_acts(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Lazy version of split_text_by_acts,
+    yield the text of each act as soon as all of its lines have been read.
+    The lines before the first act are skipped.
+    """
+    # Pattern: digit at the start of line followed by ' - ' and a word in all uppercase
+    act_start = re.compile(r"\d+ - [A-Z]+")
+
+    act_lines: list[str] = []
+    for line in lines:
+        # A new act starts, the previous one is complete
+        if act_start.match(line):
+            if act_lines:
+                yield "\n".join(act_lines)
+            act_lines = [line]
+        elif act_lines:
+            act_lines.append(line)
+
+    # The last act is complete once there are no more lines
+    if act_lines:
+        yield "\n".join(act_lines)
+
+
+def parse_act(act: str, region_name: str, date_: date) -> Act:
     """
     Parse the string containing the information of a given act,
-    return a dictionary with the structured information
+    return a record with the structured information
     """
     lines = act.strip().split("\n")
     # id, company name are in the 1st line, separated by an '-' character
@@ -101,27 +204,44 @@ def parse_act(act: str, region_name: str, date_: date) -> dict:
     # For more information about this design choice, consult the README
     description = "\n".join(lines[1:])
 
-    return {
-        "id": act_id,
-        "company_name": clean_company_name,
-        "region_name": region_name,
-        "borme_date": date_.strftime("%Y-%m-%d"),
-        "description": description,
-    }
+    return Act(
+        id=act_id,
+        company_name=clean_company_name,
+        region_name=region_name,
+        borme_date=date_.strftime("%Y-%m-%d"),
+        description=description,
+    )
 
 
-def parse_pdf(path: str, date_: date) -> list[dict]:
+def add_act_entries(act: Act) -> Act:
+    """
+    Add to an act the entries listed in its description,
+    each one with its kind, text and fields. Return the same act.
+    """
+    act.entries = act_entries_to_list_of_dict(parse_act_description(act.description))
+    return act
+
+
+def parse_pdf(path: str, date_: date) -> list[Act]:
     """
     Given the path to a pdf of the BORME registry,
-    parse pdf text and return a list of dictionaries,
-    where each dictionary corresponds to the info of a single act listed in the pdf.
+    parse pdf text and return a list of acts,
+    with the info of each act listed in the pdf.
     """
-    # get text and num of pages of pdf
-    pdf_text = read_text_from_pdf(path)
-    num_of_pages = get_pages_in_pdf(path)
+    pdf = basename(path)
+
+    # get text and num of pages of pdf, reading the pdf only once
+    with stage("read_pdf", date_, pdf) as stats:
+        num_of_pages, pages_text = read_pdf(path)
+        pdf_text = "".join(pages_text)
+        stats.bytes, stats.count = getsize(path), num_of_pages
 
     # Clean the pdf text by dropping headers and footnotes
-    cleaned_pdf_text = drop_headers_and_footnotes(pdf_text, num_of_pages, date_, path)
+    with stage("drop_headers_and_footnotes", date_, pdf) as stats:
+        cleaned_pdf_text = drop_headers_and_footnotes(
+            pdf_text, num_of_pages, date_, path
+        )
+        stats.bytes = len(pdf_text)
 
     # The first line of the cleaned pdf text is the region name,
     # the rest is the text containing the act information
@@ -129,34 +249,279 @@ def parse_pdf(path: str, date_: date) -> list[dict]:
     acts_text = cleaned_pdf_text.replace(region_name, "", 1)
 
     # Split the pdf text in act, parse each act to obtain a dict with the curated information
-    acts = split_text_by_acts(acts_text)
-    cleaned_acts = [parse_act(act, region_name, date_) for act in acts]
+    with stage("split_text_by_acts", date_, pdf) as stats:
+        acts = split_text_by_acts(acts_text)
+        stats.bytes, stats.count = len(acts_text), len(acts)
+    with stage("parse_act", date_, pdf) as stats:
+        cleaned_acts = [parse_act(act, region_name, date_) for act in acts]
+        stats.count = len(cleaned_acts)
 
     return cleaned_acts
 
 
-def daily_crawler(date_: date) -> None:
+def stream_pdf_acts(path: str, date_: date) -> Iterator[Act]:
+    """
+    Lazy version of parse_pdf,
+    read the pdf page by page and yield each act as soon as it is complete.
+    Acts that continue in the next page are yielded once the next page has been read.
+    """
+    num_of_pages, pages_text = stream_pdf(path)
+
+    # The pages are joined into a single stream of lines, without headers and footnotes
+    lines = drop_headers_and_footnotes_lazily(
+        iter_lines(pages_text), num_of_pages, date_, path
+    )
+
+    # The first line that is not empty is the region name,
+    # the rest of lines contain the act information
+    region_name = next((line.lstrip() for line in lines if line.strip()), "")
+
+    for act in split_lines_by_acts(lines):
+        yield parse_act(act, region_name, date_)
+
+
+def get_pdf_checksums(data_dir: Path, pdf_files: list[str]) -> dict[str, str]:
+    """
+    Return the sha256 checksum of each pdf file, the key of its acts in the parse cache.
+    The checksum is taken from the download manifest of the date if it has a complete download
+    of the pdf with the same size, otherwise the pdf is read to compute it.
+    """
+    manifest = read_manifest(str(data_dir / "manifest.jsonl"))
+    downloads = {
+        str(data_dir / entry["file"]): entry
+        for entry in manifest.values()
+        if entry.get("status") == "complete" and entry.get("sha256")
+    }
+    checksums = {}
+    for pdf in pdf_files:
+        entry = downloads.get(pdf)
+        if entry is not None and entry["size"] == getsize(pdf):
+            checksums[pdf] = entry["sha256"]
+        else:
+            checksums[pdf] = get_file_sha256(pdf)
+    return checksums
+
+
+def get_parse_cache_path(path: str, checksum: str | None = None) -> Path:
+    """
+    Return the path where the acts parsed from a pdf are cached.
+    The cache is stored next to the pdf and keyed by its contents and the parser version,
+    so the cached acts become unreachable as soon as the pdf or the parser change.
+    If the sha256 checksum of the pdf is not given, the pdf is read to compute it.
+    """
+    pdf = Path(path)
+    key = f"{checksum or get_file_sha256(path)}-v{PARSER_VERSION}"
+    return pdf.parent / "parse_cache" / f"{key}.jsonl"
+
+
+def get_parse_warnings_path(cache_path: Path) -> Path:
+    """
+    Return the path where the unexpected_num_of_matches warnings of a pdf are cached,
+    next to its cached acts. The file only exists if parsing the pdf logged warnings.
+    """
+    return cache_path.with_suffix(".warnings.json")
+
+
+def write_parse_warnings(cache_path: Path, warnings: list[list]) -> None:
+    """Cache the warnings logged while parsing a pdf, before its acts are cached."""
+    warnings_path = get_parse_warnings_path(cache_path)
+    if len(warnings) == 0:
+        warnings_path.unlink(missing_ok=True)
+        return
+    with open(warnings_path, "w", encoding="utf-8") as file:
+        json.dump(warnings, file)
+
+
+def log_cached_parse_warnings(cache_path: Path, date_: date, path: str) -> None:
+    """
+    Log again the warnings logged when the pdf was parsed,
+    so the warnings of a run do not depend on which pdfs were reused from the cache.
+    """
+    warnings_path = get_parse_warnings_path(cache_path)
+    if not warnings_path.is_file():
+        return
+    with open(warnings_path, "r", encoding="utf-8") as file:
+        for pattern, num_of_matches, expected_num_of_matches in json.load(file):
+            log_unexpected_num_of_matches(
+                pattern, num_of_matches, expected_num_of_matches, date_, path
+            )
+
+
+def parse_pdf_cached(
+    path: str, date_: date, reparse: bool = False, checksum: str | None = None
+) -> list[Act]:
+    """
+    Version of parse_pdf that reuses the acts cached from a previous run,
+    if the pdf did not change since then. Otherwise parse the pdf and cache its acts.
+    The warnings logged when the pdf was parsed are logged again when its acts are reused.
+    If reparse is True, the pdf is parsed even if its acts are cached.
+    The checksum of the pdf is computed if it is not given.
+    """
+    cache_path = get_parse_cache_path(path, checksum)
+    if cache_path.is_file() and not reparse:
+        with stage("read_parse_cache", date_, basename(path)) as stats:
+            acts = read_acts_from_jsonl(str(cache_path))
+            stats.count = len(acts)
+        log_cached_parse_warnings(cache_path, date_, path)
+        return acts
+
+    with collecting_unexpected_num_of_matches(path) as warnings:
+        acts = parse_pdf(path, date_)
+
+    # Write to a temporary file first, so an interruption never leaves a half written cache
+    cache_path.parent.mkdir(exist_ok=True)
+    write_parse_warnings(cache_path, warnings)
+    write_acts_to_jsonl(f"{cache_path}.part", acts)
+    replace(f"{cache_path}.part", cache_path)
+    return acts
+
+
+def stream_pdf_acts_cached(
+    path: str, date_: date, reparse: bool = False, checksum: str | None = None
+) -> Iterator[Act]:
+    """
+    Version of stream_pdf_acts that reuses the acts cached from a previous run,
+    if the pdf did not change since then.
+    Otherwise stream the acts of the pdf and write them to the cache as they are yielded.
+    If reparse is True, the pdf is parsed even if its acts are cached.
+    The checksum of the pdf is computed if it is not given.
+    """
+    cache_path = get_parse_cache_path(path, checksum)
+    if cache_path.is_file() and not reparse:
+        log_cached_parse_warnings(cache_path, date_, path)
+        yield from read_acts_from_jsonl(str(cache_path))
+        return
+
+    # The cache is only moved into place once all the acts of the pdf are written
+    cache_path.parent.mkdir(exist_ok=True)
+    with collecting_unexpected_num_of_matches(path) as warnings, open(
+        f"{cache_path}.part", "w", encoding="utf-8"
+    ) as file:
+        for act in stream_pdf_acts(path, date_):
+            file.write(act.to_json() + "\n")
+            yield act
+    write_parse_warnings(cache_path, warnings)
+    replace(f"{cache_path}.part", cache_path)
+
+
+def drop_stale_parse_cache(data_dir: Path, checksums: dict[str, str]) -> int:
+    """
+    Delete the cached acts that do not correspond to any of the current pdf files,
+    given as a dictionary from the path of each pdf to its checksum,
+    because the pdf changed or it was parsed by a previous parser version.
+    Return the number of pdfs whose acts are cached.
+    """
+    cache_dir = data_dir / "parse_cache"
+    if not cache_dir.is_dir():
+        return 0
+
+    current_cache_paths = {
+        get_parse_cache_path(pdf, checksum) for pdf, checksum in checksums.items()
+    }
+    current_paths = current_cache_paths | {
+        get_parse_warnings_path(path) for path in current_cache_paths
+    }
+    for cache_path in cache_dir.iterdir():
+        if cache_path not in current_paths:
+            cache_path.unlink()
+    return len([path for path in current_cache_paths if path.is_file()])
+
+
+def export_acts(
+    data_dir: Path,
+    date_: date,
+    acts: list[Act] | None = None,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+) -> None:
+    """
+    Write the acts of a date, already written to the acts.jsonl file of the date directory,
+    to the optional outputs. If the acts are not given, they are read from acts.jsonl.
+    With parquet=True, the acts are written to the parquet dataset, partitioned by date and region.
+    With sqlite=True, the acts are inserted or updated in the acts database.
+    With index=True, the acts are added to the company index.
+    """
+    # The index is built from the file, because it stores the offset of each act
+    if index:
+        with stage("index_acts", date_):
+            index_acts_file(str(COMPANY_INDEX_PATH), str(data_dir / "acts.jsonl"))
+
+    if not parquet and not sqlite:
+        return
+    if acts is None:
+        acts = read_acts_from_jsonl(str(data_dir / "acts.jsonl"))
+    if len(acts) == 0:
+        return
+
+    if parquet:
+        with stage("write_parquet", date_) as stats:
+            write_columns_to_parquet(
+                str(PARQUET_DIR),
+                acts_to_columns(acts),
+                partition_cols=["borme_date", "region_name"],
+            )
+            stats.count = len(acts)
+    if sqlite:
+        with stage("upsert_acts", date_) as stats:
+            upsert_acts(str(ACTS_DATABASE_PATH), acts)
+            stats.count = len(acts)
+
+
+@contextmanager
+def parsing_pool(processes: int) -> Iterator[Executor | None]:
+    """
+    Yield a pool of `processes` worker processes used to parse the pdfs,
+    or None if the pdfs must be parsed in the current process.
+    The logs of the workers are written by the root logger of the current process.
+    """
+    if processes == 1:
+        yield None
+        return
+
+    with worker_logs_listener() as log_queue, ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=set_up_worker_logger,
+        initargs=(log_queue,),
+    ) as executor:
+        yield executor
+
+
+def daily_crawler(
+    date_: date,
+    executor: Executor | None = None,
+    stream: bool = False,
+    reparse: bool = False,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+    structured: bool = False,
+) -> None:
     """
     Read all the pdfs of the BORME registry for a given date,
     parse pdfs text and write a jsonl file, where each line of the jsonl file corresponds to
     the info of a single act listed in one of the pdfs.
+    If an executor is given, the pdfs are parsed by its workers.
+    If stream is True, the pdfs are read page by page in the current process,
+    and each act is written to the jsonl file as soon as it is parsed.
+    The acts of the pdfs that did not change since a previous run are reused,
+    unless reparse is True.
+    If parquet is True, the acts are also written to the parquet dataset.
+    If sqlite is True, the acts are also inserted in the acts database.
+    If index is True, the acts are also added to the company index.
+    If structured is True, the entries listed in the description of each act are added to it.
     """
     # Path to directory where the pdfs for that date are stored
-    data_dir = (
-        Path(__file__).parent.parent.parent
-        / "data"
-        / "output"
-        / date_.strftime("%Y-%m-%d")
-    )
+    data_dir = OUTPUT_DIR / date_.strftime("%Y-%m-%d")
 
     # If the data dir does not exist, log warning and exit function
     if not data_dir.is_dir():
         log_date_data_dir_does_not_exist(str(data_dir), date_)
         return
 
-    # List of pdf files inside the data dir
+    # List of pdf files inside the data dir, sorted so that the output order is deterministic
     pdf_files = [
-        str(data_dir / f) for f in listdir(str(data_dir)) if f.endswith(".pdf")
+        str(data_dir / f) for f in sorted(listdir(str(data_dir))) if f.endswith(".pdf")
     ]
 
     # If there are no pdf files, log warning and exit function
@@ -164,19 +529,88 @@ def daily_crawler(date_: date) -> None:
         log_no_pdfs_in_dir(str(data_dir), date_)
         return
 
-    # Parse every pdf file
-    acts_per_pdf = [parse_pdf(pdf, date_) for pdf in pdf_files]
+    # Only the pdfs that changed since the previous run have to be parsed,
+    # the checksum of each pdf is computed once, and passed to the parser
+    checksums = get_pdf_checksums(data_dir, pdf_files)
+    num_of_cached_pdfs = 0 if reparse else drop_stale_parse_cache(data_dir, checksums)
+    if num_of_cached_pdfs > 0:
+        log_reused_parsed_pdfs(num_of_cached_pdfs, date_)
+
+    # Parse the pdf files one after the other, write each act as soon as it is parsed
+    if stream:
+        acts_stream = chain.from_iterable(
+            stream_pdf_acts_cached(pdf, date_, reparse, checksums[pdf])
+            for pdf in pdf_files
+        )
+        if structured:
+            acts_stream = map(add_act_entries, acts_stream)
+        # The stages of the pdfs are interleaved, so they are recorded as a single stage
+        with stage("stream_pdfs_to_jsonl", date_) as stats:
+            write_acts_to_jsonl(str(data_dir / "acts.jsonl"), acts_stream, flush=True)
+            stats.bytes = getsize(data_dir / "acts.jsonl")
+        export_acts(data_dir, date_, parquet=parquet, sqlite=sqlite, index=index)
+        log_finished_daily_crawler(date_)
+        return
+
+    # Parse every pdf file, the results of the executor are returned in the order of pdf_files
+    if executor is None:
+        acts_per_pdf = [
+            parse_pdf_cached(pdf, date_, reparse, checksums[pdf]) for pdf in pdf_files
+        ]
+    elif is_profiling_enabled():
+        # The stages are recorded by the workers, and returned with the acts
+        results = list(
+            executor.map(
+                call_and_collect_records,
+                repeat(parse_pdf_cached),
+                pdf_files,
+                repeat(date_),
+                repeat(reparse),
+                [checksums[pdf] for pdf in pdf_files],
+            )
+        )
+        for _, records in results:
+            add_records(records)
+        acts_per_pdf = [acts for acts, _ in results]
+    else:
+        acts_per_pdf = list(
+            executor.map(
+                parse_pdf_cached,
+                pdf_files,
+                repeat(date_),
+                repeat(reparse),
+                [checksums[pdf] for pdf in pdf_files],
+            )
+        )
 
     # Flatten to get a single list containing the acts of all the pdfs
     acts = flatten(acts_per_pdf)
+    if structured:
+        acts = [add_act_entries(act) for act in acts]
 
     # Write acts to jsonl file
-    write_list_of_dict_to_jsonl(str(data_dir / "acts.jsonl"), acts)
+    with stage("write_jsonl", date_) as stats:
+        write_acts_to_jsonl(str(data_dir / "acts.jsonl"), acts)
+        stats.bytes, stats.count = getsize(data_dir / "acts.jsonl"), len(acts)
+    export_acts(data_dir, date_, acts, parquet=parquet, sqlite=sqlite, index=index)
 
     log_finished_daily_crawler(date_)
 
 
-def main(input_dates: tuple[str, ...]) -> None:
+def main(
+    input_dates: tuple[str, ...],
+    processes: int = 1,
+    stream: bool = False,
+    reparse: bool = False,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+    structured: bool = False,
+    profile: bool = False,
+    profile_output: str | None = None,
+    report: str | None = None,
+    metrics_file: str | None = None,
+) -> None:
     """
     For each date, read all the pdfs of the BORME registry webpage for that date,
     write a jsonl file with the information obtained from parsing the pdfs.
@@ -188,9 +622,36 @@ def main(input_dates: tuple[str, ...]) -> None:
     if len(uniq_dates) == 0:
         log_no_dates_read()
 
-    for date_ in uniq_dates:
-        daily_crawler(date_)
+    # The same worker processes are used for every date
+    with run_report("crawler", uniq_dates, report, metrics_file), profiling(
+        profile or profile_output is not None, profile_output
+    ), parsing_pool(processes) as executor:
+        for date_ in uniq_dates:
+            daily_crawler(
+                date_,
+                executor=executor,
+                stream=stream,
+                reparse=reparse,
+                parquet=parquet,
+                sqlite=sqlite,
+                index=index,
+                structured=structured,
+            )
 
 
 if __name__ == "__main__":
-    dates_cli(main)()  # pylint: disable=no-value-for-parameter
+    cli = dates_cli(
+        main,
+        processes_option,
+        stream_option,
+        reparse_option,
+        parquet_option,
+        sqlite_option,
+        index_option,
+        structured_option,
+        profile_option,
+        profile_output_option,
+        report_option,
+        metrics_file_option,
+    )
+    cli()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,328 @@
+"""
+Resident version of main.py: poll the BORME registry webpage of the day,
+and download and parse its new pdfs as soon as they are published.
+The http session, the http cache and the pool of parser processes stay warm between polls,
+and a small http server exposes the health and the metrics of the daemon.
+"""
+import json
+import signal
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from typing import Any
+
+import click
+
+from cli import (
+    async_option,
+    cache_size_option,
+    index_option,
+    max_per_host_option,
+    parquet_option,
+    processes_option,
+    rate_option,
+    retries_option,
+    sqlite_option,
+    structured_option,
+    workers_option,
+)
+from crawler import parsing_pool
+from logs import (
+    set_up_root_logger,
+    log_failed_poll,
+    log_new_pdfs_for_date,
+    log_started_daemon,
+    log_stopped_daemon,
+)
+from main import daily_spyder_and_crawler
+from spyder import get_pdf_urls, is_download_complete
+from utils.borme_website import get_session
+from utils.paths import OUTPUT_DIR
+from utils.type_casting import cast_str_to_date, is_borme_published
+from utils.write_and_read_files import read_manifest, write_txt_from_list
+
+
+class DaemonMetrics:
+    """
+    Counters of the daemon, updated by the polling loop and read by the health server.
+    The daemon is healthy while its last successful poll is recent enough.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.started_at = time.time()
+        self.polls = 0
+        self.failed_polls = 0
+        self.new_pdfs = 0
+        self.acts = 0
+        self.last_poll_at: float | None = None
+        self.last_success_at: float | None = None
+        self.last_error: str | None = None
+        self._lock = Lock()
+
+    def record_poll(self, new_pdfs: int, acts: int) -> None:
+        """Record a successful poll, with the number of new pdfs and the acts of the date."""
+        with self._lock:
+            self.polls += 1
+            self.new_pdfs += new_pdfs
+            self.acts = acts
+            self.last_poll_at = self.last_success_at = time.time()
+
+    def record_failed_poll(self, e: Exception) -> None:
+        """Record a poll that raised an exception."""
+        with self._lock:
+            self.polls += 1
+            self.failed_polls += 1
+            self.last_poll_at = time.time()
+            self.last_error = repr(e)
+
+    def is_healthy(self) -> bool:
+        """
+        Check that the last successful poll, or the start of the daemon if there was none,
+        happened less than 3 poll intervals ago.
+        """
+        with self._lock:
+            last_success_at = self.last_success_at or self.started_at
+        return time.time() - last_success_at < 3 * self.interval
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the counters as a dictionary."""
+        with self._lock:
+            return {
+                "uptime_seconds": time.time() - self.started_at,
+                "polls": self.polls,
+                "failed_polls": self.failed_polls,
+                "new_pdfs": self.new_pdfs,
+                "acts": self.acts,
+                "last_poll_at": self.last_poll_at,
+                "last_success_at": self.last_success_at,
+                "last_error": self.last_error,
+            }
+
+    def to_prometheus(self) -> str:
+        """Return the counters in the text format of Prometheus."""
+        metrics = self.to_dict()
+        lines = []
+        for name, kind, value in [
+            ("uptime_seconds", "gauge", metrics["uptime_seconds"]),
+            ("polls_total", "counter", metrics["polls"]),
+            ("failed_polls_total", "counter", metrics["failed_polls"]),
+            ("new_pdfs_total", "counter", metrics["new_pdfs"]),
+            ("acts", "gauge", metrics["acts"]),
+            ("last_success_timestamp_seconds", "gauge", metrics["last_success_at"]),
+            ("healthy", "gauge", int(self.is_healthy())),
+        ]:
+            if value is None:
+                continue
+            lines.append(f"# TYPE borme_daemon_{name} {kind}")
+            lines.append(f"borme_daemon_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_health(host: str, port: int, metrics: DaemonMetrics) -> ThreadingHTTPServer:
+    """
+    Serve the health and metrics of the daemon from a thread:
+    GET /health answers 200 if the daemon is healthy and 503 otherwise, with the counters as json,
+    and GET /metrics answers with the counters in the text format of Prometheus.
+    """
+
+    class HealthHandler(BaseHTTPRequestHandler):
+        """Answer the requests to /health and /metrics"""
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """Send the health or the metrics of the daemon."""
+            if self.path == "/health":
+                status = 200 if metrics.is_healthy() else 503
+                body = json.dumps(metrics.to_dict()).encode("utf-8")
+                content_type = "application/json"
+            elif self.path == "/metrics":
+                status, body = 200, metrics.to_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            # The requests of the health checks are not logged
+            pass
+
+    server = ThreadingHTTPServer((host, port), HealthHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def poll_date(
+    date_: date,
+    executor,
+    max_per_host: int = 4,
+    max_cache_size: int = 0,
+    retries: int = 3,
+    rate: float = 0,
+    **options: Any,
+) -> tuple[int, int]:
+    """
+    Request the BORME registry webpage of the date, with a conditional request if it is cached.
+    If it links to pdfs that were not downloaded yet, download them and parse the pdfs of the date
+    with daily_spyder_and_crawler, which receives the rest of the options.
+    Return the number of new pdfs and the number of acts of the date.
+    If the request of the webpage fails or receives a status code other than 200,
+    a RequestException is raised, so the poll counts as failed.
+    """
+    data_dir = OUTPUT_DIR / date_.strftime("%Y-%m-%d")
+    pdf_urls = get_pdf_urls(
+        date_,
+        skip_first_and_last=True,
+        session=get_session(max_per_host),
+        max_cache_size=max_cache_size,
+        retries=retries,
+        rate=rate,
+        raise_errors=True,
+    )
+    manifest = read_manifest(str(data_dir / "manifest.jsonl"))
+    new_urls = [
+        url for url in pdf_urls if not is_download_complete(manifest.get(url), data_dir)
+    ]
+
+    if len(new_urls) > 0:
+        log_new_pdfs_for_date(len(new_urls), date_)
+        # The spyder reads the urls of the webpage from the txt file, and downloads the new ones
+        data_dir.mkdir(parents=True, exist_ok=True)
+        write_txt_from_list(pdf_urls, path=str(data_dir / "pdf_urls.txt"))
+        # The acts of the pdfs parsed in previous polls are reused
+        daily_spyder_and_crawler(
+            date_,
+            executor,
+            max_per_host=max_per_host,
+            max_cache_size=max_cache_size,
+            retries=retries,
+            rate=rate,
+            **options,
+        )
+
+    acts_path = data_dir / "acts.jsonl"
+    if not acts_path.is_file():
+        return len(new_urls), 0
+    with open(acts_path, "rb") as file:
+        return len(new_urls), sum(1 for _ in file)
+
+
+@click.command()
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=1),
+    default=300,
+    help="Seconds between two polls of the BORME webpage. Defaults to 300.",
+)
+@click.option(
+    "--host",
+    default="127.0.0.1",
+    help="Address of the health and metrics endpoint. Defaults to 127.0.0.1.",
+)
+@click.option(
+    "--port",
+    type=click.IntRange(min=0, max=65535),
+    default=8787,
+    help="Port of the health and metrics endpoint. Defaults to 8787.",
+)
+@click.option(
+    "--date",
+    "watched_date",
+    type=str,
+    default=None,
+    help="Date YYYYMMDD to watch instead of the current day.",
+)
+def main(
+    interval: float,
+    host: str,
+    port: int,
+    watched_date: str | None,
+    workers: int = 1,
+    max_per_host: int = 4,
+    processes: int = 1,
+    cache_size: int = 512,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+    structured: bool = False,
+    retries: int = 3,
+    rate: float = 5.0,
+    use_async: bool = False,
+) -> None:
+    """
+    Poll the BORME registry webpage of the day every INTERVAL seconds,
+    download and parse its new pdfs as soon as they are published.
+    The health and metrics of the daemon are served at http://HOST:PORT/health and /metrics.
+    Stop with SIGINT or SIGTERM.
+    """
+    set_up_root_logger()
+
+    fixed_date = None if watched_date is None else cast_str_to_date(watched_date)
+    if watched_date is not None and fixed_date is None:
+        return
+
+    # Stop after the current poll when the process is asked to terminate
+    stopped = Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+
+    metrics = DaemonMetrics(interval)
+    server = serve_health(host, port, metrics)
+    log_started_daemon(f"http://{host}:{server.server_address[1]}", interval)
+
+    # The pool of parser processes is shared by every poll
+    with parsing_pool(processes) as executor:
+        while not stopped.is_set():
+            date_ = fixed_date or date.today()
+            if is_borme_published(date_):
+                try:
+                    new_pdfs, acts = poll_date(
+                        date_,
+                        executor,
+                        workers=workers,
+                        max_per_host=max_per_host,
+                        max_cache_size=cache_size * 1024**2,
+                        parquet=parquet,
+                        sqlite=sqlite,
+                        index=index,
+                        structured=structured,
+                        retries=retries,
+                        rate=rate,
+                        use_async=use_async,
+                    )
+                    metrics.record_poll(new_pdfs, acts)
+                # A failed poll must not stop the daemon, it is retried in the next poll
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    log_failed_poll(e, date_)
+                    metrics.record_failed_poll(e)
+            else:
+                # Nothing is published today, the daemon is idle but healthy
+                metrics.record_poll(0, 0)
+            stopped.wait(interval)
+
+    server.shutdown()
+    log_stopped_daemon()
+
+
+if __name__ == "__main__":
+    main.params.extend(
+        [
+            workers_option,
+            max_per_host_option,
+            processes_option,
+            cache_size_option,
+            parquet_option,
+            sqlite_option,
+            index_option,
+            structured_option,
+            retries_option,
+            rate_option,
+            async_option,
+        ]
+    )
+    main()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,327 @@
+"""
+Distribute the dates of a backfill between several workers, on one host or on several hosts
+that share the data directory, through a work queue stored in a SQLite database.
+The coordinator adds the dates to the queue, each worker claims one date at a time,
+downloads and parses its pdfs, and renews its lease on the date while it works.
+If a worker dies, its lease expires and the date is claimed by another worker.
+The finished dates are never processed again.
+
+Usage:
+    python3 distributed.py coordinator DATES... [--queue PATH]
+    python3 distributed.py worker [--queue PATH] [-j JOBS] [--lease SECONDS] [OPTIONS]
+    python3 distributed.py status [--queue PATH]
+"""
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from datetime import date
+from multiprocessing import Process, Queue
+from threading import Event, Thread
+from typing import Any, Iterator
+
+import click
+
+from cli import (
+    async_option,
+    cache_size_option,
+    index_option,
+    max_per_host_option,
+    parquet_option,
+    processes_option,
+    rate_option,
+    retries_option,
+    sqlite_option,
+    structured_option,
+    workers_option,
+)
+from crawler import parsing_pool
+from logs import (
+    set_up_root_logger,
+    set_up_worker_logger,
+    worker_logs_listener,
+    log_claimed_date,
+    log_enqueued_dates,
+    log_failed_work_item,
+    log_lost_lease,
+    log_no_dates_read,
+    log_no_dates_to_claim,
+)
+from main import daily_spyder_and_crawler
+from utils.paths import DATA_DIR
+from utils.run_report import get_date_summary
+from utils.type_casting import uniq_dates_in_list
+from utils.work_queue import (
+    DEFAULT_RETRY_DELAY,
+    MAX_RETRY_DELAY,
+    claim_date,
+    enqueue_dates,
+    get_queue_status,
+    release_date,
+    renew_lease,
+    requeue_expired_leases,
+)
+
+# SQLite work queue shared by the coordinator and the workers
+WORK_QUEUE_PATH = DATA_DIR / "work_queue.sqlite"
+
+queue_option = click.option(
+    "--queue",
+    "queue_path",
+    type=click.Path(dir_okay=False),
+    default=str(WORK_QUEUE_PATH),
+    help="Path of the SQLite work queue, on a filesystem shared by every worker."
+    + " Defaults to data/work_queue.sqlite.",
+)
+max_attempts_option = click.option(
+    "--max-attempts",
+    type=click.IntRange(min=1),
+    default=3,
+    help="Number of times a date is attempted before it is marked as failed."
+    + " Defaults to 3.",
+)
+retry_delay_option = click.option(
+    "--retry-delay",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_RETRY_DELAY,
+    help="Seconds before a failed date is attempted again, doubled with each attempt,"
+    + f" up to {MAX_RETRY_DELAY:.0f}. Defaults to {DEFAULT_RETRY_DELAY:.0f}.",
+)
+
+
+@contextmanager
+def heartbeat(
+    queue_path: str, date_: date, worker: str, lease_seconds: float
+) -> Iterator[Event]:
+    """
+    Renew the lease of the worker on the date from a thread, 3 times per lease, while in the block.
+    Yield an event that is set if the lease was lost.
+    """
+    stopped, lost = Event(), Event()
+
+    def renew() -> None:
+        while not stopped.wait(lease_seconds / 3):
+            if not renew_lease(queue_path, date_, worker, lease_seconds):
+                lost.set()
+                return
+
+    thread = Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield lost
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def process_date(date_: date, executor, **options: Any) -> str | None:
+    """
+    Download and parse the pdfs of the date with daily_spyder_and_crawler, as main.py does.
+    Return None if the date succeeded, or the reason why it failed.
+    """
+    daily_spyder_and_crawler(date_, executor, **options)
+    summary = get_date_summary("main", date_, [], {})
+    if summary["status"] == "failed":
+        return (
+            f"{summary['pdfs_found']} pdfs found, {summary['pdfs_on_disk']} on disk,"
+            + f" {summary['acts']} acts"
+        )
+    return None
+
+
+def run_worker(
+    queue_path: str,
+    lease: float,
+    max_attempts: int,
+    retry_delay: float = DEFAULT_RETRY_DELAY,
+    processes: int = 1,
+    **options: Any,
+) -> None:
+    """
+    Claim the dates of the work queue one at a time and process them with process_date,
+    until there are no pending dates left and no other worker holds a lease.
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    # The pool of parser processes is shared by every date of the worker
+    with parsing_pool(processes) as executor:
+        while True:
+            date_ = claim_date(queue_path, worker, lease, max_attempts)
+            if date_ is None:
+                # The dates leased by other workers are claimed if their lease expires,
+                # and the failed dates when their retry delay is over
+                status = get_queue_status(queue_path)
+                if status["leased"] == 0 and status["pending"] == 0:
+                    log_no_dates_to_claim(worker)
+                    return
+                time.sleep(min(lease / 4, 30))
+                continue
+
+            log_claimed_date(worker, date_)
+            with heartbeat(queue_path, date_, worker, lease) as lost:
+                # An error in a date must not stop the worker, the date is retried later
+                try:
+                    error = process_date(date_, executor, **options)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    error = repr(e)
+
+            if lost.is_set():
+                log_lost_lease(worker, date_)
+                continue
+            if error is not None:
+                log_failed_work_item(worker, date_, error)
+            release_date(
+                queue_path,
+                date_,
+                worker,
+                error is None,
+                error,
+                max_attempts,
+                retry_delay,
+            )
+
+
+def run_worker_process(
+    log_queue: Queue,
+    queue_path: str,
+    lease: float,
+    max_attempts: int,
+    retry_delay: float,
+    options: dict[str, Any],
+) -> None:
+    """Run a worker in a child process, which sends its logs to the parent process."""
+    set_up_worker_logger(log_queue)
+    run_worker(queue_path, lease, max_attempts, retry_delay, **options)
+
+
+@click.group()
+def cli() -> None:
+    """Distribute the dates of a backfill between several workers."""
+
+
+@cli.command()
+@click.argument("input_dates", nargs=-1, type=str)
+@queue_option
+@max_attempts_option
+@retry_delay_option
+def coordinator(
+    input_dates: tuple[str, ...],
+    queue_path: str,
+    max_attempts: int,
+    retry_delay: float,
+) -> None:
+    """
+    Add the dates (YYYYMMDD, or ranges YYYYMMDD..YYYYMMDD) to the work queue,
+    make the dates with expired leases pending again, or failed after too many attempts,
+    and print the status of the queue.
+    """
+    set_up_root_logger()
+
+    uniq_dates = uniq_dates_in_list(input_dates)
+    if len(uniq_dates) == 0:
+        log_no_dates_read()
+
+    num_of_new_dates = enqueue_dates(queue_path, uniq_dates)
+    log_enqueued_dates(num_of_new_dates, len(uniq_dates), queue_path)
+    requeue_expired_leases(queue_path, max_attempts, retry_delay)
+    click.echo(json.dumps(get_queue_status(queue_path)))
+
+
+@cli.command()
+@queue_option
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes started on this host. Defaults to 1.",
+)
+@click.option(
+    "--lease",
+    type=click.FloatRange(min=1),
+    default=600,
+    help="Seconds a date stays leased to a worker without a heartbeat. Defaults to 600.",
+)
+@max_attempts_option
+@retry_delay_option
+def worker(
+    queue_path: str,
+    jobs: int,
+    lease: float,
+    max_attempts: int,
+    retry_delay: float,
+    workers: int = 1,
+    max_per_host: int = 4,
+    processes: int = 1,
+    cache_size: int = 512,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+    structured: bool = False,
+    retries: int = 3,
+    rate: float = 5.0,
+    use_async: bool = False,
+) -> None:
+    """
+    Claim the dates of the work queue and download and parse their pdfs,
+    until there are no dates left. Several workers can run on several hosts at the same time.
+    """
+    set_up_root_logger()
+
+    options = {
+        "processes": processes,
+        "workers": workers,
+        "max_per_host": max_per_host,
+        "max_cache_size": cache_size * 1024**2,
+        "parquet": parquet,
+        "sqlite": sqlite,
+        "index": index,
+        "structured": structured,
+        "retries": retries,
+        "rate": rate,
+        "use_async": use_async,
+    }
+    if jobs == 1:
+        run_worker(queue_path, lease, max_attempts, retry_delay, **options)
+        return
+
+    # The logs of every worker process are written by this process
+    with worker_logs_listener() as log_queue:
+        worker_processes = [
+            Process(
+                target=run_worker_process,
+                args=(log_queue, queue_path, lease, max_attempts, retry_delay, options),
+            )
+            for _ in range(jobs)
+        ]
+        for process in worker_processes:
+            process.start()
+        for process in worker_processes:
+            process.join()
+
+
+@cli.command()
+@queue_option
+def status(queue_path: str) -> None:
+    """Print the number of pending, leased, done and failed dates of the work queue."""
+    click.echo(json.dumps(get_queue_status(queue_path)))
+
+
+if __name__ == "__main__":
+    # The worker accepts the same download and parsing options as main.py
+    worker.params.extend(
+        [
+            workers_option,
+            max_per_host_option,
+            processes_option,
+            cache_size_option,
+            parquet_option,
+            sqlite_option,
+            index_option,
+            structured_option,
+            retries_option,
+            rate_option,
+            async_option,
+        ]
+    )
+    cli()
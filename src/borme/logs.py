@@ -1,26 +1,100 @@
 """
 This module is used to set up the python root logger,
 and to contain a variety of functions that print specific warnings and informational messages.
+
+The records are not formatted nor written by the threads that log them: they are put in a queue,
+and a listener thread formats them and writes them to the log file and to stderr,
+so logging never blocks the parsing or the downloads.
+The worker processes send their records to the listener of the parent process through another queue,
+in that case each record is formatted by the worker process before it is sent.
+If the environment variable BORME_LOG_FORMAT is 'json', the log file has one json object per record,
+with the fields of the record (date, pdf, stage, count...) next to the message.
 """
+import atexit
+import json
+import os
+from contextlib import contextmanager
 from datetime import date, datetime
-from logging import INFO, FileHandler, Handler, StreamHandler, basicConfig, getLogger
+from logging import (
+    INFO,
+    FileHandler,
+    Formatter,
+    Handler,
+    LogRecord,
+    StreamHandler,
+    getLogger,
+)
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Queue
 from os.path import isfile
-from pathlib import Path
-
-from requests.exceptions import RequestException
+from queue import SimpleQueue
+from typing import TYPE_CHECKING, Iterator
+
+from utils.paths import DATA_DIR
+
+if TYPE_CHECKING:
+    # Only needed for the annotations, requests is not imported by the scripts that do not use it
+    from requests.exceptions import RequestException
+
+# The root logger is set up once per process, by the first script or cli that needs it
+_root_logger_set_up = False
+# Thread that writes the records queued by the root logger to the log file and stderr
+_listener: QueueListener | None = None
+# The helpers log with the root logger, looked up once
+_logger = getLogger()
+
+TEXT_LOG_FORMAT = "%(asctime)s: %(levelname)-8s: %(message)s"
+# Attributes of every log record, the rest of the attributes are the fields passed in `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+}
+
+
+class JsonFormatter(Formatter):
+    """Format each log record as a json object, with its extra fields"""
+
+    def format(self, record: LogRecord) -> str:
+        fields = {
+            "time": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                fields[name] = value
+        return json.dumps(fields, ensure_ascii=False, default=str)
+
+
+class InProcessQueueHandler(QueueHandler):
+    """
+    Handler that puts the records in a queue read by a listener thread of the same process.
+    QueueHandler.prepare formats the message in the thread that logs the record,
+    so that the record can be sent to another process.
+    Here the record stays in the process, so its message and arguments are kept as they are,
+    and the listener formats them. The arguments of the log helpers are never modified afterwards:
+    they are strings, numbers, dates and exceptions.
+    """
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        return record
 
 
 def set_up_root_logger() -> None:
-    """Set up configuration of root logger"""
+    """Set up configuration of root logger, only the first time it is called"""
+    global _root_logger_set_up  # pylint: disable=global-statement
+    if _root_logger_set_up:
+        return
+    _root_logger_set_up = True
+
+    json_format = os.environ.get("BORME_LOG_FORMAT") == "json"
 
     # Set log file path.
     current_date = datetime.today().strftime("%Y%m%d")
-    log_file = (
-        Path(__file__).parent.parent.parent
-        / "data"
-        / "logs"
-        / f"{current_date}_execution.log"
-    )
+    extension = "jsonl" if json_format else "log"
+    log_file = DATA_DIR / "logs" / f"{current_date}_execution.{extension}"
 
     # If file does not exist, create and empty file at that path
     if not isfile(log_file):
@@ -29,89 +103,188 @@ def set_up_root_logger() -> None:
         # create file
         open(log_file, "a", encoding="utf-8").close()
 
-    # Handlers: write logs to file and print to stdout
-    handlers: list[Handler] = [FileHandler(str(log_file)), StreamHandler()]
-
-    # Apply config to root logger
-    basicConfig(
-        handlers=handlers,
-        format="%(asctime)s: %(levelname)-8s: %(message)s",
-        level=INFO,
+    # Handlers: write logs to file and print to stderr
+    file_handler = FileHandler(str(log_file))
+    file_handler.setFormatter(
+        JsonFormatter() if json_format else Formatter(TEXT_LOG_FORMAT)
+    )
+    stream_handler = StreamHandler()
+    stream_handler.setFormatter(Formatter(TEXT_LOG_FORMAT))
+
+    # The root logger only puts the records in the queue, the listener formats and writes them.
+    # The records that are still in the queue are written before the process exits
+    global _listener  # pylint: disable=global-statement
+    queue: SimpleQueue = SimpleQueue()
+    _listener = QueueListener(
+        queue, file_handler, stream_handler, respect_handler_level=True
     )
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    _logger.addHandler(InProcessQueueHandler(queue))
+    _logger.setLevel(INFO)
+
+
+def get_log_handlers() -> list[Handler]:
+    """Return the handlers that write the records logged by this process."""
+    if _listener is not None:
+        return list(_listener.handlers)
+    return list(_logger.handlers)
+
+
+def add_log_handler(handler: Handler) -> None:
+    """
+    Add a handler that receives every record logged by this process,
+    and by the worker processes started afterwards.
+    """
+    if _listener is not None:
+        _listener.handlers = (*_listener.handlers, handler)
+    else:
+        _logger.addHandler(handler)
+
+
+def remove_log_handler(handler: Handler) -> None:
+    """Remove a handler added with add_log_handler."""
+    if _listener is not None:
+        _listener.handlers = tuple(h for h in _listener.handlers if h is not handler)
+    else:
+        _logger.removeHandler(handler)
+
+
+def flush_logs() -> None:
+    """Wait until the listener has written every record that is already in the queue."""
+    if _listener is not None:
+        # Stopping the listener handles the records in the queue, then it starts again
+        _listener.stop()
+        _listener.start()
+
+
+def set_up_worker_logger(queue: Queue) -> None:
+    """
+    Set up the root logger of a worker process,
+    such that every log record is sent to the parent process through the queue.
+    """
+    _logger.handlers = [QueueHandler(queue)]
+    _logger.setLevel(INFO)
+
+
+@contextmanager
+def worker_logs_listener() -> Iterator[Queue]:
+    """
+    Yield a queue where worker processes can send their log records,
+    the records are written by the handlers of the current process.
+    """
+    queue: Queue = Queue()
+    listener = QueueListener(queue, *get_log_handlers(), respect_handler_level=True)
+    listener.start()
+    try:
+        yield queue
+    finally:
+        # Stop after handling every record that is already in the queue
+        listener.stop()
+
+
+@contextmanager
+def collecting_unexpected_num_of_matches(pdf: str) -> Iterator[list[list]]:
+    """
+    Yield a list where the pattern, num_of_matches and expected_num_of_matches
+    of each unexpected_num_of_matches warning of the pdf logged in the block are collected,
+    so the warnings can be logged again when the parsed acts of the pdf are reused.
+    """
+    collected: list[list] = []
+
+    def collect(record: LogRecord) -> bool:
+        # The filters of the logger are applied by the thread that logs the record
+        if (
+            record.funcName == "log_unexpected_num_of_matches"
+            and getattr(record, "pdf", None) == pdf.split("/")[-1]
+        ):
+            collected.append(list(record.args[2:]))  # type: ignore[index]
+        return True
+
+    _logger.addFilter(collect)
+    try:
+        yield collected
+    finally:
+        _logger.removeFilter(collect)
 
 
 def log_no_target_elements(url: str, date_: date) -> None:
     """Log warning: no target elements found at url"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "'%s' : Couldn't find any links to pdfs at url '%s'. No pdfs will be downloaded for the date '%s'.",
-        date_.strftime("%Y-%m-%d"),
+        date_,
         url,
-        date_.strftime("%Y-%m-%d"),
+        date_,
+        extra={"date": date_, "stage": "get_pdf_urls", "url": url},
     )
 
 
 def log_non_200_status_code(status_code: int, url: str, date_: date) -> None:
     """Log warning: received non 200 status code from url"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "'%s' : Received status code '%s' from url '%s'.",
-        date_.strftime("%Y-%m-%d"),
+        date_,
         status_code,
         url,
+        extra={"date": date_, "url": url, "status_code": status_code},
     )
 
 
-def log_get_request_exception(e: RequestException, url: str, date_: date) -> None:
+def log_get_request_exception(e: "RequestException", url: str, date_: date) -> None:
     """Log warning: got exception after sending a get http request to a url"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "'%s' : Http get request to '%s' raised exception: '%s'",
-        date_.strftime("%Y-%m-%d"),
+        date_,
         url,
         e,
+        extra={"date": date_, "url": url},
     )
 
 
 def log_no_pdfs_for_date(date_: date) -> None:
     """Log warning: no url for date."""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "'%s' : Could not find any pdfs for the date '%s'. Skipping this date.",
-        date_.strftime("%Y-%m-%d"),
-        date_.strftime("%Y-%m-%d"),
+        date_,
+        date_,
+        extra={"date": date_, "stage": "get_pdf_urls"},
     )
 
 
 def log_dates_from_cl_and_file() -> None:
     """Log warning: reading dates from a file and passing them from the command line."""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "When reading from a text file, the dates passed in directly through the command line will be ignored. Use --help to print usage statement."
     )
 
 
 def log_no_dates_read() -> None:
     """Log warning: no dates where passed to the script"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "No dates where passed to the script. Use --help to print usage statement."
     )
 
 
 def log_cannot_cast_str_to_date(my_date: str) -> None:
     """Log warning: no dates where passed to the script"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "Could not convert string '%s' to date. This element will be skipped",
         my_date,
     )
 
 
+def log_invalid_date_range(date_range: str) -> None:
+    """Log warning: the range of dates is not valid"""
+    _logger.warning(
+        "Could not convert string '%s' to a range of dates. The range must have the format 'YYYYMMDD..YYYYMMDD', with the first date before the second one. This element will be skipped",
+        date_range,
+    )
+
+
 def log_duplicate_dates(dates: list[date]) -> None:
     """Log warning: no dates where passed to the script"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "The list of dates '%s' has duplicate elements. The duplicates will be dropped.",
         [e.strftime("%Y-%m-%d") for e in dates],
     )
@@ -125,54 +298,225 @@ def log_unexpected_num_of_matches(
     pdf: str,
 ) -> None:
     """Log warning: got an unexpected num of matches"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "'%s' : '%s' : The pattern '%s' has '%s' matches, expected '%s'.",
-        date_.strftime("%Y-%m-%d"),
+        date_,
         pdf.split("/")[-1],
         pattern,
         num_of_matches,
         expected_num_of_matches,
+        extra={
+            "date": date_,
+            "pdf": pdf.split("/")[-1],
+            "stage": "drop_headers_and_footnotes",
+            "count": num_of_matches,
+        },
     )
 
 
 def log_date_data_dir_does_not_exist(path: str, date_: date) -> None:
     """Log warning: there is not an existing data dir for the date"""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "'%s' : When attempting to read the pdfs for the date '%s', expected a directory containing all the pdfs at the path '%s', but this directory does not exist.",
-        date_.strftime("%Y-%m-%d"),
-        date_.strftime("%Y-%m-%d"),
+        date_,
+        date_,
         path,
+        extra={"date": date_},
     )
 
 
 def log_no_pdfs_in_dir(path: str, date_: date) -> None:
     """Log warning: there are no pdfs in the directory."""
-    logger = getLogger()
-    logger.warning(
+    _logger.warning(
         "'%s' : When attempting to read the pdfs for the date '%s', expected a directory containing all the pdfs at the path '%s', but this directory does not contain any pdfs.",
-        date_.strftime("%Y-%m-%d"),
-        date_.strftime("%Y-%m-%d"),
+        date_,
+        date_,
         path,
+        extra={"date": date_},
     )
 
 
 def log_finished_daily_crawler(date_: date) -> None:
     """Log info: finished execution of the daily crawler."""
-    logger = getLogger()
-    logger.info(
+    _logger.info(
         "'%s' : Daily crawler finished execution. Parsed all the pdfs for the date '%s'.",
-        date_.strftime("%Y-%m-%d"),
-        date_.strftime("%Y-%m-%d"),
+        date_,
+        date_,
+        extra={"date": date_, "stage": "daily_crawler"},
     )
 
 
 def log_finished_daily_spyder(date_: date) -> None:
     """Log info: finished execution of the daily spyder."""
-    logger = getLogger()
-    logger.info(
+    _logger.info(
         "'%s' : Daily spyder finished execution. Downloaded all the pdfs for the date '%s'.",
-        date_.strftime("%Y-%m-%d"),
-        date_.strftime("%Y-%m-%d"),
+        date_,
+        date_,
+        extra={"date": date_, "stage": "daily_spyder"},
+    )
+
+
+def log_skipped_complete_pdfs(num_of_pdfs: int, date_: date) -> None:
+    """Log info: some pdfs were already downloaded, they will not be downloaded again."""
+    _logger.info(
+        "'%s' : '%s' pdfs were already downloaded completely. Skipping them.",
+        date_,
+        num_of_pdfs,
+        extra={"date": date_, "stage": "download_pdf", "count": num_of_pdfs},
+    )
+
+
+def log_reused_parsed_pdfs(num_of_pdfs: int, date_: date) -> None:
+    """Log info: some pdfs did not change since they were parsed, their acts are reused."""
+    _logger.info(
+        "'%s' : '%s' pdfs did not change since they were last parsed. Reusing their acts.",
+        date_,
+        num_of_pdfs,
+        extra={"date": date_, "stage": "parse_pdf", "count": num_of_pdfs},
+    )
+
+
+def log_missing_optional_dependency(package: str, feature: str) -> None:
+    """Log warning: an optional dependency is not installed"""
+    _logger.warning(
+        "The optional dependency '%s' is required to %s, but it is not installed. Skipping this step.",
+        package,
+        feature,
+    )
+
+
+def log_company_index_does_not_exist(index_path: str) -> None:
+    """Log warning: the company index has not been built yet"""
+    _logger.warning(
+        "The company index %s does not exist. Run the crawler with --index, or the lookup with --reindex.",
+        index_path,
+    )
+
+
+def log_stale_company_index_entry(acts_path: str, act_id: str) -> None:
+    """Log warning: an entry of the company index does not match the acts.jsonl file"""
+    _logger.warning(
+        "The act %s is not where the company index says in %s, the index is out of date. Run the lookup with --reindex.",
+        act_id,
+        acts_path,
+    )
+
+
+def log_invalid_manifest_line(manifest_path: str, line_number: int) -> None:
+    """Log warning: a line of a download manifest is not valid json, e.g. it was half written"""
+    _logger.warning(
+        "The line %s of the manifest %s is not valid json, it is skipped. Its pdf will be downloaded again.",
+        line_number,
+        manifest_path,
+    )
+
+
+def log_retrying_request(url: str, attempt: int, retries: int, delay: float) -> None:
+    """Log info: a http request failed and is going to be sent again"""
+    _logger.info(
+        "Http get request to '%s' failed, retrying in %.1f seconds (retry %s of %s).",
+        url,
+        delay,
+        attempt,
+        retries,
+        extra={"url": url, "count": attempt},
+    )
+
+
+def log_started_daemon(address: str, interval: float) -> None:
+    """Log info: the daemon started polling, with its health endpoint"""
+    _logger.info(
+        "Daemon started. Polling the BORME every %.0f seconds, health and metrics at %s.",
+        interval,
+        address,
+    )
+
+
+def log_new_pdfs_for_date(num_of_pdfs: int, date_: date) -> None:
+    """Log info: the daemon found new pdfs for a date, they will be downloaded and parsed"""
+    _logger.info(
+        "'%s' : Found '%s' new pdfs. Downloading and parsing them.",
+        date_,
+        num_of_pdfs,
+        extra={"date": date_, "count": num_of_pdfs},
+    )
+
+
+def log_failed_poll(e: Exception, date_: date) -> None:
+    """Log warning: a poll of the daemon raised an exception, it is retried in the next poll"""
+    _logger.warning(
+        "'%s' : The poll failed with the exception '%r'. Retrying in the next poll.",
+        date_,
+        e,
+        extra={"date": date_},
+    )
+
+
+def log_stopped_daemon() -> None:
+    """Log info: the daemon stopped"""
+    _logger.info("Daemon stopped.")
+
+
+def log_wrote_run_report(
+    report_path: str, num_of_dates: int, num_of_failed_dates: int
+) -> None:
+    """Log info: the report of the run was written"""
+    _logger.info(
+        "Run finished: '%s' dates, '%s' failed. Report written to '%s'.",
+        num_of_dates,
+        num_of_failed_dates,
+        report_path,
+    )
+
+
+def log_profile_summary(summary: str) -> None:
+    """Log info: the summary table of the time spent in each stage of the run"""
+    _logger.info("Time spent in each stage of the run:\n%s", summary)
+
+
+def log_enqueued_dates(
+    num_of_new_dates: int, num_of_dates: int, queue_path: str
+) -> None:
+    """Log info: the dates were added to the work queue"""
+    _logger.info(
+        "Added '%s' new dates to the work queue '%s', '%s' dates were already in the queue.",
+        num_of_new_dates,
+        queue_path,
+        num_of_dates - num_of_new_dates,
+    )
+
+
+def log_claimed_date(worker: str, date_: date) -> None:
+    """Log info: a worker claimed a date of the work queue"""
+    _logger.info(
+        "'%s' : Worker '%s' claimed the date.",
+        date_,
+        worker,
+        extra={"date": date_, "worker": worker},
     )
+
+
+def log_lost_lease(worker: str, date_: date) -> None:
+    """Log warning: the lease of a worker on a date expired, another worker may process the date"""
+    _logger.warning(
+        "'%s' : Worker '%s' lost its lease on the date, another worker may process it too.",
+        date_,
+        worker,
+        extra={"date": date_, "worker": worker},
+    )
+
+
+def log_failed_work_item(worker: str, date_: date, error: str) -> None:
+    """Log warning: a worker could not process a date, it will be retried"""
+    _logger.warning(
+        "'%s' : Worker '%s' could not process the date: %s. It is retried until it fails too many times.",
+        date_,
+        worker,
+        error,
+        extra={"date": date_, "worker": worker},
+    )
+
+
+def log_no_dates_to_claim(worker: str) -> None:
+    """Log info: the work queue has no dates left for a worker"""
+    _logger.info("Worker '%s' found no dates left to claim. Stopping.", worker)
@@ -1,19 +1,263 @@
 """Given a series of dates, execute the daily spyder and daily crawler for each one."""
+from collections import defaultdict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
 from datetime import date
+from os.path import getsize
+from pathlib import Path
+from queue import Queue
+from threading import Thread
 
-from spyder import daily_spyder
-from crawler import daily_crawler
-from cli import dates_cli
-from logs import set_up_root_logger, log_no_dates_read
-from utils.type_casting import uniq_dates_in_list
+import click
 
+from spyder import daily_spyder, iter_daily_spyder
+from crawler import (
+    daily_crawler,
+    drop_stale_parse_cache,
+    add_act_entries,
+    export_acts,
+    parse_pdf_cached,
+    parsing_pool,
+)
+from cli import (
+    async_option,
+    cache_size_option,
+    concurrent_dates_option,
+    dates_cli,
+    index_option,
+    max_per_host_option,
+    parquet_option,
+    pipeline_option,
+    processes_option,
+    profile_option,
+    profile_output_option,
+    report_option,
+    metrics_file_option,
+    rate_option,
+    reparse_option,
+    retries_option,
+    revalidate_option,
+    sqlite_option,
+    stream_option,
+    structured_option,
+    workers_option,
+)
+from logs import log_finished_daily_crawler, set_up_root_logger, log_no_dates_read
+from utils.http_cache import DEFAULT_MAX_CACHE_SIZE
+from utils.run_report import run_report
+from utils.profiling import (
+    add_records,
+    call_and_collect_records,
+    is_profiling_enabled,
+    profiling,
+    stage,
+)
+from utils.type_casting import flatten, uniq_dates_in_list
+from utils.act_record import write_acts_to_jsonl
 
-def main(input_dates: tuple[str, ...]) -> None:
+
+def daily_spyder_and_crawler(
+    date_: date,
+    executor: Executor | None = None,
+    workers: int = 1,
+    max_per_host: int = 4,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+    revalidate: bool = False,
+    reparse: bool = False,
+    stream: bool = False,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+    structured: bool = False,
+    retries: int = 3,
+    rate: float = 5.0,
+    use_async: bool = False,
+) -> None:
+    """
+    Download the pdfs of the date with the daily spyder, then parse them with the daily crawler.
+    Used to process a date by main, by the daemon and by the workers of a distributed backfill.
+    """
+    daily_spyder(
+        date_,
+        workers=workers,
+        max_per_host=max_per_host,
+        max_cache_size=max_cache_size,
+        revalidate=revalidate,
+        retries=retries,
+        rate=rate,
+        use_async=use_async,
+    )
+    daily_crawler(
+        date_,
+        executor=executor,
+        stream=stream,
+        reparse=reparse,
+        parquet=parquet,
+        sqlite=sqlite,
+        index=index,
+        structured=structured,
+    )
+
+
+def pipelined_main(
+    uniq_dates: list[date],
+    workers: int = 1,
+    max_per_host: int = 4,
+    processes: int = 1,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+    revalidate: bool = False,
+    reparse: bool = False,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+    structured: bool = False,
+    retries: int = 3,
+    rate: float = 5.0,
+    use_async: bool = False,
+) -> None:
+    """
+    Download and parse the pdfs of every date at the same time.
+    A thread downloads the pdfs, and hands each one over a bounded queue to the parser
+    as soon as it is on disk, while the parser workers parse the pdfs downloaded before.
+    When the queue is full the downloads wait for the parser to catch up.
+    """
+    # Items of the queue: (date, (path to pdf, checksum)), (date, None) once all the pdfs of
+    # the date have been downloaded, and None once all the dates have been downloaded
+    queue: Queue[tuple[date, tuple[str, str] | None] | None] = Queue(
+        maxsize=2 * processes
+    )
+    download_errors: list[Exception] = []
+
+    def download_all_dates() -> None:
+        try:
+            for date_ in uniq_dates:
+                for download in iter_daily_spyder(
+                    date_,
+                    workers=workers,
+                    max_per_host=max_per_host,
+                    max_cache_size=max_cache_size,
+                    revalidate=revalidate,
+                    retries=retries,
+                    rate=rate,
+                    use_async=use_async,
+                ):
+                    queue.put((date_, download))
+                queue.put((date_, None))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The error is raised in the main thread, once the parser is done
+            download_errors.append(e)
+        finally:
+            queue.put(None)
+
+    # Parse futures of each date, checksum of each pdf, and dates whose pdfs are all downloaded
+    futures: dict[date, list[tuple[str, Future]]] = defaultdict(list)
+    checksums: dict[str, str] = {}
+    downloaded_dates: list[date] = []
+
+    # With profiling, the worker processes return the records of their stages with the acts
+    collect_records = is_profiling_enabled() and processes > 1
+
+    def get_acts(future: Future) -> list:
+        if not collect_records:
+            return future.result()
+        acts, records = future.result()
+        add_records(records)
+        return acts
+
+    def write_acts(date_: date) -> None:
+        # Same order as daily_crawler: sorted by pdf name
+        pdfs_and_futures = sorted(futures.pop(date_, []), key=lambda e: e[0])
+        if len(pdfs_and_futures) == 0:
+            return
+        pdf_files = [pdf for pdf, _ in pdfs_and_futures]
+        acts = flatten([get_acts(future) for _, future in pdfs_and_futures])
+        if structured:
+            acts = [add_act_entries(act) for act in acts]
+        data_dir = Path(pdf_files[0]).parent
+        with stage("write_jsonl", date_) as stats:
+            write_acts_to_jsonl(str(data_dir / "acts.jsonl"), acts)
+            stats.bytes, stats.count = getsize(data_dir / "acts.jsonl"), len(acts)
+        export_acts(data_dir, date_, acts, parquet=parquet, sqlite=sqlite, index=index)
+        drop_stale_parse_cache(data_dir, {pdf: checksums.pop(pdf) for pdf in pdf_files})
+        log_finished_daily_crawler(date_)
+
+    with parsing_pool(processes) as process_pool, ThreadPoolExecutor(1) as thread:
+        # Without worker processes, the pdfs are parsed by a thread of this process
+        executor = process_pool if process_pool is not None else thread
+
+        downloader = Thread(target=download_all_dates, daemon=True)
+        downloader.start()
+
+        while (item := queue.get()) is not None:
+            date_, download = item
+            if download is None:
+                downloaded_dates.append(date_)
+            else:
+                pdf, checksums[pdf] = download
+                args = (parse_pdf_cached, pdf, date_, reparse, checksums[pdf])
+                if collect_records:
+                    args = (call_and_collect_records, *args)
+                futures[date_].append((pdf, executor.submit(*args)))
+
+            # Do not take more pdfs from the queue while all the workers are busy
+            in_progress = [f for e in futures.values() for _, f in e if not f.done()]
+            if len(in_progress) >= processes:
+                wait(in_progress, return_when=FIRST_COMPLETED)
+
+            # Write the acts of the dates that are completely parsed, in order
+            while downloaded_dates and all(
+                future.done() for _, future in futures[downloaded_dates[0]]
+            ):
+                write_acts(downloaded_dates.pop(0))
+
+        # Wait for the remaining dates
+        for date_ in downloaded_dates:
+            write_acts(date_)
+
+    downloader.join()
+    if download_errors:
+        raise download_errors[0]
+
+
+def main(
+    input_dates: tuple[str, ...],
+    workers: int = 1,
+    max_per_host: int = 4,
+    processes: int = 1,
+    stream: bool = False,
+    cache_size: int = DEFAULT_MAX_CACHE_SIZE // 1024**2,
+    revalidate: bool = False,
+    reparse: bool = False,
+    pipeline: bool = False,
+    concurrent_dates: int = 1,
+    parquet: bool = False,
+    sqlite: bool = False,
+    index: bool = False,
+    structured: bool = False,
+    retries: int = 3,
+    rate: float = 5.0,
+    use_async: bool = False,
+    profile: bool = False,
+    profile_output: str | None = None,
+    report: str | None = None,
+    metrics_file: str | None = None,
+) -> None:
     """
     For each date, parse the BORME registry webpage for that date,
     download all the relevant pdfs of the webpage,
     then parse the text in the pdfs and write one jsonl file per date with the parsed data.
     """
+    # The pipeline parses the pdfs in memory, and processes the dates one after the other
+    if pipeline and stream:
+        raise click.UsageError("--pipeline cannot be combined with --stream.")
+    if pipeline and concurrent_dates > 1:
+        raise click.UsageError("--pipeline cannot be combined with --concurrent-dates.")
+
     set_up_root_logger()
 
     uniq_dates: list[date] = uniq_dates_in_list(input_dates)
@@ -21,10 +265,81 @@ def main(input_dates: tuple[str, ...]) -> None:
     if len(uniq_dates) == 0:
         log_no_dates_read()
 
-    for date_ in uniq_dates:
-        daily_spyder(date_)
-        daily_crawler(date_)
+    with run_report("main", uniq_dates, report, metrics_file), profiling(
+        profile or profile_output is not None, profile_output
+    ):
+        # Parse the pdfs while the next ones are being downloaded
+        if pipeline:
+            pipelined_main(
+                uniq_dates,
+                workers=workers,
+                max_per_host=max_per_host,
+                processes=processes,
+                max_cache_size=cache_size * 1024**2,
+                revalidate=revalidate,
+                reparse=reparse,
+                parquet=parquet,
+                sqlite=sqlite,
+                index=index,
+                structured=structured,
+                retries=retries,
+                rate=rate,
+                use_async=use_async,
+            )
+            return
+
+        def process_date(date_: date) -> None:
+            daily_spyder_and_crawler(
+                date_,
+                executor,
+                workers=workers,
+                max_per_host=max_per_host,
+                max_cache_size=cache_size * 1024**2,
+                revalidate=revalidate,
+                reparse=reparse,
+                stream=stream,
+                parquet=parquet,
+                sqlite=sqlite,
+                index=index,
+                structured=structured,
+                retries=retries,
+                rate=rate,
+                use_async=use_async,
+            )
+
+        # Process up to concurrent_dates dates at a time, in chronological order.
+        # The budgets are global: the limit of connections per host is shared by all the dates,
+        # and the same worker processes are used to parse the pdfs of every date
+        with parsing_pool(processes) as executor, ThreadPoolExecutor(
+            concurrent_dates
+        ) as scheduler:
+            # Consume the results so that unexpected errors are raised
+            for _ in scheduler.map(process_date, uniq_dates):
+                pass
 
 
 if __name__ == "__main__":
-    dates_cli(main)()  # pylint: disable=no-value-for-parameter
+    cli = dates_cli(
+        main,
+        workers_option,
+        max_per_host_option,
+        processes_option,
+        stream_option,
+        cache_size_option,
+        revalidate_option,
+        reparse_option,
+        pipeline_option,
+        concurrent_dates_option,
+        parquet_option,
+        sqlite_option,
+        index_option,
+        structured_option,
+        retries_option,
+        rate_option,
+        async_option,
+        profile_option,
+        profile_output_option,
+        report_option,
+        metrics_file_option,
+    )
+    cli()  # pylint: disable=no-value-for-parameter
@@ -3,13 +3,26 @@ Given a series of dates, parse the BORME registry webpage for that date,
 write one txt file per date with the links to all the pdfs of the webpage,
 and download all the pdfs.
 """
-import re
 from datetime import date
+from os.path import getsize, isfile
 from pathlib import Path
+from typing import Iterator
 
 import requests
-from bs4 import BeautifulSoup
-from cli import dates_cli
+from cli import (
+    async_option,
+    cache_size_option,
+    dates_cli,
+    max_per_host_option,
+    rate_option,
+    retries_option,
+    profile_option,
+    profile_output_option,
+    report_option,
+    metrics_file_option,
+    revalidate_option,
+    workers_option,
+)
 from logs import (
     set_up_root_logger,
     log_get_request_exception,
@@ -18,44 +31,92 @@ from logs import (
     log_non_200_status_code,
     log_no_dates_read,
     log_finished_daily_spyder,
+    log_skipped_complete_pdfs,
 )
 from requests.exceptions import RequestException
-from utils.borme_website import construct_borme_daily_url, download_pdf
+from utils.borme_website import (
+    BORME_BASE_URL,
+    construct_borme_daily_url,
+    download_pdfs,
+    extract_pdf_hrefs,
+    extract_pdf_hrefs_with_soup,
+    get_session,
+)
+from utils.http_cache import DEFAULT_MAX_CACHE_SIZE
+from utils.paths import OUTPUT_DIR
+from utils.run_report import run_report
+from utils.profiling import profiling, stage
+from utils.retries import get_with_retries
 from utils.type_casting import uniq_dates_in_list
-from utils.write_and_read_files import write_txt_from_list
+from utils.write_and_read_files import (
+    append_dict_to_jsonl,
+    read_list_from_txt,
+    read_manifest,
+    write_manifest,
+    write_txt_from_list,
+)
 
 
-def get_pdf_urls(date_: date, skip_first_and_last=True) -> list:
+def get_pdf_urls(
+    date_: date,
+    skip_first_and_last=True,
+    session: requests.Session | None = None,
+    max_cache_size: int = 0,
+    retries: int = 3,
+    rate: float = 0,
+    raise_errors: bool = False,
+) -> list:
     """
     Parse the 'Actos inscritos' section of the BORME registry webpage for a given day,
     return a list with the links to all the pdfs of the webpage.
+    If max_cache_size is not 0, the webpage is cached and revalidated with a conditional request.
+    A failed request is retried up to `retries` times, at most `rate` requests per second.
+    If raise_errors is True, a request that fails or receives a status code other than 200
+    raises a RequestException instead of returning an empty list,
+    e.g. so the daemon can tell when the website is down.
     """
     url = construct_borme_daily_url(date_)
     try:
-        response = requests.get(url, timeout=5)
+        with stage("get_pdf_urls", date_) as stats:
+            status_code, content, _ = get_with_retries(
+                url,
+                session=session,
+                timeout=5,
+                max_cache_size=max_cache_size,
+                retries=retries,
+                rate=rate,
+            )
+            stats.bytes = len(content)
     # if get request raises exception, log warning and return
     except RequestException as e:
+        if raise_errors:
+            raise
         log_get_request_exception(e, url, date_)
         return []
 
     # If status code is not 200, log warning and return empty list
-    if response.status_code != 200:
-        log_non_200_status_code(response.status_code, url, date_)
+    if status_code != 200:
+        if raise_errors:
+            raise requests.HTTPError(
+                f"Received status code '{status_code}' from url '{url}'"
+            )
+        log_non_200_status_code(status_code, url, date_)
         return []
 
-    # Load html from url to soup
-    soup = BeautifulSoup(response.content, "html.parser")
-    # Find all html <a> elements with an href, and a title including the word 'PDF'
-    target_elements = soup.find_all(
-        "a", attrs={"title": re.compile("PDF"), "href": True}
-    )
+    # Find the href of all html <a> elements with a title including the word 'PDF'.
+    # If the fast scan of the page fails or finds nothing, fall back to a full soup tree
+    with stage("extract_pdf_hrefs", date_) as stats:
+        hrefs = extract_pdf_hrefs(content)
+        if not hrefs:
+            hrefs = extract_pdf_hrefs_with_soup(content)
+        stats.count = len(hrefs)
     # If no elements were found, log warning and return empty list
-    if len(target_elements) == 0:
+    if len(hrefs) == 0:
         log_no_target_elements(url, date_)
         return []
 
     # The pdf urls are the href of the target elements
-    pdf_urls = ["https://www.boe.es" + el["href"] for el in target_elements]
+    pdf_urls = [BORME_BASE_URL + href for href in hrefs]
 
     if skip_first_and_last and len(pdf_urls) > 2:
         return pdf_urls[1:-1]
@@ -63,23 +124,81 @@ def get_pdf_urls(date_: date, skip_first_and_last=True) -> list:
     return pdf_urls
 
 
-def daily_spyder(date_: date) -> None:
+def is_download_complete(entry: dict | None, data_dir: Path) -> bool:
+    """
+    Check if the manifest entry of a pdf corresponds to a complete download,
+    whose file is still in the data directory with the expected size.
+    """
+    if entry is None or entry["status"] != "complete":
+        return False
+    path = data_dir / entry["file"]
+    return isfile(path) and getsize(path) == entry["size"]
+
+
+def daily_spyder(
+    date_: date,
+    workers: int = 1,
+    max_per_host: int = 4,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+    revalidate: bool = False,
+    retries: int = 3,
+    rate: float = 0,
+    use_async: bool = False,
+) -> None:
     """
     Parse the 'Actos inscritos' section of the BORME registry webpage for a given day,
     write a txt file with the links to all the pdfs of the webpage,
-    download all the pdfs.
+    download all the pdfs, using up to `workers` concurrent downloads.
+    The responses are cached on disk, up to max_cache_size bytes.
+    If revalidate is True, the webpage and every pdf are requested again,
+    with conditional requests that reuse the cached responses that did not change.
+    Failed requests are retried up to `retries` times, with exponential backoff,
+    and at most `rate` requests per second are sent to the same host (0 means no limit).
+    If use_async is True, the downloads are scheduled by an asyncio event loop.
+    """
+    for _ in iter_daily_spyder(
+        date_,
+        workers=workers,
+        max_per_host=max_per_host,
+        max_cache_size=max_cache_size,
+        revalidate=revalidate,
+        retries=retries,
+        rate=rate,
+        use_async=use_async,
+    ):
+        pass
+
+
+def iter_daily_spyder(
+    date_: date,
+    workers: int = 1,
+    max_per_host: int = 4,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+    revalidate: bool = False,
+    retries: int = 3,
+    rate: float = 0,
+    use_async: bool = False,
+) -> Iterator[tuple[str, str]]:
+    """
+    Version of daily_spyder that yields the path and the sha256 checksum of each pdf of the date
+    as soon as it is on disk: first the pdfs downloaded by previous runs, then each new download.
     """
     # Set directory to store the output data for that day
-    data_dir = (
-        Path(__file__).parent.parent.parent
-        / "data"
-        / "output"
-        / date_.strftime("%Y-%m-%d")
-    )
+    data_dir = OUTPUT_DIR / date_.strftime("%Y-%m-%d")
     data_dir.mkdir(parents=True, exist_ok=True)  # mkdir will be ignored if dir exists
 
-    # We do not care about the first and last pdfs: they are just indices for the rest of the pdfs
-    pdf_urls = get_pdf_urls(date_, skip_first_and_last=True)
+    # Reuse the pdf urls of a previous run, otherwise parse the webpage
+    pdf_urls = [] if revalidate else read_list_from_txt(str(data_dir / "pdf_urls.txt"))
+    if len(pdf_urls) == 0:
+        # We do not care about the first and last pdfs: they are just indices for the rest of the pdfs
+        pdf_urls = get_pdf_urls(
+            date_,
+            skip_first_and_last=True,
+            session=get_session(max_per_host),
+            max_cache_size=max_cache_size,
+            retries=retries,
+            rate=rate,
+        )
 
     # if there are no pdfs urls for the date, log warning and exit function
     if len(pdf_urls) == 0:
@@ -89,16 +208,61 @@ def daily_spyder(date_: date) -> None:
     # Write pdf urls to txt file
     write_txt_from_list(pdf_urls, path=str(data_dir / "pdf_urls.txt"))
 
-    # Download the contents from every url to a pdf file
-    for url in pdf_urls:
-        # pdf from foo.es/wp/name.pdf will be saved as name.pdf
-        pdf_name = url.split("/")[-1]
-        download_pdf(url=url, path=str(data_dir / pdf_name), date_=date_)
+    # Only download the pdfs that are missing, truncated or failed in a previous run
+    manifest_path = str(data_dir / "manifest.jsonl")
+    manifest = read_manifest(manifest_path)
+    # Rewrite the manifest without its invalid lines, the new entries are appended to valid json
+    write_manifest(manifest_path, manifest)
+    pending_urls = [
+        url
+        for url in pdf_urls
+        if revalidate or not is_download_complete(manifest.get(url), data_dir)
+    ]
+    if len(pending_urls) < len(pdf_urls):
+        log_skipped_complete_pdfs(len(pdf_urls) - len(pending_urls), date_)
+        for url in pdf_urls:
+            if url not in pending_urls:
+                yield str(data_dir / manifest[url]["file"]), manifest[url]["sha256"]
+
+    # Download the contents from every url to a pdf file.
+    # Record each download in the manifest as soon as it finishes,
+    # so the progress is not lost if the execution is interrupted
+    for entry in download_pdfs(
+        pending_urls,
+        data_dir,
+        date_,
+        workers=workers,
+        max_per_host=max_per_host,
+        max_cache_size=max_cache_size,
+        retries=retries,
+        rate=rate,
+        use_async=use_async,
+    ):
+        append_dict_to_jsonl(manifest_path, entry)
+        manifest[entry["url"]] = entry
+        if entry["status"] == "complete":
+            yield str(data_dir / entry["file"]), entry["sha256"]
+
+    # Rewrite the manifest with a single entry per url
+    write_manifest(manifest_path, manifest)
 
     log_finished_daily_spyder(date_)
 
 
-def main(input_dates: tuple[str, ...]) -> None:
+def main(
+    input_dates: tuple[str, ...],
+    workers: int = 1,
+    max_per_host: int = 4,
+    cache_size: int = DEFAULT_MAX_CACHE_SIZE // 1024**2,
+    revalidate: bool = False,
+    retries: int = 3,
+    rate: float = 5.0,
+    use_async: bool = False,
+    profile: bool = False,
+    profile_output: str | None = None,
+    report: str | None = None,
+    metrics_file: str | None = None,
+) -> None:
     """
     For each date, parse the BORME registry webpage for that date,
     write a txt file with the links to all the pdfs of the webpage, and download all the pdfs.
@@ -110,9 +274,35 @@ def main(input_dates: tuple[str, ...]) -> None:
     if len(uniq_dates) == 0:
         log_no_dates_read()
 
-    for date_ in uniq_dates:
-        daily_spyder(date_)
+    with run_report("spyder", uniq_dates, report, metrics_file), profiling(
+        profile or profile_output is not None, profile_output
+    ):
+        for date_ in uniq_dates:
+            daily_spyder(
+                date_,
+                workers=workers,
+                max_per_host=max_per_host,
+                max_cache_size=cache_size * 1024**2,
+                revalidate=revalidate,
+                retries=retries,
+                rate=rate,
+                use_async=use_async,
+            )
 
 
 if __name__ == "__main__":
-    dates_cli(main)()  # pylint: disable=no-value-for-parameter
+    cli = dates_cli(
+        main,
+        workers_option,
+        max_per_host_option,
+        cache_size_option,
+        revalidate_option,
+        retries_option,
+        rate_option,
+        async_option,
+        profile_option,
+        profile_output_option,
+        report_option,
+        metrics_file_option,
+    )
+    cli()  # pylint: disable=no-value-for-parameter
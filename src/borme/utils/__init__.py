@@ -5,10 +5,20 @@ filter strings, cast values to different data types
 and read and write data files, 
 
 Modules:
+    act_description
+    act_record
+    acts_database
     borme_website
     cli_help_message
+    company_index
+    http_cache
+    paths
+    profiling
+    retries
+    run_report
     text_filtering
     type_casting
+    work_queue
     write_and_read_files
 
 """
@@ -0,0 +1,120 @@
+"""
+Util functions used to parse the description of an act of the BORME registry
+into the entries it lists, e.g. 'Constitución', 'Nombramientos' or 'Datos registrales',
+each one with its fields.
+
+The start of every entry is found with a single regex, compiled once,
+that matches any of the known kinds of entry, so the description is scanned only once.
+
+Functions:
+    parse_act_description
+    act_entries_to_list_of_dict
+
+"""
+import re
+from typing import NamedTuple
+
+# Kinds of entry listed in the descriptions of the acts
+ENTRY_KINDS = (
+    "Constitución",
+    "Nombramientos",
+    "Ceses/Dimisiones",
+    "Revocaciones",
+    "Reelecciones",
+    "Cancelaciones de oficio de nombramientos",
+    "Cambio de domicilio social",
+    "Cambio de objeto social",
+    "Cambio de denominación social",
+    "Cambio de identidad del socio único",
+    "Ampliación de capital",
+    "Reducción de capital",
+    "Modificaciones estatutarias",
+    "Declaración de unipersonalidad",
+    "Pérdida del caracter de unipersonalidad",
+    "Sociedad unipersonal",
+    "Transformación de sociedad",
+    "Fusión por absorción",
+    "Escisión parcial",
+    "Escisión total",
+    "Situación concursal",
+    "Disolución",
+    "Extinción",
+    "Reactivación de la sociedad",
+    "Apertura de sucursal",
+    "Cierre de sucursal",
+    "Emisión de obligaciones",
+    "Desembolso de dividendos pasivos",
+    "Primera inscripción",
+    "Fe de erratas",
+    "Otros conceptos",
+    "Datos registrales",
+)
+
+# Start of an entry: one of the kinds, at the start of the text or after a blank,
+# followed by a dot. The longest kinds are tried first, in case one is the prefix of another
+ENTRY_KIND_PATTERN = re.compile(
+    r"(?:^|(?<=\s))("
+    + "|".join(re.escape(kind) for kind in sorted(ENTRY_KINDS, key=len, reverse=True))
+    + r")\."
+)
+
+# Start of a field: up to 40 characters without colons, at the start of the entry
+# or after a dot, followed by a colon, e.g. 'Objeto social: ' or 'Adm. Unico: '
+FIELD_PATTERN = re.compile(r"(?:^|(?<=\.\s))([^\s:.][^:]{0,40}?):\s")
+
+# Fields of the registry data, e.g. 'T 1234 , F 56, S 8, H M 12345, I/A 3 (20.11.23).'
+REGISTRY_DATA_PATTERN = re.compile(
+    r"(?:^|(?<=,\s))(T|F|S|H|I/A|L)\s+([^,(]+?)\s*(?=,|\(|$)|\((\d+\.\d+\.\d+)\)"
+)
+
+
+class ActEntry(NamedTuple):
+    """Entry of the description of an act: its kind, its text and its fields"""
+
+    kind: str
+    text: str
+    fields: tuple[tuple[str, str], ...]
+
+
+def _parse_fields(kind: str, text: str) -> tuple[tuple[str, str], ...]:
+    """Return the (name, value) pairs of the fields in the text of an entry."""
+    if kind == "Datos registrales":
+        return tuple(
+            ("Fecha", date_) if date_ else (name, value)
+            for name, value, date_ in REGISTRY_DATA_PATTERN.findall(text)
+        )
+
+    # The value of each field is the text until the start of the next field
+    matches = list(FIELD_PATTERN.finditer(text))
+    return tuple(
+        (match[1], text[match.end() : end].strip().rstrip("."))
+        for match, end in zip(matches, [m.start() for m in matches[1:]] + [len(text)])
+    )
+
+
+def parse_act_description(description: str) -> list[ActEntry]:
+    """
+    Split the description of an act into its entries,
+    return the kind, text and fields of each one, in the order of the description.
+    Any text before the first known kind is ignored.
+    """
+    matches = list(ENTRY_KIND_PATTERN.finditer(description))
+    ends = [m.start() for m in matches[1:]] + [len(description)]
+
+    entries = []
+    for match, end in zip(matches, ends):
+        kind = match[1]
+        text = " ".join(description[match.end() : end].split())
+        entries.append(ActEntry(kind, text, _parse_fields(kind, text)))
+    return entries
+
+
+def act_entries_to_list_of_dict(entries: list[ActEntry]) -> list[dict]:
+    """
+    Return the entries as dictionaries that can be written to a jsonl file.
+    The fields are kept as a list of [name, value] pairs, in order.
+    """
+    return [
+        {"kind": kind, "text": text, "fields": [list(field) for field in fields]}
+        for kind, text, fields in entries
+    ]
@@ -0,0 +1,109 @@
+"""
+Compact record of a parsed act, used instead of one dictionary per act.
+
+The records use slots, so they do not have a dictionary of attributes,
+and the region name and date, repeated by every act of the same pdf, are interned
+so all the acts share the same string objects.
+The records are written to jsonl, parquet or SQLite directly from their attributes.
+
+Classes:
+    Act
+
+Functions:
+    write_acts_to_jsonl
+    read_acts_from_jsonl
+    acts_to_columns
+
+"""
+import json
+from dataclasses import dataclass
+from os.path import isfile
+from sys import intern
+from typing import Iterable
+
+# Same encoding as the jsonlines package, so the jsonl files do not change
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+# Fields of every act, in the order of the jsonl files
+ACT_FIELDS = ("id", "company_name", "region_name", "borme_date", "description")
+
+
+@dataclass(slots=True)
+class Act:
+    """
+    Information of a single act listed in a pdf of the BORME registry.
+    The entries of the description are only set for structured acts.
+    """
+
+    id: str  # pylint: disable=invalid-name
+    company_name: str
+    region_name: str
+    borme_date: str
+    description: str
+    entries: list[dict] | None = None
+
+    def __post_init__(self) -> None:
+        self.region_name = intern(self.region_name)
+        self.borme_date = intern(self.borme_date)
+
+    @classmethod
+    def from_dict(cls, act: dict) -> "Act":
+        """Create the record of an act from its dictionary, e.g. a line of a jsonl file."""
+        return cls(**act)
+
+    def to_dict(self) -> dict:
+        """Return the dictionary of the act, without the entries if they are not set."""
+        act = {field: getattr(self, field) for field in ACT_FIELDS}
+        if self.entries is not None:
+            act["entries"] = self.entries
+        return act
+
+    def to_json(self) -> str:
+        """Return the json object of the act, as written by the jsonlines package."""
+        line = (
+            f'{{"id": {_encode(self.id)}'
+            f', "company_name": {_encode(self.company_name)}'
+            f', "region_name": {_encode(self.region_name)}'
+            f', "borme_date": {_encode(self.borme_date)}'
+            f', "description": {_encode(self.description)}'
+        )
+        if self.entries is not None:
+            line += f', "entries": {_encode(self.entries)}'
+        return line + "}"
+
+
+def write_acts_to_jsonl(
+    file_path: str, acts: Iterable[Act], flush: bool = False
+) -> None:
+    """
+    Write a jsonl file with one line per act.
+    The acts can also come from an iterator, in which case they are written
+    as they are produced. With flush=True every line is flushed to disk as soon as it is written.
+    """
+    with open(file_path, "w", encoding="utf-8") as file:
+        for act in acts:
+            file.write(act.to_json() + "\n")
+            if flush:
+                file.flush()
+
+
+def read_acts_from_jsonl(file_path: str) -> list[Act]:
+    """
+    Read a jsonl file with one act per line and return the list of acts.
+    If the file does not exist return an empty list.
+    """
+    if not isfile(file_path):
+        return []
+    with open(file_path, "r", encoding="utf-8") as file:
+        return [Act.from_dict(json.loads(line)) for line in file if line.strip()]
+
+
+def acts_to_columns(acts: list[Act]) -> dict[str, list]:
+    """
+    Return the values of each field of the acts, as a dictionary of columns.
+    The column of entries is only included if any act has entries.
+    """
+    columns = {field: [getattr(act, field) for act in acts] for field in ACT_FIELDS}
+    if any(act.entries is not None for act in acts):
+        columns["entries"] = [act.entries for act in acts]
+    return columns
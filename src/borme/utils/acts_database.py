@@ -0,0 +1,95 @@
+"""
+Util functions used for storing the parsed acts in a single local SQLite database.
+
+The table `acts` has one row per act, identified by (borme_date, region_name, id),
+with indexes on company_name, borme_date and region_name.
+The table `acts_fts` is a full text search index on the description of the acts.
+
+Functions:
+    connect_to_acts_database
+    upsert_acts
+
+"""
+import sqlite3
+from typing import Iterable
+
+from utils.act_record import Act
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS acts (
+    borme_date TEXT NOT NULL,
+    region_name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    company_name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (borme_date, region_name, id)
+);
+-- The primary key already works as an index on borme_date
+CREATE INDEX IF NOT EXISTS acts_company_name ON acts (company_name);
+CREATE INDEX IF NOT EXISTS acts_region_name ON acts (region_name);
+
+-- Full text search on the description, kept in sync with the acts table by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS acts_fts USING fts5(
+    description, content='acts', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS acts_after_insert AFTER INSERT ON acts BEGIN
+    INSERT INTO acts_fts (rowid, description) VALUES (new.rowid, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS acts_after_delete AFTER DELETE ON acts BEGIN
+    INSERT INTO acts_fts (acts_fts, rowid, description)
+    VALUES ('delete', old.rowid, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS acts_after_update AFTER UPDATE ON acts BEGIN
+    INSERT INTO acts_fts (acts_fts, rowid, description)
+    VALUES ('delete', old.rowid, old.description);
+    INSERT INTO acts_fts (rowid, description) VALUES (new.rowid, new.description);
+END;
+"""
+
+UPSERT_ACT = """
+INSERT INTO acts (borme_date, region_name, id, company_name, description)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (borme_date, region_name, id) DO UPDATE SET
+    company_name = excluded.company_name,
+    description = excluded.description
+"""
+
+
+def connect_to_acts_database(path: str) -> sqlite3.Connection:
+    """
+    Open a connection to the acts database, create the tables if they do not exist.
+    The database uses write ahead logging, so it can be read while it is written.
+    """
+    # Wait for other writers instead of failing when the database is locked
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def upsert_acts(path: str, acts: Iterable[Act]) -> None:
+    """
+    Replace the acts of the dates of the acts in the acts database, in a single transaction.
+    The previous rows of those dates are deleted first, so inserting the acts
+    of the same date again does not duplicate any row, and does not keep the acts
+    that the parser no longer produces, e.g. after a new version of the parser.
+    """
+    # The values of each act are taken directly from its attributes
+    rows = [
+        (act.borme_date, act.region_name, act.id, act.company_name, act.description)
+        for act in acts
+    ]
+    if len(rows) == 0:
+        return
+
+    connection = connect_to_acts_database(path)
+    try:
+        # Readers never see a date without its acts, the triggers update acts_fts
+        with connection:
+            connection.executemany(
+                "DELETE FROM acts WHERE borme_date = ?", {(row[0],) for row in rows}
+            )
+            connection.executemany(UPSERT_ACT, rows)
+    finally:
+        connection.close()
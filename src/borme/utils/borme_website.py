@@ -1,34 +1,365 @@
 """
 Util functions used for interacting with the website https://www.boe.es/borme/
 
+Constants:
+    BORME_BASE_URL
+
 Functions:
+    get_session
+    get_manifest_entry
     download_pdf
+    download_pdf_async
+    download_pdfs
+    download_pdfs_async
+    extract_pdf_hrefs
+    extract_pdf_hrefs_with_soup
     construct_borme_daily_url
 
 """
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 from datetime import date
+from functools import cache, partial
+from html.parser import HTMLParser
+from os.path import basename
+from pathlib import Path
+from threading import BoundedSemaphore, Lock
+from typing import AsyncIterator, Iterator
+from urllib.parse import urlparse
 
 import requests
 from logs import log_get_request_exception, log_non_200_status_code
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
+from utils.http_cache import DownloadResult, cached_download
+from utils.profiling import stage
+from utils.retries import call_with_retries, call_with_retries_async
+
+# Url of the BOE website, unless the environment variable BORME_BASE_URL is set,
+# e.g. to replay a recorded corpus of pages and pdfs from a local server
+BORME_BASE_URL = os.environ.get("BORME_BASE_URL", "https://www.boe.es").rstrip("/")
+
+
+@cache
+def get_session(max_per_host: int = 4) -> requests.Session:
+    """
+    Return a http session shared by every request of the script.
+    The session keeps the connections alive, so they can be reused by the following requests.
+    """
+    session = requests.Session()
+    # Keep up to max_per_host open connections for each host
+    adapter = HTTPAdapter(pool_maxsize=max_per_host)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
-def download_pdf(url: str, path: str, date_) -> None:
-    """Download pdf from url to local path."""
-    # send http get request to url
+@cache
+def _host_semaphore(host: str, max_per_host: int) -> BoundedSemaphore:
+    """
+    Return the semaphore that limits the number of simultaneous requests to a host,
+    shared by every thread and every event loop of the process.
+    """
+    return BoundedSemaphore(max_per_host)
+
+
+@asynccontextmanager
+async def _hold_semaphore_async(semaphore: BoundedSemaphore) -> AsyncIterator[None]:
+    """
+    Hold a threading semaphore in the block, acquiring it from a thread
+    so the event loop is not blocked while it waits.
+    If the waiting task is cancelled, the semaphore is released as soon as the thread acquires it.
+    """
+    lock = Lock()
+    state = {"acquired": False, "cancelled": False}
+
+    def acquire() -> None:
+        semaphore.acquire()  # pylint: disable=consider-using-with
+        with lock:
+            if state["cancelled"]:
+                semaphore.release()
+            else:
+                state["acquired"] = True
+
     try:
-        response = requests.get(url, timeout=5)
-    # if get request raises exception, log warning and return
-    except RequestException as e:
-        log_get_request_exception(e, url, date_)
-        return
+        await asyncio.to_thread(acquire)
+    except asyncio.CancelledError:
+        with lock:
+            state["cancelled"] = True
+            if state["acquired"]:
+                semaphore.release()
+        raise
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def get_manifest_entry(
+    url: str, path: str, date_: date, result: DownloadResult | None
+) -> dict:
+    """
+    Return the manifest entry of the download of a pdf: url, file name, size, checksum and status.
+    A result of None means the download raised an exception.
+    """
+    entry = {
+        "url": url,
+        "file": basename(path),
+        "size": 0,
+        "sha256": "",
+        "status": "failed",
+    }
+    if result is None:
+        return entry
     # if the status code is not 200, log warning and return
-    if response.status_code != 200:
-        log_non_200_status_code(response.status_code, url, date_)
+    if result.status_code != 200:
+        log_non_200_status_code(result.status_code, url, date_)
+        return entry
+
+    entry["size"] = result.size
+    entry["sha256"] = result.sha256
+    entry["status"] = "complete"
+    return entry
+
+
+def download_pdf(
+    url: str,
+    path: str,
+    date_,
+    session: requests.Session | None = None,
+    max_cache_size: int = 0,
+    retries: int = 3,
+    rate: float = 0,
+) -> dict:
+    """
+    Download pdf from url to local path, return the manifest entry of the download.
+    The pdf is streamed to a temporary file in chunks, so it is never held in memory,
+    and the file is only moved to the path once it is complete:
+    a truncated download is discarded and retried, it never reaches the path.
+    Failed requests are retried up to `retries` times,
+    and at most `rate` requests per second are sent to the host (0 means no limit).
+    If max_cache_size is not 0, the response is cached and revalidated with a conditional request.
+    """
+    fetch = partial(
+        cached_download,
+        url,
+        path,
+        session=session,
+        timeout=5,
+        max_cache_size=max_cache_size,
+    )
+    # send http get request to url, reuse the session connections if there is one
+    with stage("download_pdf", date_, basename(path)) as stats:
+        try:
+            result = call_with_retries(fetch, url, retries=retries, rate=rate)
+        # if get request raises exception, log warning and return
+        except RequestException as e:
+            log_get_request_exception(e, url, date_)
+            result = None
+        entry = get_manifest_entry(url, path, date_, result)
+        stats.bytes, stats.count = entry["size"], 1
+        stats.cached = result is not None and result.cached
+    return entry
+
+
+async def download_pdf_async(
+    url: str,
+    path: str,
+    date_,
+    session: requests.Session | None = None,
+    max_cache_size: int = 0,
+    retries: int = 3,
+    rate: float = 0,
+) -> dict:
+    """Asyncio version of download_pdf."""
+    fetch = partial(
+        cached_download,
+        url,
+        path,
+        session=session,
+        timeout=5,
+        max_cache_size=max_cache_size,
+    )
+    # The cpu time of the stage is the time of the event loop thread only
+    with stage("download_pdf", date_, basename(path)) as stats:
+        try:
+            result = await call_with_retries_async(
+                fetch, url, retries=retries, rate=rate
+            )
+        except RequestException as e:
+            log_get_request_exception(e, url, date_)
+            result = None
+        entry = get_manifest_entry(url, path, date_, result)
+        stats.bytes, stats.count = entry["size"], 1
+        stats.cached = result is not None and result.cached
+    return entry
+
+
+def download_pdfs(
+    urls: list[str],
+    data_dir: Path,
+    date_: date,
+    workers: int = 1,
+    max_per_host: int = 4,
+    max_cache_size: int = 0,
+    retries: int = 3,
+    rate: float = 0,
+    use_async: bool = False,
+) -> Iterator[dict]:
+    """
+    Download the pdf of every url to the data directory,
+    using up to `workers` threads and at most `max_per_host` simultaneous requests per host.
+    Yield the manifest entry of each download as soon as it finishes.
+    A failed download is logged and does not stop the rest of the downloads.
+    If use_async is True, the downloads are scheduled by an asyncio event loop.
+    """
+    if use_async:
+        yield from download_pdfs_async(
+            urls,
+            data_dir,
+            date_,
+            workers=workers,
+            max_per_host=max_per_host,
+            max_cache_size=max_cache_size,
+            retries=retries,
+            rate=rate,
+        )
         return
-    # write response contents to file
-    with open(path, "wb") as file:
-        file.write(response.content)
+
+    session = get_session(max_per_host)
+
+    def download(url: str) -> dict:
+        # pdf from foo.es/wp/name.pdf will be saved as name.pdf
+        pdf_name = url.split("/")[-1]
+        with _host_semaphore(urlparse(url).netloc, max_per_host):
+            return download_pdf(
+                url=url,
+                path=str(data_dir / pdf_name),
+                date_=date_,
+                session=session,
+                max_cache_size=max_cache_size,
+                retries=retries,
+                rate=rate,
+            )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download, url) for url in urls]
+        # Unexpected errors are raised, as in a regular loop
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def download_pdfs_async(
+    urls: list[str],
+    data_dir: Path,
+    date_: date,
+    workers: int = 1,
+    max_per_host: int = 4,
+    max_cache_size: int = 0,
+    retries: int = 3,
+    rate: float = 0,
+) -> Iterator[dict]:
+    """
+    Version of download_pdfs whose downloads are scheduled by an asyncio event loop.
+    Up to `workers` requests are sent at the same time, from the threads of the loop,
+    and the waits between retries do not take any thread.
+    The limit of `max_per_host` simultaneous requests per host is shared with the other downloads
+    of the process, e.g. the dates downloaded at the same time, in threads or in other loops.
+    The loop runs while the next manifest entry is awaited,
+    so the downloads wait while the caller processes each entry.
+    """
+    session = get_session(max_per_host)
+    workers_semaphore = asyncio.Semaphore(workers)
+
+    async def download(url: str) -> dict:
+        pdf_name = url.split("/")[-1]
+        host_semaphore = _host_semaphore(urlparse(url).netloc, max_per_host)
+        async with workers_semaphore, _hold_semaphore_async(host_semaphore):
+            return await download_pdf_async(
+                url=url,
+                path=str(data_dir / pdf_name),
+                date_=date_,
+                session=session,
+                max_cache_size=max_cache_size,
+                retries=retries,
+                rate=rate,
+            )
+
+    loop = asyncio.new_event_loop()
+    # The attempts are sent from the threads of the loop, one per worker
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    pending = {loop.create_task(download(url)) for url in urls}
+    try:
+        while pending:
+            done, pending = loop.run_until_complete(
+                asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            )
+            # Unexpected errors are raised, as in a regular loop
+            for task in done:
+                yield task.result()
+    finally:
+        # If the caller stops early, cancel the remaining downloads
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.wait(pending))
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+class _PdfLinksParser(HTMLParser):
+    """
+    Html parser that collects the href of every <a> element with an href
+    and a title including the word 'PDF', as the elements are read.
+    No tree is built: the rest of the page is skipped.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.hrefs: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag != "a":
+            return
+        attributes = dict(attrs)
+        href, title = attributes.get("href"), attributes.get("title")
+        if href is not None and title is not None and "PDF" in title:
+            self.hrefs.append(href)
+
+
+def extract_pdf_hrefs(content: bytes) -> list[str] | None:
+    """
+    Return the href of every <a> element of the html page with a title including the word 'PDF'.
+    The page is scanned once, without building its tree.
+    Return None if the page cannot be decoded as utf-8, the encoding of the BORME website.
+    """
+    try:
+        html = content.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    parser = _PdfLinksParser()
+    parser.feed(html)
+    parser.close()
+    return parser.hrefs
+
+
+def extract_pdf_hrefs_with_soup(content: bytes) -> list[str]:
+    """
+    Version of extract_pdf_hrefs that builds the tree of the page with BeautifulSoup,
+    which also detects the encoding of the page.
+    """
+    # bs4 is only imported if the fast scan of a page fails
+    from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
+    soup = BeautifulSoup(content, "html.parser")
+    # Find all html <a> elements with an href, and a title including the word 'PDF'
+    target_elements = soup.find_all(
+        "a", attrs={"title": re.compile("PDF"), "href": True}
+    )
+    return [el["href"] for el in target_elements]
 
 
 def construct_borme_daily_url(day: date) -> str:
@@ -37,5 +368,5 @@ def construct_borme_daily_url(day: date) -> str:
     The url for a given day YYYYMMDD is https://www.boe.es/borme/dias/YYYY/MM/DD/index.php?s=a1
     """
     return (
-        "https://www.boe.es/borme/dias/" + day.strftime("%Y/%m/%d") + "/index.php?s=a1"
+        BORME_BASE_URL + "/borme/dias/" + day.strftime("%Y/%m/%d") + "/index.php?s=a1"
     )
@@ -9,11 +9,15 @@ from os.path import basename
 from sys import argv
 from typing import Callable
 
-from pyfiglet import figlet_format  # type: ignore
+from click import Option
 
 
-def construct_help_message(func: Callable) -> str:
+def construct_help_message(
+    func: Callable, extra_options: list[Option] | None = None
+) -> str:
     """Construct CLI help message."""
+    # pyfiglet is only needed for the help message, not for every run of the scripts
+    from pyfiglet import figlet_format  # type: ignore # pylint: disable=import-outside-toplevel
 
     # Get name of the script executed in the CL (not the name of the current script)
     script_name = basename(argv[0])
@@ -28,13 +32,20 @@ def construct_help_message(func: Callable) -> str:
     title = figlet_format("borme " + script_title, font="rozzo")
 
     # String with Args help message
-    args = "Arguments:\n" + "  DATE\t date with the format YYYYMMDD"
+    args = (
+        "Arguments:\n"
+        + "  DATE\t date with the format YYYYMMDD,"
+        + " or range of dates with the format YYYYMMDD..YYYYMMDD"
+    )
     # String with Options help message
     options = (
         "Options:\n"
         + "  -f --file \tRead dates from file."
         + "  Each line in the file must correspond to a date, with the format 'YYYYMMDD'"
     )
+    # Add a line for every extra option of the script
+    for option in extra_options or []:
+        options += "\n" + f"  {' '.join(option.opts)} \t{option.help}"
     # String with Usage help message
     usage = (
         "Usage:\n"
@@ -45,6 +56,7 @@ def construct_help_message(func: Callable) -> str:
     usage_examples = (
         "Usage examples:\n"
         + f"  {script_name} 20231127 20231128 20231201\n"
+        + f"  {script_name} 20230101..20231231\n"
         + f"  echo '20231127\\n20231128\\n20231201' > dates.txt ; {script_name} -f dates.txt "
     )
     # String with Notes help message
@@ -54,7 +66,9 @@ def construct_help_message(func: Callable) -> str:
         + "the dates passed in directly through the command line will be ignored.\n"
         + f"  For example: '{script_name} -f dates.txt 20010101' "
         + "only reads the dates from dates.txt and "
-        + "ignores the date passed in the command line (20010101)."
+        + "ignores the date passed in the command line (20010101).\n"
+        + "  Ranges of dates skip weekends and national holidays, when the BORME is not published.\n"
+        + "  The dates are processed in chronological order."
     )
 
     # Use all the strings to construct a help message
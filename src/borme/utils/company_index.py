@@ -0,0 +1,239 @@
+"""
+Util functions used for looking up the acts of a company by its name.
+
+The index is a SQLite database that maps the normalized name of every company
+to the date, region, act id and byte offset of each of its acts in the acts.jsonl file
+of the date, so an act can be read without parsing the rest of the file.
+A full text search table with the trigrams of every name is used for fuzzy lookups,
+the names without acts left in the index are removed from it when a date is indexed again.
+
+Functions:
+    normalize_company_name
+    connect_to_company_index
+    index_acts_file
+    lookup_company
+    read_act_at_offset
+
+"""
+import json
+import re
+import sqlite3
+import unicodedata
+from difflib import SequenceMatcher
+from pathlib import Path
+
+# Number of trigrams of a name used to find the candidates of a fuzzy lookup, the rarest ones.
+# A typo changes up to 3 trigrams, so a name with a typo still shares some of them
+CANDIDATE_TRIGRAMS = 6
+# The candidates are ranked in SQLite, the rarest trigrams are used
+# as long as the names that contain them do not exceed this number
+MAX_CANDIDATE_NAMES = 10_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS company_acts (
+    name TEXT NOT NULL,
+    borme_date TEXT NOT NULL,
+    region_name TEXT NOT NULL,
+    act_id TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    PRIMARY KEY (borme_date, region_name, act_id)
+);
+CREATE INDEX IF NOT EXISTS company_acts_name ON company_acts (name);
+
+-- Every distinct name, and the trigrams of the names for fuzzy lookups
+CREATE TABLE IF NOT EXISTS company_names (name TEXT PRIMARY KEY);
+CREATE VIRTUAL TABLE IF NOT EXISTS company_names_fts USING fts5(
+    name, content='company_names', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS company_names_after_insert AFTER INSERT ON company_names
+BEGIN
+    INSERT INTO company_names_fts (rowid, name) VALUES (new.rowid, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS company_names_after_delete AFTER DELETE ON company_names
+BEGIN
+    INSERT INTO company_names_fts (company_names_fts, rowid, name)
+    VALUES ('delete', old.rowid, old.name);
+END;
+-- Number of names that contain each trigram
+CREATE VIRTUAL TABLE IF NOT EXISTS company_names_vocab USING fts5vocab(
+    company_names_fts, row
+);
+"""
+
+
+def normalize_company_name(name: str) -> str:
+    """
+    Normalize a company name for lookups:
+    uppercase, no accents, no punctuation and single spaces between words.
+    """
+    without_accents = "".join(
+        c
+        for c in unicodedata.normalize("NFKD", name.upper())
+        if not unicodedata.combining(c)
+    )
+    return " ".join(re.sub(r"[^\w]", " ", without_accents).split())
+
+
+def connect_to_company_index(path: str) -> sqlite3.Connection:
+    """Open a connection to the company index, create the tables if they do not exist."""
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def index_acts_file(index_path: str, acts_path: str) -> None:
+    """
+    Add the acts of an acts.jsonl file to the company index.
+    The previous entries of the date of the file are replaced,
+    so indexing the same date again does not duplicate any entry,
+    and the names that are left without acts are removed.
+    """
+    # Byte offset and company of every line of the file
+    entries = []
+    with open(acts_path, "rb") as file:
+        offset = 0
+        for line in file:
+            act = json.loads(line)
+            entries.append(
+                (
+                    normalize_company_name(act["company_name"]),
+                    act["borme_date"],
+                    act["region_name"],
+                    act["id"],
+                    offset,
+                )
+            )
+            offset += len(line)
+
+    if len(entries) == 0:
+        return
+
+    connection = connect_to_company_index(index_path)
+    try:
+        with connection:
+            dates = {(borme_date,) for _, borme_date, _, _, _ in entries}
+            previous_names = {
+                row
+                for (borme_date,) in dates
+                for row in connection.execute(
+                    "SELECT DISTINCT name FROM company_acts WHERE borme_date = ?",
+                    (borme_date,),
+                )
+            }
+            connection.executemany(
+                "DELETE FROM company_acts WHERE borme_date = ?", dates
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO company_acts VALUES (?, ?, ?, ?, ?)", entries
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO company_names VALUES (?)",
+                {(name,) for name, _, _, _, _ in entries},
+            )
+            # Only the names of the replaced entries can be left without acts
+            connection.executemany(
+                "DELETE FROM company_names WHERE name = ?1"
+                + " AND NOT EXISTS (SELECT 1 FROM company_acts WHERE name = ?1)",
+                previous_names,
+            )
+    finally:
+        connection.close()
+
+
+def _find_similar_names(
+    connection: sqlite3.Connection, name: str, limit: int
+) -> list[str]:
+    """
+    Return up to limit names similar to the name, the most similar first.
+    The candidates are the names that contain any of the rarest trigrams of the name,
+    so common trigrams like ' SL' do not match most of the index.
+    The candidates are then ranked by their similarity ratio.
+    """
+    # The trigram tokenizer folds the names to lowercase
+    trigrams = list({name[i : i + 3].lower() for i in range(len(name) - 2)})
+    placeholders = ", ".join("?" * len(trigrams))
+    # The trigrams that are not in the index, e.g. because of a typo, match no names
+    trigram_counts = connection.execute(
+        f"SELECT term, doc FROM company_names_vocab WHERE term IN ({placeholders})"
+        + " ORDER BY doc LIMIT ?",
+        (*trigrams, CANDIDATE_TRIGRAMS),
+    ).fetchall()
+    if len(trigram_counts) == 0:
+        return []
+
+    # The rarest trigram is always used, even if it is common
+    rarest_trigrams, num_of_names = [trigram_counts[0][0]], trigram_counts[0][1]
+    for trigram, count in trigram_counts[1:]:
+        num_of_names += count
+        if num_of_names > MAX_CANDIDATE_NAMES:
+            break
+        rarest_trigrams.append(trigram)
+    query = " OR ".join('"' + t.replace('"', '""') + '"' for t in rarest_trigrams)
+    candidates = connection.execute(
+        "SELECT name FROM company_names_fts WHERE company_names_fts MATCH ?"
+        + " ORDER BY rank LIMIT ?",
+        (query, 20 * limit),
+    ).fetchall()
+
+    ratios = [
+        (SequenceMatcher(None, name, candidate).ratio(), candidate)
+        for (candidate,) in candidates
+    ]
+    return [candidate for ratio, candidate in sorted(ratios, reverse=True)][:limit]
+
+
+def lookup_company(
+    index_path: str, name: str, mode: str = "exact", limit: int = 100
+) -> list[dict]:
+    """
+    Return up to limit entries of the index whose company matches the name,
+    sorted by company name and date.
+    The mode of the lookup is one of:
+        exact: same normalized name.
+        prefix: the normalized name starts with the normalized name of the query.
+        fuzzy: the names most similar to the query, allowing typos.
+    """
+    normalized_name = normalize_company_name(name)
+    connection = connect_to_company_index(index_path)
+    connection.row_factory = sqlite3.Row
+    select = "SELECT name, borme_date, region_name, act_id, offset FROM company_acts"
+    try:
+        if mode == "exact":
+            rows = connection.execute(
+                select + " WHERE name = ? ORDER BY name, borme_date LIMIT ?",
+                (normalized_name, limit),
+            ).fetchall()
+        elif mode == "prefix":
+            # Range condition, so the lookup uses the index on the name
+            rows = connection.execute(
+                select
+                + " WHERE name >= ? AND name < ? ORDER BY name, borme_date LIMIT ?",
+                (normalized_name, normalized_name + "\U0010ffff", limit),
+            ).fetchall()
+        else:
+            similar_names = _find_similar_names(connection, normalized_name, limit)
+            placeholders = ", ".join("?" * len(similar_names))
+            rows = connection.execute(
+                select
+                + f" WHERE name IN ({placeholders}) ORDER BY name, borme_date LIMIT ?",
+                (*similar_names, limit),
+            ).fetchall()
+    finally:
+        connection.close()
+
+    return [dict(row) for row in rows]
+
+
+def read_act_at_offset(acts_path: str | Path, offset: int) -> dict | None:
+    """
+    Read the act that starts at the byte offset of an acts.jsonl file.
+    Return None if there is no act at that offset.
+    """
+    with open(acts_path, "rb") as file:
+        file.seek(offset)
+        line = file.readline()
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return None
@@ -0,0 +1,391 @@
+"""
+Util functions used for caching http responses on disk,
+and revalidating them with conditional requests.
+
+Each cached response is stored as 2 files in the cache directory:
+the body of the response and a json file with its validators (ETag and Last-Modified).
+The pdfs are hard links to the downloaded files, so they do not take twice the disk space.
+The size of the cache is kept as a running total, and when it grows over its max size,
+the least recently used responses are evicted.
+
+Functions:
+    cached_get
+    cached_download
+    get_conditional_headers
+    read_cached_body
+    copy_cached_body
+    store_response
+    store_file
+    get_cache_size
+    evict_least_recently_used
+
+"""
+import json
+from hashlib import file_digest, sha256
+from os import link, replace, utime
+from pathlib import Path
+from shutil import copyfile
+from threading import Lock
+from typing import Callable, Mapping, NamedTuple
+
+import requests
+from requests.exceptions import RequestException
+from utils.paths import DATA_DIR
+
+HTTP_CACHE_DIR = DATA_DIR / "cache" / "http"
+DEFAULT_MAX_CACHE_SIZE = 512 * 1024**2  # 512 MB
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 64 KB
+
+# Running total of the size of each cache directory, computed once per process
+_cache_sizes: dict[Path, int] = {}
+_cache_size_lock = Lock()
+
+
+class HttpResponse(NamedTuple):
+    """Status code, body and headers of the response to a http get request"""
+
+    status_code: int
+    content: bytes
+    headers: Mapping[str, str]
+
+
+class DownloadResult(NamedTuple):
+    """
+    Status code and headers of the response to a download, size and checksum of the file,
+    and whether the file was copied from the cache after a 304 Not Modified
+    """
+
+    status_code: int
+    size: int
+    sha256: str
+    headers: Mapping[str, str]
+    cached: bool = False
+
+
+class IncompleteDownloadError(RequestException):
+    """The body of a response is shorter or longer than its Content-Length"""
+
+
+def _get_entry_paths(url: str, cache_dir: Path) -> tuple[Path, Path]:
+    """Return the paths of the body and the metadata of the cached response of a url."""
+    key = sha256(url.encode()).hexdigest()
+    return cache_dir / f"{key}.body", cache_dir / f"{key}.json"
+
+
+def get_conditional_headers(url: str, cache_dir: Path = HTTP_CACHE_DIR) -> dict:
+    """
+    Return the headers of a conditional request for the url,
+    built from the validators of the cached response.
+    If the url is not cached, return an empty dictionary.
+    """
+    body_path, meta_path = _get_entry_paths(url, cache_dir)
+    if not body_path.is_file() or not meta_path.is_file():
+        return {}
+    with open(meta_path, "r", encoding="utf-8") as file:
+        meta = json.load(file)
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def read_cached_body(url: str, cache_dir: Path = HTTP_CACHE_DIR) -> bytes | None:
+    """
+    Return the body of the cached response of the url, or None if it is not cached.
+    Reading a response marks it as recently used.
+    """
+    body_path, meta_path = _get_entry_paths(url, cache_dir)
+    try:
+        with open(body_path, "rb") as file:
+            body = file.read()
+        utime(meta_path)
+    except FileNotFoundError:
+        return None
+    return body
+
+
+def _link_or_copy(source: str | Path, destination: str | Path) -> None:
+    """
+    Hard link the destination to the source file, or copy it if the link fails,
+    e.g. because they are on different filesystems.
+    The files are never modified in place, they are replaced, so they can share their data.
+    """
+    Path(destination).unlink(missing_ok=True)
+    try:
+        link(source, destination)
+    except OSError:
+        copyfile(source, destination)
+
+
+def copy_cached_body(url: str, path: str, cache_dir: Path = HTTP_CACHE_DIR) -> bool:
+    """
+    Copy the body of the cached response of the url to the path, as a hard link if possible,
+    through a temporary file. Return False if the url is not cached.
+    Copying a response marks it as recently used.
+    """
+    body_path, meta_path = _get_entry_paths(url, cache_dir)
+    try:
+        _link_or_copy(body_path, path + ".part")
+        utime(meta_path)
+    except FileNotFoundError:
+        return False
+    replace(path + ".part", path)
+    return True
+
+
+def _store_entry(
+    url: str,
+    headers: Mapping[str, str],
+    size: int,
+    write_body: Callable[[str], None],
+    cache_dir: Path,
+    max_cache_size: int,
+) -> None:
+    """
+    Store a response in the cache, if it has any validators.
+    Its body is written to the given temporary path by write_body.
+    """
+    etag = headers.get("ETag")
+    last_modified = headers.get("Last-Modified")
+    if etag is None and last_modified is None:
+        return
+    # Responses larger than the cache would evict everything else
+    if size > max_cache_size:
+        return
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    body_path, meta_path = _get_entry_paths(url, cache_dir)
+    # The previous response of the url is replaced
+    try:
+        previous_size = body_path.stat().st_size
+    except FileNotFoundError:
+        previous_size = 0
+
+    # Write to temporary files first, so concurrent readers never see half written entries
+    write_body(f"{body_path}.part")
+    replace(f"{body_path}.part", body_path)
+    with open(f"{meta_path}.part", "w", encoding="utf-8") as file:
+        json.dump(
+            {"url": url, "etag": etag, "last_modified": last_modified},
+            file,
+        )
+    replace(f"{meta_path}.part", meta_path)
+
+    with _cache_size_lock:
+        if cache_dir in _cache_sizes:
+            _cache_sizes[cache_dir] += size - previous_size
+        else:
+            _cache_sizes[cache_dir] = get_cache_size(cache_dir)
+        is_over_max_size = _cache_sizes[cache_dir] > max_cache_size
+    if is_over_max_size:
+        evict_least_recently_used(cache_dir, max_cache_size)
+
+
+def store_response(
+    url: str,
+    response: requests.Response,
+    cache_dir: Path = HTTP_CACHE_DIR,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+) -> None:
+    """
+    Store the response of the url in the cache, if it has any validators.
+    Responses without ETag or Last-Modified cannot be revalidated, so they are not stored.
+    """
+
+    def write_body(path: str) -> None:
+        with open(path, "wb") as file:
+            file.write(response.content)
+
+    _store_entry(
+        url,
+        response.headers,
+        len(response.content),
+        write_body,
+        cache_dir,
+        max_cache_size,
+    )
+
+
+def store_file(
+    url: str,
+    headers: Mapping[str, str],
+    path: str,
+    cache_dir: Path = HTTP_CACHE_DIR,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+) -> None:
+    """
+    Version of store_response for a response whose body was written to a file:
+    the file is hard linked to the cache, or copied if the link fails,
+    if the response has any validators.
+    """
+    _store_entry(
+        url,
+        headers,
+        Path(path).stat().st_size,
+        lambda body_path: _link_or_copy(path, body_path),
+        cache_dir,
+        max_cache_size,
+    )
+
+
+def _list_entries(cache_dir: Path) -> list[tuple[float, int, Path, Path]]:
+    """Return the last use, size, body path and meta path of every cached response."""
+    entries = []
+    for meta_path in cache_dir.glob("*.json"):
+        body_path = meta_path.with_suffix(".body")
+        try:
+            entries.append(
+                (
+                    meta_path.stat().st_mtime,
+                    body_path.stat().st_size,
+                    body_path,
+                    meta_path,
+                )
+            )
+        except FileNotFoundError:
+            continue
+    return entries
+
+
+def get_cache_size(cache_dir: Path = HTTP_CACHE_DIR) -> int:
+    """Return the size of the bodies of every cached response."""
+    return sum(size for _, size, _, _ in _list_entries(cache_dir))
+
+
+def evict_least_recently_used(
+    cache_dir: Path = HTTP_CACHE_DIR, max_cache_size: int = DEFAULT_MAX_CACHE_SIZE
+) -> None:
+    """
+    Delete the least recently used responses until the cache fits in max_cache_size.
+    The whole cache directory is listed, so it only runs when the running total goes over the max.
+    """
+    with _cache_size_lock:
+        entries = _list_entries(cache_dir)
+        cache_size = sum(size for _, size, _, _ in entries)
+        for _, size, body_path, meta_path in sorted(entries):
+            if cache_size <= max_cache_size:
+                break
+            meta_path.unlink(missing_ok=True)
+            body_path.unlink(missing_ok=True)
+            cache_size -= size
+        # Other processes may have stored responses since the total was computed
+        _cache_sizes[cache_dir] = cache_size
+
+
+def cached_get(
+    url: str,
+    session: requests.Session | None = None,
+    timeout: int = 5,
+    cache_dir: Path = HTTP_CACHE_DIR,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+) -> HttpResponse:
+    """
+    Send a http get request to the url, return the status code, body and headers of the response.
+    If the url is cached, send a conditional request,
+    and reuse the cached body if the server answers 304 Not Modified.
+    If max_cache_size is 0, the cache is not used at all.
+    Exceptions raised by the request are not handled.
+    """
+    get = requests.get if session is None else session.get
+    if max_cache_size == 0:
+        response = get(url, timeout=timeout)
+        return HttpResponse(response.status_code, response.content, response.headers)
+
+    response = get(
+        url, headers=get_conditional_headers(url, cache_dir), timeout=timeout
+    )
+
+    if response.status_code == 304:
+        body = read_cached_body(url, cache_dir)
+        if body is not None:
+            return HttpResponse(200, body, response.headers)
+        # The cached response was evicted since the request was sent, request it again
+        response = get(url, timeout=timeout)
+
+    if response.status_code == 200:
+        store_response(url, response, cache_dir, max_cache_size)
+
+    return HttpResponse(response.status_code, response.content, response.headers)
+
+
+def _write_body_to_file(
+    response: requests.Response, path: str, chunk_size: int
+) -> tuple[int, str]:
+    """
+    Write the body of a streamed response to a temporary file next to the path, in chunks,
+    computing its size and checksum as it is written, then move the file to the path.
+    If the size does not match the Content-Length of the response,
+    the file is discarded and IncompleteDownloadError is raised.
+    Return the size and sha256 checksum of the body.
+    """
+    checksum = sha256()
+    size = 0
+    try:
+        with open(path + ".part", "wb") as file:
+            for chunk in response.iter_content(chunk_size):
+                file.write(chunk)
+                checksum.update(chunk)
+                size += len(chunk)
+
+        # With a Content-Encoding, Content-Length is the size of the encoded body
+        expected_size = response.headers.get("Content-Length")
+        encoding = response.headers.get("Content-Encoding", "identity")
+        if expected_size is not None and encoding == "identity":
+            if int(expected_size) != size:
+                raise IncompleteDownloadError(
+                    f"Received {size} bytes, expected {expected_size}",
+                    response=response,
+                )
+    except BaseException:
+        Path(path + ".part").unlink(missing_ok=True)
+        raise
+
+    replace(path + ".part", path)
+    return size, checksum.hexdigest()
+
+
+def cached_download(
+    url: str,
+    path: str,
+    session: requests.Session | None = None,
+    timeout: int = 5,
+    cache_dir: Path = HTTP_CACHE_DIR,
+    max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> DownloadResult:
+    """
+    Version of cached_get that streams the body of the response to the path
+    in chunks of chunk_size bytes, instead of holding it in memory.
+    The file is only moved to the path once it is complete,
+    and only if the status code is 200: otherwise the path is not touched.
+    Return the status code and headers of the response, and the size and checksum of the file.
+    """
+    get = requests.get if session is None else session.get
+    conditional_headers = (
+        {} if max_cache_size == 0 else get_conditional_headers(url, cache_dir)
+    )
+
+    # If the cached response was evicted since the request was sent, request it again
+    for headers in [conditional_headers, {}]:
+        with get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304:
+                if not copy_cached_body(url, path, cache_dir):
+                    continue
+                with open(path, "rb") as file:
+                    checksum = file_digest(file, "sha256").hexdigest()
+                size = Path(path).stat().st_size
+                return DownloadResult(200, size, checksum, response.headers, True)
+
+            if response.status_code != 200:
+                return DownloadResult(response.status_code, 0, "", response.headers)
+
+            size, checksum = _write_body_to_file(response, path, chunk_size)
+
+        if max_cache_size != 0:
+            store_file(url, response.headers, path, cache_dir, max_cache_size)
+        return DownloadResult(200, size, checksum, response.headers)
+
+    return DownloadResult(response.status_code, 0, "", response.headers)
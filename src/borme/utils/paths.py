@@ -0,0 +1,37 @@
+"""
+Paths of the data directory, where the scripts write their outputs, caches and logs.
+
+The data directory is the `data` directory at the root of the repository,
+unless the environment variable BORME_DATA_DIR is set,
+e.g. to run the benchmarks without touching the real data.
+
+Constants:
+    DATA_DIR
+    OUTPUT_DIR
+    REPORTS_DIR
+    METRICS_DIR
+    PARQUET_DIR
+    ACTS_DATABASE_PATH
+    COMPANY_INDEX_PATH
+
+"""
+import os
+from pathlib import Path
+
+DATA_DIR = Path(
+    os.environ.get("BORME_DATA_DIR")
+    or Path(__file__).parent.parent.parent.parent / "data"
+)
+
+# Directory with one subdirectory per date, with its pdfs and acts
+OUTPUT_DIR = DATA_DIR / "output"
+# Json report of every run of the scripts
+REPORTS_DIR = DATA_DIR / "reports"
+# Metrics of the last run of each script, in the text format of Prometheus
+METRICS_DIR = DATA_DIR / "metrics"
+# Directory of the parquet dataset with the acts of every date
+PARQUET_DIR = DATA_DIR / "parquet" / "acts"
+# SQLite database with the acts of every date
+ACTS_DATABASE_PATH = DATA_DIR / "acts.sqlite"
+# SQLite index from company names to their acts in the acts.jsonl files
+COMPANY_INDEX_PATH = DATA_DIR / "company_index.sqlite"
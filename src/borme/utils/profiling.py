@@ -0,0 +1,190 @@
+"""
+Util functions used for measuring where the time of a run is spent.
+
+Each stage of the pipeline (http requests, pdf reading, header stripping, act splitting,
+writing the jsonl files...) is wrapped in the `stage` context manager,
+which records its wall time, cpu time, bytes and counts for each date and pdf.
+Nothing is recorded unless profiling is enabled with the `profiling` context manager,
+which also logs a summary table of the stages at the end of the run,
+and optionally dumps a cProfile of the main thread and the stage records,
+or the records are collected with the `recording_stages` context manager, e.g. for the run report.
+
+Functions:
+    stage
+    recording_stages
+    profiling
+    is_profiling_enabled
+    call_and_collect_records
+    add_records
+    format_profile_summary
+
+"""
+import cProfile
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Callable, Iterator, NamedTuple
+
+from logs import log_profile_summary
+
+
+class StageRecord(NamedTuple):
+    """Time, bytes and count of a single execution of a stage"""
+
+    stage: str
+    date: str | None
+    pdf: str | None
+    wall: float
+    cpu: float
+    bytes: int
+    count: int
+    # The stage was served from the http cache, after a 304 Not Modified
+    cached: bool = False
+
+
+class StageStats:
+    """Bytes, count and cache flag of a stage, set by the code that runs the stage"""
+
+    __slots__ = ("bytes", "count", "cached")
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.count = 0
+        self.cached = False
+
+
+# Records of the stages executed in this process, while profiling is enabled
+_records: list[StageRecord] = []
+# Number of active blocks that record the stages, they can be nested
+_depth = 0
+
+
+def is_profiling_enabled() -> bool:
+    """Check if the stages are being recorded."""
+    return _depth > 0
+
+
+@contextmanager
+def stage(
+    name: str, date_: date | None = None, pdf: str | None = None
+) -> Iterator[StageStats]:
+    """
+    Record the wall time and the cpu time of the thread spent in the block,
+    with the bytes and count set in the yielded stats, if profiling is enabled.
+    """
+    stats = StageStats()
+    if _depth == 0:
+        yield stats
+        return
+
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield stats
+    finally:
+        _records.append(
+            StageRecord(
+                stage=name,
+                date=None if date_ is None else date_.strftime("%Y-%m-%d"),
+                pdf=pdf,
+                wall=time.perf_counter() - wall,
+                cpu=time.thread_time() - cpu,
+                bytes=stats.bytes,
+                count=stats.count,
+                cached=stats.cached,
+            )
+        )
+
+
+def add_records(records: list[StageRecord]) -> None:
+    """Add the records of the stages executed by another process."""
+    _records.extend(records)
+
+
+def call_and_collect_records(
+    func: Callable[..., Any], *args: Any
+) -> tuple[Any, list[StageRecord]]:
+    """
+    Call the function with profiling enabled, return its result and the records of its stages.
+    Used to run a function in a worker process, whose records are returned to the parent.
+    """
+    start = len(_records)
+    with recording_stages() as records:
+        result = func(*args)
+    # The records are sent back to the parent process, which adds them to its own records
+    del _records[start:]
+    return result, records
+
+
+def format_profile_summary(records: list[StageRecord]) -> str:
+    """Return a table with the number of calls, time, bytes and count of every stage."""
+    totals: dict[str, list] = defaultdict(lambda: [0, 0.0, 0.0, 0, 0])
+    for record in records:
+        total = totals[record.stage]
+        total[0] += 1
+        total[1] += record.wall
+        total[2] += record.cpu
+        total[3] += record.bytes
+        total[4] += record.count
+
+    lines = [
+        f"{'stage':<28}{'calls':>8}{'wall (s)':>12}{'cpu (s)':>12}{'MB':>10}{'count':>10}"
+    ]
+    for name, (calls, wall, cpu, num_of_bytes, count) in sorted(
+        totals.items(), key=lambda item: -item[1][1]
+    ):
+        lines.append(
+            f"{name:<28}{calls:>8}{wall:>12.3f}{cpu:>12.3f}"
+            + f"{num_of_bytes / 1024**2:>10.1f}{count:>10}"
+        )
+    return "\n".join(lines)
+
+
+@contextmanager
+def recording_stages() -> Iterator[list[StageRecord]]:
+    """
+    Record the stages executed in the block.
+    Yield a list, which is filled with the records of the block when the block ends.
+    The blocks can be nested, each one gets the records of its own stages.
+    """
+    global _depth  # pylint: disable=global-statement
+    records: list[StageRecord] = []
+    start = len(_records)
+    _depth += 1
+    try:
+        yield records
+    finally:
+        _depth -= 1
+        records.extend(_records[start:])
+        # The records are kept while an outer block needs them
+        if _depth == 0:
+            _records.clear()
+
+
+@contextmanager
+def profiling(enabled: bool = True, output: str | None = None) -> Iterator[None]:
+    """
+    Record the stages executed in the block, log a summary table at the end.
+    If output is given, a cProfile of the main thread is dumped to that path,
+    which can be read with pstats or turned into a flamegraph (e.g. with flameprof),
+    and the record of every stage is written next to it, as a jsonl file.
+    """
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile() if output is not None else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        with recording_stages() as records:
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(output)
+            with open(f"{output}.stages.jsonl", "w", encoding="utf-8") as file:
+                for record in records:
+                    file.write(json.dumps(record._asdict()) + "\n")
+        log_profile_summary(format_profile_summary(records))
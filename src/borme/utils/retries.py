@@ -0,0 +1,202 @@
+"""
+Util functions used for sending http requests politely and reliably:
+failed requests are retried with exponential backoff and jitter,
+honouring the Retry-After header, and the requests to a host are rate limited
+with a token bucket shared by every thread of the process.
+
+Both a blocking and an asyncio version of the requests are provided.
+The asyncio version sends each attempt from a thread, reusing the same http session,
+and waits between attempts without blocking any thread.
+
+Functions:
+    get_rate_limiter
+    get_retry_delay
+    call_with_retries
+    call_with_retries_async
+    get_with_retries
+
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import cache, partial
+from threading import Lock
+from typing import Callable, TypeVar
+from urllib.parse import urlparse
+
+import requests
+from logs import log_retrying_request
+from requests.exceptions import RequestException
+from utils.http_cache import DownloadResult, HttpResponse, cached_get
+
+# Status codes of the responses that are worth retrying: rate limited or temporary errors
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+BACKOFF_BASE = 0.5  # seconds
+MAX_BACKOFF = 30.0  # seconds
+MAX_RETRY_AFTER = 600.0  # seconds
+
+# Result of a request: the response of cached_get or the result of cached_download
+Response = TypeVar("Response", HttpResponse, DownloadResult)
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket: up to `rate` requests per second on average,
+    with bursts of up to `capacity` requests. A rate of 0 means no limit.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token from the bucket, return the number of seconds
+        to wait before sending the request it allows.
+        """
+        if self.rate == 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # The tokens can go negative, so each request waits its turn
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+@cache
+def get_rate_limiter(host: str, rate: float) -> TokenBucket:
+    """Return the token bucket that limits the requests to a host, shared by the whole process."""
+    return TokenBucket(rate)
+
+
+def get_retry_delay(attempt: int, retry_after: str | None = None) -> float:
+    """
+    Return the seconds to wait before retrying a request that failed `attempt` times.
+    If the server sent a Retry-After header, in seconds or as a http date, it is honoured.
+    Otherwise the delay is random, up to an exponentially growing limit (full jitter),
+    so the retries of concurrent requests do not hit the server at the same time.
+    """
+    if retry_after is not None:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                retry_date = parsedate_to_datetime(retry_after)
+                delay = (retry_date - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), MAX_RETRY_AFTER)
+
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2**attempt))
+
+
+def _get_delay_before_retry(
+    attempt: int,
+    retries: int,
+    response: HttpResponse | DownloadResult | None,
+) -> float | None:
+    """
+    Return the seconds to wait before the next attempt,
+    or None if the response is final or there are no retries left.
+    A response of None means the attempt raised an exception.
+    """
+    if attempt >= retries:
+        return None
+    if response is None:
+        return get_retry_delay(attempt)
+    if response.status_code in RETRY_STATUS_CODES:
+        return get_retry_delay(attempt, response.headers.get("Retry-After"))
+    return None
+
+
+def call_with_retries(
+    fetch: Callable[[], Response], url: str, retries: int = 3, rate: float = 0
+) -> Response:
+    """
+    Call fetch, which sends a http request to the url, and retry it if it raises
+    a RequestException or receives a temporary error, up to `retries` times.
+    At most `rate` requests per second are sent to the host of the url.
+    If every attempt fails, the exception of the last one is raised,
+    or the response of the last one is returned.
+    """
+    rate_limiter = get_rate_limiter(urlparse(url).netloc, rate)
+    attempt = 0
+    while True:
+        time.sleep(rate_limiter.reserve())
+        try:
+            response = fetch()
+        except RequestException:
+            if attempt >= retries:
+                raise
+            response = None
+
+        delay = _get_delay_before_retry(attempt, retries, response)
+        if delay is None and response is not None:
+            return response
+        attempt += 1
+        log_retrying_request(url, attempt, retries, delay)
+        time.sleep(delay)
+
+
+async def call_with_retries_async(
+    fetch: Callable[[], Response], url: str, retries: int = 3, rate: float = 0
+) -> Response:
+    """
+    Asyncio version of call_with_retries.
+    Each attempt is sent from a thread, the waits between attempts do not block any thread.
+    """
+    rate_limiter = get_rate_limiter(urlparse(url).netloc, rate)
+    attempt = 0
+    while True:
+        await asyncio.sleep(rate_limiter.reserve())
+        try:
+            response = await asyncio.to_thread(fetch)
+        except RequestException:
+            if attempt >= retries:
+                raise
+            response = None
+
+        delay = _get_delay_before_retry(attempt, retries, response)
+        if delay is None and response is not None:
+            return response
+        attempt += 1
+        log_retrying_request(url, attempt, retries, delay)
+        await asyncio.sleep(delay)
+
+
+def get_with_retries(
+    url: str,
+    session: requests.Session | None = None,
+    timeout: int = 5,
+    max_cache_size: int = 0,
+    retries: int = 3,
+    rate: float = 0,
+) -> HttpResponse:
+    """
+    Version of cached_get that retries the requests that raise an exception
+    or receive a temporary error, up to `retries` times,
+    and sends at most `rate` requests per second to the host of the url.
+    """
+    return call_with_retries(
+        partial(
+            cached_get,
+            url,
+            session=session,
+            timeout=timeout,
+            max_cache_size=max_cache_size,
+        ),
+        url,
+        retries=retries,
+        rate=rate,
+    )
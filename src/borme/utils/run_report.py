@@ -0,0 +1,318 @@
+"""
+Util functions used for reporting the result of each run of the scripts.
+
+At the end of a run, a json report is written with, for each date,
+the pdfs found and downloaded, the acts parsed, the warnings logged by type,
+the time spent in each stage and whether the date succeeded or failed.
+The totals of the run are exported as metrics in the text format of Prometheus,
+to a file that can be read by the textfile collector of node_exporter.
+The metrics have no date label, the detail of each date is only in the json report.
+
+Classes:
+    WarningCounter
+
+Functions:
+    summarize_stages
+    get_date_summary
+    build_run_report
+    format_prometheus_metrics
+    write_file_atomically
+    run_report
+
+"""
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+from logging import WARNING, Handler, LogRecord
+from os import replace
+from pathlib import Path
+from typing import Any, Iterator
+
+from logs import add_log_handler, flush_logs, log_wrote_run_report, remove_log_handler
+from utils.paths import METRICS_DIR, OUTPUT_DIR, REPORTS_DIR
+from utils.profiling import StageRecord, recording_stages
+from utils.write_and_read_files import read_list_from_txt
+
+
+class WarningCounter(Handler):
+    """
+    Count the warnings by date and by type,
+    the type of a warning is the name of the helper that logged it, e.g. 'unexpected_num_of_matches'.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(WARNING)
+        self.counts: Counter[tuple[str | None, str]] = Counter()
+
+    def emit(self, record: LogRecord) -> None:
+        date_ = getattr(record, "date", None)
+        self.counts[
+            (
+                None if date_ is None else str(date_),
+                record.funcName.removeprefix("log_"),
+            )
+        ] += 1
+
+
+def summarize_stages(records: list[StageRecord]) -> dict[str, dict[str, Any]]:
+    """Return the number of calls, time, bytes and count of every stage."""
+    stages: dict[str, dict[str, Any]] = defaultdict(
+        lambda: {
+            "calls": 0,
+            "wall_seconds": 0.0,
+            "cpu_seconds": 0.0,
+            "bytes": 0,
+            "count": 0,
+        }
+    )
+    for record in records:
+        stage = stages[record.stage]
+        stage["calls"] += 1
+        stage["wall_seconds"] += record.wall
+        stage["cpu_seconds"] += record.cpu
+        stage["bytes"] += record.bytes
+        stage["count"] += record.count
+    return dict(stages)
+
+
+def get_date_summary(
+    script: str,
+    date_: date,
+    records: list[StageRecord],
+    warnings: dict[str, int],
+) -> dict[str, Any]:
+    """
+    Return the summary of a date: the pdfs found in the webpage and the pdfs on disk,
+    the pdfs downloaded in this run and the pdfs copied from the http cache instead,
+    the acts in the acts.jsonl file, the warnings and the stages.
+    A date failed if no pdfs were found, if some pdfs are missing,
+    or, for the scripts that parse the pdfs, if there are no acts.
+    """
+    data_dir = OUTPUT_DIR / date_.strftime("%Y-%m-%d")
+    pdf_urls = read_list_from_txt(str(data_dir / "pdf_urls.txt"))
+    pdfs_on_disk = len(list(data_dir.glob("*.pdf")))
+    downloads = [
+        record
+        for record in records
+        if record.stage == "download_pdf" and record.bytes > 0 and not record.cached
+    ]
+    cache_hits = [
+        record
+        for record in records
+        if record.stage == "download_pdf" and record.bytes > 0 and record.cached
+    ]
+
+    acts_path = data_dir / "acts.jsonl"
+    acts = 0
+    if acts_path.is_file():
+        with open(acts_path, "rb") as file:
+            acts = sum(1 for _ in file)
+
+    failed = (
+        len(pdf_urls) == 0
+        or pdfs_on_disk < len(pdf_urls)
+        or (script != "spyder" and acts == 0)
+    )
+    return {
+        "date": date_.strftime("%Y-%m-%d"),
+        "status": "failed" if failed else "warnings" if warnings else "succeeded",
+        "pdfs_found": len(pdf_urls),
+        "pdfs_on_disk": pdfs_on_disk,
+        "pdfs_downloaded": len(downloads),
+        "downloaded_bytes": sum(record.bytes for record in downloads),
+        "pdfs_from_cache": len(cache_hits),
+        "acts": acts,
+        "warnings": warnings,
+        "stages": summarize_stages(records),
+    }
+
+
+def build_run_report(
+    script: str,
+    dates: list[date],
+    records: list[StageRecord],
+    warning_counts: Counter[tuple[str | None, str]],
+    started_at: float,
+    finished_at: float,
+) -> dict[str, Any]:
+    """Return the report of a run of a script on the dates, with a summary of every date."""
+    records_by_date: dict[str | None, list[StageRecord]] = defaultdict(list)
+    for record in records:
+        records_by_date[record.date].append(record)
+    warnings_by_date: dict[str | None, dict[str, int]] = defaultdict(dict)
+    for (date_, kind), count in sorted(warning_counts.items(), key=str):
+        warnings_by_date[date_][kind] = count
+
+    summaries = []
+    for date_ in dates:
+        key = date_.strftime("%Y-%m-%d")
+        summaries.append(
+            get_date_summary(script, date_, records_by_date[key], warnings_by_date[key])
+        )
+
+    duration = finished_at - started_at
+    totals = {
+        "dates": len(summaries),
+        "failed_dates": sum(1 for s in summaries if s["status"] == "failed"),
+        "pdfs_found": sum(s["pdfs_found"] for s in summaries),
+        "pdfs_downloaded": sum(s["pdfs_downloaded"] for s in summaries),
+        "downloaded_bytes": sum(s["downloaded_bytes"] for s in summaries),
+        "pdfs_from_cache": sum(s["pdfs_from_cache"] for s in summaries),
+        "acts": sum(s["acts"] for s in summaries),
+        "warnings": sum(warning_counts.values()),
+    }
+    return {
+        "script": script,
+        "started_at": datetime.fromtimestamp(started_at).isoformat(timespec="seconds"),
+        "finished_at": datetime.fromtimestamp(finished_at).isoformat(
+            timespec="seconds"
+        ),
+        "duration_seconds": duration,
+        "totals": totals,
+        "throughput": {
+            "pdfs_per_second": totals["pdfs_downloaded"] / duration if duration else 0,
+            "bytes_per_second": totals["downloaded_bytes"] / duration
+            if duration
+            else 0,
+            "acts_per_second": totals["acts"] / duration if duration else 0,
+        },
+        # Warnings that are not about a single date, e.g. dates that cannot be read
+        "warnings": warnings_by_date[None],
+        "stages": summarize_stages(records),
+        "dates": summaries,
+    }
+
+
+def format_prometheus_metrics(report: dict[str, Any], timestamp: float) -> str:
+    """
+    Return the metrics of the run report in the text format of Prometheus.
+    Only the aggregates of the run are exported, so the number of series does not grow
+    with the number of dates.
+    """
+    script = report["script"]
+    warnings_by_type: Counter[str] = Counter()
+    for summary in [report, *report["dates"]]:
+        warnings_by_type.update(summary["warnings"])
+    dates_by_status = Counter(s["status"] for s in report["dates"])
+
+    families: list[tuple[str, str, list[tuple[dict[str, str], float]]]] = [
+        ("borme_run_timestamp_seconds", "End time of the last run.", [({}, timestamp)]),
+        (
+            "borme_run_duration_seconds",
+            "Duration of the last run.",
+            [({}, report["duration_seconds"])],
+        ),
+        *[
+            (
+                f"borme_run_{name}",
+                f"Total {name.replace('_', ' ')} of the last run.",
+                [({}, value)],
+            )
+            for name, value in report["totals"].items()
+        ],
+        *[
+            (
+                f"borme_run_{name}",
+                f"Throughput of the last run, in {name.replace('_', ' ')}.",
+                [({}, value)],
+            )
+            for name, value in report["throughput"].items()
+        ],
+        (
+            "borme_run_warnings_by_type",
+            "Warnings logged in the last run, by type.",
+            [({"type": kind}, count) for kind, count in warnings_by_type.items()],
+        ),
+        (
+            "borme_stage_seconds",
+            "Wall time spent in each stage in the last run.",
+            [
+                ({"stage": name}, stage["wall_seconds"])
+                for name, stage in report["stages"].items()
+            ],
+        ),
+        (
+            "borme_stage_calls",
+            "Executions of each stage in the last run.",
+            [
+                ({"stage": name}, stage["calls"])
+                for name, stage in report["stages"].items()
+            ],
+        ),
+        (
+            "borme_run_dates_by_status",
+            "Dates of the last run, by status.",
+            [
+                ({"status": status}, dates_by_status[status])
+                for status in ["succeeded", "warnings", "failed"]
+            ],
+        ),
+    ]
+
+    lines = []
+    for name, help_text, samples in families:
+        if len(samples) == 0:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            label_text = ",".join(
+                f'{key}="{value}"'
+                for key, value in {"script": script, **labels}.items()
+            )
+            lines.append(f"{name}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_file_atomically(path: Path, text: str) -> None:
+    """
+    Write the text to a temporary file and move it to the path,
+    so the file is never read half written, e.g. by the textfile collector.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    replace(tmp_path, path)
+
+
+@contextmanager
+def run_report(
+    script: str,
+    dates: list[date],
+    report_path: str | None = None,
+    metrics_path: str | None = None,
+) -> Iterator[None]:
+    """
+    Record the stages and count the warnings of the run of a script in the block.
+    At the end, write the json report of the run, by default to REPORTS_DIR/TIMESTAMP_SCRIPT.json,
+    and the metrics of the run, by default to METRICS_DIR/borme_SCRIPT.prom.
+    """
+    started_at = time.time()
+    counter = WarningCounter()
+    add_log_handler(counter)
+    try:
+        with recording_stages() as records:
+            yield
+    finally:
+        # Count the warnings that are still waiting to be written
+        flush_logs()
+        remove_log_handler(counter)
+
+        finished_at = time.time()
+        report = build_run_report(
+            script, dates, records, counter.counts, started_at, finished_at
+        )
+        if report_path is None:
+            timestamp = datetime.fromtimestamp(started_at).strftime("%Y%m%dT%H%M%S")
+            report_path = str(REPORTS_DIR / f"{timestamp}_{script}.json")
+        if metrics_path is None:
+            metrics_path = str(METRICS_DIR / f"borme_{script}.prom")
+        write_file_atomically(Path(report_path), json.dumps(report, indent=2) + "\n")
+        write_file_atomically(
+            Path(metrics_path), format_prometheus_metrics(report, finished_at)
+        )
+        log_wrote_run_report(
+            report_path, report["totals"]["dates"], report["totals"]["failed_dates"]
+        )
@@ -2,38 +2,99 @@
 Util functions used for filtering strings based on a regex pattern.
 
 Functions:
+    compile_line_filter
+    find_first_matching_pattern
+    drop_lines_with_patterns
     drop_lines_with_pattern
     drop_pattern
+    iter_lines
+    drop_lines_with_patterns_lazily
+    drop_text_lazily
 
 """
 import re
+from collections import deque
 from datetime import date
+from functools import cache
+from typing import Iterable, Iterator
 
 from logs import log_unexpected_num_of_matches
 
 
-def drop_lines_with_pattern(
-    input_string: str, pattern: str, expected_num_of_matches: int, date_: date, pdf: str
+@cache
+def compile_line_filter(
+    patterns: tuple[str, ...]
+) -> tuple[re.Pattern, tuple[re.Pattern, ...]]:
+    """
+    Compile a list of patterns.
+    Return a single pattern that matches wherever any of the patterns matches,
+    and the compiled version of every pattern.
+    The result is cached, so each list of patterns is only compiled once.
+    """
+    any_pattern = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+    compiled_patterns = tuple(re.compile(pattern) for pattern in patterns)
+    return any_pattern, compiled_patterns
+
+
+def find_first_matching_pattern(
+    line: str, any_pattern: re.Pattern, compiled_patterns: tuple[re.Pattern, ...]
+) -> int | None:
+    """
+    Return the index of the first pattern that has a match in the line,
+    or None if there is no match.
+    Most lines do not match any pattern, and they are discarded with a single search.
+    """
+    if not any_pattern.search(line):
+        return None
+    for i, pattern in enumerate(compiled_patterns):
+        if pattern.search(line):
+            return i
+    return None
+
+
+def drop_lines_with_patterns(
+    input_string: str, patterns: list[tuple[str, int]], date_: date, pdf: str
 ) -> str:
     """
-    Drop the lines that contain a match to some pattern.
-    If the number of lines dropped is not the expected, log it.
+    Drop the lines that contain a match to any of the (pattern, expected_num_of_matches).
+    A dropped line only counts as a match of the first pattern it matches.
+    If the number of lines dropped for a pattern is not the expected, log it.
     """
-    # filter lines that don't contain a match to the pattern
-    lines = input_string.split("\n")
-    filtered_lines = [line for line in lines if not re.search(pattern, line)]
+    any_pattern, compiled_patterns = compile_line_filter(
+        tuple(pattern for pattern, _ in patterns)
+    )
+
+    # filter lines that don't contain a match to any pattern, in a single pass
+    num_of_matches = [0] * len(patterns)
+    filtered_lines = []
+    for line in input_string.split("\n"):
+        i = find_first_matching_pattern(line, any_pattern, compiled_patterns)
+        if i is None:
+            filtered_lines.append(line)
+        else:
+            num_of_matches[i] += 1
 
     # check if the number of matches is not the expected
-    num_of_matches = len(lines) - len(filtered_lines)
-    if num_of_matches != expected_num_of_matches:
-        log_unexpected_num_of_matches(
-            pattern, num_of_matches, expected_num_of_matches, date_, pdf
-        )
+    for (pattern, expected_num_of_matches), matches in zip(patterns, num_of_matches):
+        if matches != expected_num_of_matches:
+            log_unexpected_num_of_matches(
+                pattern, matches, expected_num_of_matches, date_, pdf
+            )
 
     # join filtered lines to a single string
-    result_string = "\n".join(filtered_lines)
+    return "\n".join(filtered_lines)
 
-    return result_string
+
+def drop_lines_with_pattern(
+    input_string: str, pattern: str, expected_num_of_matches: int, date_: date, pdf: str
+) -> str:
+    """
+    Drop the lines that contain a match to some pattern.
+    If the number of lines dropped is not the expected, log it.
+    """
+    return drop_lines_with_patterns(
+        input_string, [(pattern, expected_num_of_matches)], date_, pdf
+    )
 
 
 def drop_pattern(
@@ -43,14 +104,113 @@ def drop_pattern(
     Substitute the occurrences of the pattern with an empty string.
     If the number of occurrences is not the expected, log it.
     """
-    # substitute matches with an empty string
-    result_string = re.sub(pattern, "", input_string)
+    # substitute matches with an empty string, count them in the same pass
+    result_string, num_of_matches = re.subn(pattern, "", input_string)
 
     # check num of matches is the expected number
-    num_of_matches = len(re.findall(pattern, input_string))
     if num_of_matches != expected_num_of_matches:
         log_unexpected_num_of_matches(
             pattern, num_of_matches, expected_num_of_matches, date_, pdf
         )
 
     return result_string
+
+
+def iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Split a stream of text chunks into lines.
+    The last line of a chunk is carried over to the next chunk, so the result is
+    the same as "".join(chunks).split("\\n"), without building the whole text.
+    """
+    carry = ""
+    for chunk in chunks:
+        lines = (carry + chunk).split("\n")
+        carry = lines.pop()
+        yield from lines
+    yield carry
+
+
+def drop_lines_with_patterns_lazily(
+    lines: Iterable[str],
+    patterns: list[tuple[str, int]],
+    date_: date,
+    pdf: str,
+) -> Iterator[str]:
+    """
+    Lazy version of drop_lines_with_pattern for a list of (pattern, expected_num_of_matches).
+    Yield the lines that do not contain a match to any of the patterns.
+    A dropped line only counts as a match of the first pattern it matches.
+    Once all the lines are consumed, log the patterns with an unexpected number of matches.
+    """
+    any_pattern, compiled_patterns = compile_line_filter(
+        tuple(pattern for pattern, _ in patterns)
+    )
+
+    num_of_matches = [0] * len(patterns)
+    for line in lines:
+        i = find_first_matching_pattern(line, any_pattern, compiled_patterns)
+        if i is None:
+            yield line
+        else:
+            num_of_matches[i] += 1
+
+    # check if the number of matches is not the expected
+    for (pattern, expected_num_of_matches), matches in zip(patterns, num_of_matches):
+        if matches != expected_num_of_matches:
+            log_unexpected_num_of_matches(
+                pattern, matches, expected_num_of_matches, date_, pdf
+            )
+
+
+def drop_text_lazily(
+    lines: Iterable[str],
+    text: str,
+    expected_num_of_matches: int,
+    date_: date,
+    pdf: str,
+) -> Iterator[str]:
+    """
+    Lazy version of drop_pattern for a literal text that may span multiple lines.
+    Yield the lines after removing the occurrences of the text.
+    Once all the lines are consumed, log it if the number of occurrences is not the expected.
+    """
+    # The text spans len(parts) consecutive lines
+    parts = text.split("\n")
+    num_of_matches = 0
+
+    window: deque[str] = deque()
+    for line in lines:
+        window.append(line)
+        if len(window) < len(parts):
+            continue
+
+        # A single line text is a match if it is contained in the line
+        if len(parts) == 1:
+            num_of_matches += window[0].count(text)
+            yield window.popleft().replace(text, "")
+            continue
+
+        # A multiline text is a match if it ends the first line of the window,
+        # fills the lines in between and starts the last line of the window
+        is_match = (
+            window[0].endswith(parts[0])
+            and all(window[i] == parts[i] for i in range(1, len(parts) - 1))
+            and window[-1].startswith(parts[-1])
+        )
+        if is_match:
+            num_of_matches += 1
+            # Join what is left of the first and last lines of the window
+            merged_line = window[0][: len(window[0]) - len(parts[0])]
+            merged_line += window[-1][len(parts[-1]) :]
+            window.clear()
+            window.append(merged_line)
+        else:
+            yield window.popleft()
+
+    yield from window
+
+    # check num of matches is the expected number
+    if num_of_matches != expected_num_of_matches:
+        log_unexpected_num_of_matches(
+            text, num_of_matches, expected_num_of_matches, date_, pdf
+        )
@@ -3,13 +3,22 @@ Util functions used for casting values to different data types
 
 Functions:
     cast_str_to_date
+    get_easter_sunday
+    get_national_holidays
+    is_borme_published
+    expand_date_range
     uniq_dates_in_list
     flatten
 
 """
-from datetime import date
+from datetime import date, timedelta
+from functools import cache
 
-from logs import log_cannot_cast_str_to_date, log_duplicate_dates
+from logs import (
+    log_cannot_cast_str_to_date,
+    log_duplicate_dates,
+    log_invalid_date_range,
+)
 
 
 def cast_str_to_date(my_date: str) -> date | None:
@@ -27,16 +36,78 @@ def cast_str_to_date(my_date: str) -> date | None:
         return None
 
 
+def get_easter_sunday(year: int) -> date:
+    """Return the date of easter sunday of a year (anonymous gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    el = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * el) // 451
+    month, day = divmod(h + el - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@cache
+def get_national_holidays(year: int) -> frozenset[date]:
+    """Return the national holidays of Spain of a year, when the BORME is not published."""
+    fixed_holidays = [
+        (1, 1),  # Año Nuevo
+        (1, 6),  # Epifanía del Señor
+        (5, 1),  # Fiesta del Trabajo
+        (8, 15),  # Asunción de la Virgen
+        (10, 12),  # Fiesta Nacional de España
+        (11, 1),  # Todos los Santos
+        (12, 6),  # Día de la Constitución
+        (12, 8),  # Inmaculada Concepción
+        (12, 25),  # Natividad del Señor
+    ]
+    good_friday = get_easter_sunday(year) - timedelta(days=2)
+    return frozenset([date(year, m, d) for m, d in fixed_holidays] + [good_friday])
+
+
+def is_borme_published(day: date) -> bool:
+    """
+    Return False for the days when the BORME is not published: weekends and national holidays.
+    """
+    return day.weekday() < 5 and day not in get_national_holidays(day.year)
+
+
+def expand_date_range(date_range: str) -> list[date]:
+    """
+    Convert a str with format YYYYMMDD..YYYYMMDD to the list of dates between both dates,
+    both included, skipping the days when the BORME is not published.
+    Return an empty list if the conversion is impossible.
+    """
+    start_str, end_str = date_range.split("..", 1)
+    start, end = cast_str_to_date(start_str), cast_str_to_date(end_str)
+    if start is None or end is None or start > end:
+        log_invalid_date_range(date_range)
+        return []
+
+    days = (start + timedelta(days=i) for i in range((end - start).days + 1))
+    return [day for day in days if is_borme_published(day)]
+
+
 def uniq_dates_in_list(input_dates: tuple[str, ...]) -> list[date]:
     """
-    Convert list of strings to list of dates,
-    drop repeated elements and elements that cannot be converted to a date
+    Convert list of strings to list of dates, sorted chronologically.
+    Ranges of dates with the format YYYYMMDD..YYYYMMDD are expanded.
+    Drop repeated elements and elements that cannot be converted to a date
     """
     # cast dates from str to date, drop dates that cannot be converted
-    dates = [e for e in map(cast_str_to_date, input_dates) if e is not None]
+    dates: list[date] = []
+    for input_date in input_dates:
+        if ".." in input_date:
+            dates.extend(expand_date_range(input_date))
+        elif (date_ := cast_str_to_date(input_date)) is not None:
+            dates.append(date_)
 
-    # Drop duplicates
-    uniq_dates = list(set(dates))
+    # Drop duplicates, keep a stable order
+    uniq_dates = sorted(set(dates))
 
     # Log warning if there are any duplicates
     if len(dates) != len(uniq_dates):
@@ -48,9 +119,7 @@ def uniq_dates_in_list(input_dates: tuple[str, ...]) -> list[date]:
 def flatten(x: list[list]) -> list:
     """
     Flatten a list of lists to a list.
-    This is a very inefficient, very cool monoid. We are using python loops anyways so we may as
-    well use this.
-    If performance is an issue, a superior implementation is:
-    [item for sublist in l for item in sublist]
+    sum(x, []) is a very cool monoid, but it copies the partial result on every addition,
+    which is quadratic on the number of elements.
     """
-    return sum(x, [])
+    return [item for sublist in x for item in sublist]
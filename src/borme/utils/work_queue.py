@@ -0,0 +1,260 @@
+"""
+Util functions used for sharing the dates of a backfill between several workers,
+on the same host or on several hosts that share the data directory.
+
+The table `work_items` of a SQLite database has one row per date, with its status:
+'pending', 'leased' by a worker until its lease expires, 'done' or 'failed'.
+A worker claims the oldest pending date, or a date whose lease expired because its worker died,
+renews its lease while it processes the date, and marks the date as done when it finishes.
+A date that fails, or whose lease expires, is pending again, until it fails max_attempts times.
+It can only be claimed again after a delay that doubles with each attempt,
+so a date that keeps failing, e.g. because the website is down, is not retried in a loop.
+The done dates are never processed again, even if they are enqueued again.
+
+The database uses the rollback journal instead of write ahead logging,
+which needs shared memory and does not work on network filesystems.
+Every change is a short transaction that takes the write lock at the start.
+
+Constants:
+    DEFAULT_RETRY_DELAY
+    MAX_RETRY_DELAY
+
+Functions:
+    connect_to_work_queue
+    enqueue_dates
+    claim_date
+    renew_lease
+    release_date
+    requeue_expired_leases
+    get_queue_status
+
+"""
+import sqlite3
+import time
+from datetime import date
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    borme_date TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    available_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS work_items_status ON work_items (status, borme_date);
+"""
+
+# Dates that can be claimed: pending and past their retry delay,
+# or leased by a worker that stopped renewing its lease
+SELECT_CLAIMABLE_DATE = """
+SELECT borme_date FROM work_items
+WHERE (status = 'pending' AND available_at <= ?)
+    OR (status = 'leased' AND lease_expires_at < ?)
+ORDER BY borme_date
+LIMIT 1
+"""
+
+# Seconds before a failed date can be claimed again, doubled with each attempt
+DEFAULT_RETRY_DELAY = 60.0
+MAX_RETRY_DELAY = 3600.0
+# Time at which a date with `attempts` failed attempts can be claimed again,
+# from the parameters (now, retry_delay), in that order
+AVAILABLE_AT = f"? + min({MAX_RETRY_DELAY}, ? * (1 << max(attempts - 1, 0)))"
+
+
+def connect_to_work_queue(path: str) -> sqlite3.Connection:
+    """
+    Open a connection to the work queue, create the table if it does not exist.
+    The transactions are started explicitly, with BEGIN IMMEDIATE.
+    """
+    # Wait for other workers instead of failing when the database is locked
+    connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+    connection.execute("PRAGMA journal_mode = DELETE")
+    connection.executescript(SCHEMA)
+    # Queues created before the retry delay do not have the available_at column
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(work_items)")}
+    if "available_at" not in columns:
+        connection.execute(
+            "ALTER TABLE work_items ADD COLUMN available_at REAL NOT NULL DEFAULT 0"
+        )
+    return connection
+
+
+def enqueue_dates(path: str, dates: list[date]) -> int:
+    """
+    Add the dates to the work queue as pending, return the number of new dates.
+    The dates that are already in the queue keep their status.
+    """
+    connection = connect_to_work_queue(path)
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        # The ignored rows are not counted
+        cursor = connection.executemany(
+            "INSERT OR IGNORE INTO work_items (borme_date, updated_at) VALUES (?, ?)",
+            [(date_.strftime("%Y-%m-%d"), time.time()) for date_ in dates],
+        )
+        connection.execute("COMMIT")
+        return cursor.rowcount
+    finally:
+        connection.close()
+
+
+def claim_date(
+    path: str, worker: str, lease_seconds: float, max_attempts: int = 3
+) -> date | None:
+    """
+    Lease the oldest claimable date to the worker for lease_seconds, return the date,
+    or None if there are no dates to claim.
+    The pending dates that are waiting for their retry delay are not claimable yet.
+    A date whose lease expired max_attempts times, e.g. because it crashes the workers,
+    is marked as failed instead of being claimed again.
+    """
+    connection = connect_to_work_queue(path)
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        connection.execute(
+            """
+            UPDATE work_items
+            SET status = 'failed', worker = NULL, lease_expires_at = NULL,
+                error = 'The lease expired', updated_at = ?
+            WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?
+            """,
+            (now, now, max_attempts),
+        )
+        row = connection.execute(SELECT_CLAIMABLE_DATE, (now, now)).fetchone()
+        if row is None:
+            connection.execute("COMMIT")
+            return None
+        connection.execute(
+            """
+            UPDATE work_items
+            SET status = 'leased', worker = ?, lease_expires_at = ?,
+                attempts = attempts + 1, updated_at = ?
+            WHERE borme_date = ?
+            """,
+            (worker, now + lease_seconds, now, row[0]),
+        )
+        connection.execute("COMMIT")
+        return date.fromisoformat(row[0])
+    finally:
+        connection.close()
+
+
+def renew_lease(path: str, date_: date, worker: str, lease_seconds: float) -> bool:
+    """
+    Extend the lease of the worker on the date by lease_seconds from now.
+    Return False if the worker lost the lease, because it expired and another worker claimed it.
+    """
+    connection = connect_to_work_queue(path)
+    try:
+        now = time.time()
+        cursor = connection.execute(
+            """
+            UPDATE work_items SET lease_expires_at = ?, updated_at = ?
+            WHERE borme_date = ? AND worker = ? AND status = 'leased'
+            """,
+            (now + lease_seconds, now, date_.strftime("%Y-%m-%d"), worker),
+        )
+        return cursor.rowcount == 1
+    finally:
+        connection.close()
+
+
+def release_date(
+    path: str,
+    date_: date,
+    worker: str,
+    succeeded: bool,
+    error: str | None = None,
+    max_attempts: int = 3,
+    retry_delay: float = DEFAULT_RETRY_DELAY,
+) -> None:
+    """
+    Mark the date leased by the worker as done if it succeeded.
+    Otherwise, make it pending again, claimable after retry_delay seconds
+    doubled for each previous attempt, or mark it as failed after max_attempts attempts.
+    Nothing changes if the worker lost the lease.
+    """
+    connection = connect_to_work_queue(path)
+    try:
+        now = time.time()
+        connection.execute(
+            f"""
+            UPDATE work_items
+            SET status = CASE
+                    WHEN ? THEN 'done'
+                    WHEN attempts >= ? THEN 'failed'
+                    ELSE 'pending'
+                END,
+                worker = NULL, lease_expires_at = NULL, error = ?, updated_at = ?,
+                available_at = {AVAILABLE_AT}
+            WHERE borme_date = ? AND worker = ? AND status = 'leased'
+            """,
+            (
+                succeeded,
+                max_attempts,
+                error,
+                now,
+                now,
+                retry_delay,
+                date_.strftime("%Y-%m-%d"),
+                worker,
+            ),
+        )
+    finally:
+        connection.close()
+
+
+def requeue_expired_leases(
+    path: str, max_attempts: int = 3, retry_delay: float = DEFAULT_RETRY_DELAY
+) -> int:
+    """
+    Make the dates whose lease expired pending again, claimable after their retry delay,
+    or mark them as failed if they were attempted max_attempts times, as claim_date does.
+    Return the number of dates made pending again.
+    The workers also claim the expired dates on their own, this makes them visible in the status.
+    """
+    connection = connect_to_work_queue(path)
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        connection.execute(
+            """
+            UPDATE work_items
+            SET status = 'failed', worker = NULL, lease_expires_at = NULL,
+                error = 'The lease expired', updated_at = ?
+            WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?
+            """,
+            (now, now, max_attempts),
+        )
+        cursor = connection.execute(
+            f"""
+            UPDATE work_items
+            SET status = 'pending', worker = NULL, lease_expires_at = NULL,
+                error = 'The lease expired', updated_at = ?, available_at = {AVAILABLE_AT}
+            WHERE status = 'leased' AND lease_expires_at < ?
+            """,
+            (now, now, retry_delay, now),
+        )
+        connection.execute("COMMIT")
+        return cursor.rowcount
+    finally:
+        connection.close()
+
+
+def get_queue_status(path: str) -> dict[str, int]:
+    """Return the number of dates with each status."""
+    connection = connect_to_work_queue(path)
+    try:
+        counts = dict.fromkeys(["pending", "leased", "done", "failed"], 0)
+        for status, count in connection.execute(
+            "SELECT status, count(*) FROM work_items GROUP BY status"
+        ):
+            counts[status] = count
+        return counts
+    finally:
+        connection.close()
@@ -6,14 +6,24 @@ Functions:
     write_txt_from_list
     get_pages_in_pdf
     read_text_from_pdf
+    read_pdf
+    stream_pdf
     write_list_of_dict_to_json
+    read_jsonl_to_list_of_dict
+    append_dict_to_jsonl
+    read_manifest
+    write_manifest
+    get_file_sha256
+    write_columns_to_parquet
 
 """
-from functools import reduce
+import json
+from hashlib import file_digest
+from os import replace
 from os.path import isfile
+from typing import Iterable, Iterator
 
-import jsonlines  # type: ignore
-from pypdf import PdfReader
+from logs import log_invalid_manifest_line, log_missing_optional_dependency
 
 
 def read_list_from_txt(path: str) -> list:
@@ -40,28 +50,142 @@ def write_txt_from_list(my_list: list, path: str) -> None:
 
 def get_pages_in_pdf(path_to_pdf: str) -> int:
     """Return the number of pages in a pdf file."""
-    reader = PdfReader(path_to_pdf)
-    num_of_pages = len(reader.pages)
+    num_of_pages, _ = stream_pdf(path_to_pdf)
     return num_of_pages
 
 
 def read_text_from_pdf(path_to_pdf: str) -> str:
     """Return the text content of a pdf file."""
-    reader = PdfReader(path_to_pdf)
-    pages_text = [page.extract_text() for page in reader.pages]
+    _, pages_text = read_pdf(path_to_pdf)
+    return "".join(pages_text)
+
+
+def read_pdf(path_to_pdf: str) -> tuple[int, list[str]]:
+    """
+    Return the number of pages and the text content of every page of a pdf file.
+    The pdf is opened and parsed only once.
+    """
+    num_of_pages, pages_text = stream_pdf(path_to_pdf)
+    return num_of_pages, list(pages_text)
+
+
+def stream_pdf(path_to_pdf: str) -> tuple[int, Iterator[str]]:
+    """
+    Return the number of pages of a pdf file and an iterator over the text of its pages.
+    The text of each page is only extracted when the iterator reaches that page.
+    """
+    # pypdf is imported on first use, the scripts that do not read pdfs start faster
+    from pypdf import PdfReader  # pylint: disable=import-outside-toplevel
 
-    pdf_text = reduce(lambda x, y: x + y, pages_text)
-    return pdf_text
+    reader = PdfReader(path_to_pdf)
+    pages_text = (page.extract_text() for page in reader.pages)
+    return len(reader.pages), pages_text
 
 
 def write_list_of_dict_to_jsonl(
-    file_path: str, arr_of_dicts: list[dict], verbose: bool = False
+    file_path: str,
+    arr_of_dicts: Iterable[dict],
+    verbose: bool = False,
+    flush: bool = False,
 ) -> None:
     """
     Write a jsonl file from a list of dictionaries.
+    The dictionaries can also come from an iterator, in which case they are written
+    as they are produced. With flush=True every line is flushed to disk as soon as it is written.
     """
-    with jsonlines.open(file_path, mode="w") as writer:
+    import jsonlines  # type: ignore # pylint: disable=import-outside-toplevel
+
+    with jsonlines.open(file_path, mode="w", flush=flush) as writer:
         writer.write_all(arr_of_dicts)  # pylint: disable=no-member
 
     if verbose:
         print(f"Exported list of dictionaries to {file_path}")
+
+
+def read_jsonl_to_list_of_dict(file_path: str) -> list[dict]:
+    """
+    Read a jsonl file and return a list of dictionaries,
+    where each line in the file corresponds to an element in the list.
+    If the file does not exist return an empty list.
+    """
+    if not isfile(file_path):
+        return []
+    import jsonlines  # type: ignore # pylint: disable=import-outside-toplevel
+
+    with jsonlines.open(file_path, mode="r") as reader:
+        return list(reader)  # pylint: disable=no-member
+
+
+def append_dict_to_jsonl(file_path: str, my_dict: dict) -> None:
+    """Append a dictionary as a new line at the end of a jsonl file."""
+    import jsonlines  # type: ignore # pylint: disable=import-outside-toplevel
+
+    with jsonlines.open(file_path, mode="a", flush=True) as writer:
+        writer.write(my_dict)  # pylint: disable=no-member
+
+
+def read_manifest(path: str) -> dict[str, dict]:
+    """
+    Read the download manifest of a date, return a dictionary url -> manifest entry.
+    If a url appears more than once, the last entry is the valid one.
+    The lines that are not valid json, e.g. the last line of a run killed while appending it,
+    are logged and skipped, so their pdfs count as missing and are downloaded again.
+    """
+    manifest: dict[str, dict] = {}
+    if not isfile(path):
+        return manifest
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                manifest[entry["url"]] = entry
+            except (json.JSONDecodeError, TypeError, KeyError):
+                log_invalid_manifest_line(path, line_number)
+    return manifest
+
+
+def write_manifest(path: str, manifest: dict[str, dict]) -> None:
+    """
+    Write the download manifest of a date, with a single entry per url.
+    The manifest is written to a temporary file that then replaces the previous one,
+    so an interruption never leaves a half written manifest.
+    """
+    write_list_of_dict_to_jsonl(path + ".part", manifest.values())
+    replace(path + ".part", path)
+
+
+def get_file_sha256(path: str) -> str:
+    """Return the sha256 checksum of the contents of a file."""
+    with open(path, "rb") as file:
+        return file_digest(file, "sha256").hexdigest()
+
+
+def write_columns_to_parquet(
+    root_dir: str,
+    columns: dict[str, list],
+    partition_cols: list[str],
+) -> None:
+    """
+    Write the columns, a dictionary from column name to the list of its values,
+    to a parquet dataset, partitioned by the partition columns.
+    Each partition is a directory with the format root_dir/col1=value1/col2=value2/ .
+    Writing again to the same partitions replaces their previous contents.
+    The partition columns are only stored in the paths of the partitions, not in the files.
+    Requires the optional dependency pyarrow, if it is not installed log warning and return.
+    """
+    try:
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        log_missing_optional_dependency("pyarrow", "write parquet files")
+        return
+
+    pq.write_to_dataset(
+        pa.Table.from_pydict(columns),
+        root_dir,
+        partition_cols=partition_cols,
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
@@ -0,0 +1,100 @@
+"""
+Fixtures shared by the tests.
+The modules of src/borme are imported as the scripts import them,
+and every test writes to a temporary data directory instead of the real one.
+"""
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Callable, Iterator, NamedTuple
+
+import pytest
+
+# The paths of the data directory are read when utils.paths is imported
+os.environ["BORME_DATA_DIR"] = tempfile.mkdtemp(prefix="borme_tests_")
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "borme"))
+
+
+class StubResponse(NamedTuple):
+    """Status code, headers and body of a response of the stub server, sent after delay seconds"""
+
+    status_code: int = 200
+    headers: dict[str, str] = {}
+    body: bytes = b""
+    delay: float = 0
+
+
+class StubServer:
+    """
+    Local http server whose responses are chosen by the test, with respond(path, num_of_request).
+    It records the time of every request and the max number of simultaneous requests.
+    """
+
+    def __init__(self, respond: Callable[[str, int], StubResponse]) -> None:
+        self.respond = respond
+        self.requests: list[tuple[float, str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+            """Answer every request with the response chosen by the test"""
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """Send the response chosen by the test."""
+                with stub._lock:
+                    stub.requests.append((time.monotonic(), self.path))
+                    num_of_request = len(stub.requests)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    response = stub.respond(self.path, num_of_request)
+                    time.sleep(response.delay)
+                    self.send_response(response.status_code)
+                    for name, value in response.headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(response.body)))
+                    self.end_headers()
+                    self.wfile.write(response.body)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return StubHandler
+
+    def __enter__(self) -> "StubServer":
+        Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub_server() -> (
+    Iterator[Callable[[Callable[[str, int], StubResponse]], StubServer]]
+):
+    """Return a function that starts a stub server, stopped at the end of the test."""
+    servers: list[StubServer] = []
+
+    def start(respond: Callable[[str, int], StubResponse]) -> StubServer:
+        server = StubServer(respond).__enter__()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__()
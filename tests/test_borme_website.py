@@ -0,0 +1,87 @@
+"""Tests of the interactions with the BORME website: downloads of pdfs and links of the index page."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from conftest import StubResponse
+from utils.borme_website import (
+    download_pdfs,
+    extract_pdf_hrefs,
+    extract_pdf_hrefs_with_soup,
+)
+
+PDF_BODY = b"%PDF-1.4 stub"
+# Index page of a day, with the kinds of links found in the BORME website
+INDEX_PAGE = Path(__file__).parent / "data" / "borme_index_page.html"
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_downloads_share_the_limit_of_requests_per_host(
+    stub_server, tmp_path, use_async
+):
+    server = stub_server(lambda *_: StubResponse(200, body=PDF_BODY, delay=0.1))
+
+    def download_date(day: int) -> list[dict]:
+        data_dir = tmp_path / str(day)
+        data_dir.mkdir()
+        urls = [f"{server.url}/{day}/{i}.pdf" for i in range(6)]
+        return list(
+            download_pdfs(
+                urls,
+                data_dir,
+                date(2023, 11, day),
+                workers=4,
+                max_per_host=2,
+                retries=0,
+                use_async=use_async,
+            )
+        )
+
+    # Several dates downloaded at the same time, as with --concurrent-dates
+    with ThreadPoolExecutor(3) as executor:
+        entries = [e for es in executor.map(download_date, [27, 28, 29]) for e in es]
+
+    assert len(entries) == 18
+    assert all(entry["status"] == "complete" for entry in entries)
+    assert server.max_in_flight == 2
+
+
+def test_failed_downloads_are_retried(stub_server, tmp_path):
+    server = stub_server(
+        lambda _, n: StubResponse(503, {"Retry-After": "0"})
+        if n == 1
+        else StubResponse(200, body=PDF_BODY)
+    )
+    (entry,) = download_pdfs(
+        [f"{server.url}/a.pdf"], tmp_path, date(2023, 11, 27), retries=1, use_async=True
+    )
+    assert entry["status"] == "complete"
+    assert (tmp_path / "a.pdf").read_bytes() == PDF_BODY
+    assert len(server.requests) == 2
+
+
+def test_extract_pdf_hrefs_agrees_with_soup():
+    content = INDEX_PAGE.read_bytes()
+    hrefs = extract_pdf_hrefs(content)
+    assert hrefs == extract_pdf_hrefs_with_soup(content)
+    # The hrefs are returned as written in the page, in order, duplicates included
+    assert hrefs == [
+        "/borme/dias/2023/11/27/pdfs/BORME-S-2023-226.pdf",
+        "/borme/dias/2023/11/27/pdfs/BORME-A-2023-226-15.pdf",
+        "https://www.boe.es/borme/dias/2023/11/27/pdfs/BORME-A-2023-226-01.pdf",
+        "/borme/dias/2023/11/27/pdfs/BORME-A-2023-226-02.PDF",
+        "/borme/dias/2023/11/27/pdfs/BORME-A-2023-226-28.pdf",
+        "/borme/dias/2023/11/27/pdfs/BORME-A-2023-226-28.pdf",
+        "../pdfs/BORME-A-2023-226-29.pdf?v=2&dl=1",
+        "/borme/dias/2023/11/27/pdfs/BORME-C-2023-226.pdf",
+    ]
+
+
+def test_pages_that_are_not_utf8_fall_back_to_soup():
+    content = INDEX_PAGE.read_text(encoding="utf-8").encode("latin-1")
+    assert extract_pdf_hrefs(content) is None
+    assert extract_pdf_hrefs_with_soup(content) == extract_pdf_hrefs(
+        INDEX_PAGE.read_bytes()
+    )
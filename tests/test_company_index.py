@@ -0,0 +1,50 @@
+import json
+
+from utils.company_index import (
+    connect_to_company_index,
+    index_acts_file,
+    lookup_company,
+)
+
+
+def write_acts(path, names, borme_date="2023-11-27"):
+    with open(path, "w", encoding="utf-8") as file:
+        for i, name in enumerate(names):
+            act = {
+                "id": str(i),
+                "company_name": name,
+                "region_name": "MADRID",
+                "borme_date": borme_date,
+                "description": "",
+            }
+            file.write(json.dumps(act) + "\n")
+
+
+def test_names_left_without_acts_are_removed_when_a_date_is_indexed_again(tmp_path):
+    index_path, acts_path = str(tmp_path / "index.sqlite"), tmp_path / "acts.jsonl"
+    write_acts(tmp_path / "other_date.jsonl", ["ACME SL"], "2023-11-28")
+    index_acts_file(index_path, str(tmp_path / "other_date.jsonl"))
+    write_acts(acts_path, ["ACME SL", "GAMMA SA"])
+    index_acts_file(index_path, str(acts_path))
+
+    write_acts(acts_path, ["BETA SL"])
+    index_acts_file(index_path, str(acts_path))
+
+    connection = connect_to_company_index(index_path)
+    names = connection.execute("SELECT name FROM company_names ORDER BY name")
+    assert [name for (name,) in names] == ["ACME SL", "BETA SL"]
+    trigrams = connection.execute(
+        "SELECT name FROM company_names_fts WHERE company_names_fts MATCH 'gamma'"
+    )
+    assert trigrams.fetchall() == []
+    connection.close()
+
+
+def test_fuzzy_lookup_finds_names_with_typos(tmp_path):
+    index_path, acts_path = str(tmp_path / "index.sqlite"), tmp_path / "acts.jsonl"
+    write_acts(acts_path, ["CONSTRUCCIONES GARCIA SL", "ACME SL", "BETA SL"])
+    index_acts_file(index_path, str(acts_path))
+
+    rows = lookup_company(index_path, "construciones garcia", "fuzzy", limit=1)
+
+    assert [row["name"] for row in rows] == ["CONSTRUCCIONES GARCIA SL"]
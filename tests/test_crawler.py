@@ -0,0 +1,50 @@
+import json
+import logging
+from datetime import date
+
+import crawler
+from crawler import get_pdf_checksums, parse_pdf_cached
+from logs import log_unexpected_num_of_matches
+from utils.write_and_read_files import get_file_sha256
+
+
+def test_checksums_are_read_from_the_manifest_of_complete_downloads(tmp_path):
+    complete, changed = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    complete.write_bytes(b"pdf a")
+    changed.write_bytes(b"pdf b, changed after the download")
+    entries = [
+        {"url": "u/a", "file": "a.pdf", "status": "complete", "size": 5, "sha256": "x"},
+        {"url": "u/b", "file": "b.pdf", "status": "complete", "size": 5, "sha256": "y"},
+    ]
+    (tmp_path / "manifest.jsonl").write_text(
+        "".join(json.dumps(entry) + "\n" for entry in entries)
+    )
+
+    checksums = get_pdf_checksums(tmp_path, [str(complete), str(changed)])
+
+    assert checksums == {str(complete): "x", str(changed): get_file_sha256(changed)}
+
+
+def test_warnings_of_the_pdf_are_logged_again_when_its_acts_are_reused(
+    tmp_path, monkeypatch, caplog
+):
+    pdf = tmp_path / "BORME-A-2023-226-28.pdf"
+    pdf.write_bytes(b"pdf")
+    date_ = date(2023, 11, 27)
+    parsed = []
+
+    def parse_pdf(path, date_):
+        parsed.append(path)
+        log_unexpected_num_of_matches("cve", 1, 2, date_, path)
+        return []
+
+    monkeypatch.setattr(crawler, "parse_pdf", parse_pdf)
+    caplog.set_level(logging.WARNING)
+    for _ in range(2):
+        assert parse_pdf_cached(str(pdf), date_, checksum="abc") == []
+
+    assert len(parsed) == 1
+    warnings = [
+        r for r in caplog.records if r.funcName == "log_unexpected_num_of_matches"
+    ]
+    assert [r.args[2:] for r in warnings] == [("cve", 1, 2), ("cve", 1, 2)]
@@ -0,0 +1,72 @@
+"""Tests of the health of the daemon when the BORME website is down."""
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from conftest import StubResponse
+
+BORME_DIR = Path(__file__).parent.parent / "src" / "borme"
+
+
+def get_health(address: str) -> tuple[int, dict]:
+    """Return the status code and the counters of the health endpoint of the daemon."""
+    try:
+        with urllib.request.urlopen(f"{address}/health", timeout=5) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+@pytest.mark.parametrize("upstream", ["503", "refused"])
+def test_health_fails_when_the_website_is_down(stub_server, tmp_path, upstream):
+    if upstream == "503":
+        base_url = stub_server(lambda *_: StubResponse(503)).url
+    else:
+        # Nothing listens on port 1, the connections are refused
+        base_url = "http://127.0.0.1:1"
+
+    log_path = tmp_path / "daemon.log"
+    with open(log_path, "wb") as log_file:
+        daemon = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "daemon.py", "--interval", "1", "--port", "0"]
+            + ["--date", "20231127", "--retries", "0"],
+            cwd=BORME_DIR,
+            env={
+                **os.environ,
+                "BORME_DATA_DIR": str(tmp_path),
+                "BORME_BASE_URL": base_url,
+            },
+            stderr=log_file,
+        )
+    try:
+        # The address of the health endpoint is logged when the daemon starts
+        address = None
+        for _ in range(100):
+            if match := re.search(r"http://127\.0\.0\.1:\d+", log_path.read_text()):
+                address = match.group()
+                break
+            time.sleep(0.1)
+        assert address is not None, log_path.read_text()
+        started_at = time.monotonic()
+        assert get_health(address)[0] == 200
+
+        # Without a successful poll, the daemon is unhealthy after 3 intervals
+        status_code, counters = get_health(address)
+        while status_code == 200 and time.monotonic() - started_at < 10:
+            time.sleep(0.2)
+            status_code, counters = get_health(address)
+        assert status_code == 503
+        assert time.monotonic() - started_at >= 2
+        assert counters["failed_polls"] == counters["polls"] > 0
+        assert counters["last_success_at"] is None
+    finally:
+        daemon.terminate()
+        daemon.wait(10)
@@ -0,0 +1,17 @@
+import pytest
+from click.testing import CliRunner
+
+from cli import concurrent_dates_option, dates_cli, pipeline_option, stream_option
+from main import main
+
+
+@pytest.mark.parametrize(
+    "args", [["--pipeline", "--stream"], ["--pipeline", "--concurrent-dates", "2"]]
+)
+def test_options_ignored_by_the_pipeline_are_rejected(args):
+    cli = dates_cli(main, stream_option, pipeline_option, concurrent_dates_option)
+
+    result = CliRunner().invoke(cli, ["20231127", *args])
+
+    assert result.exit_code == 2
+    assert "--pipeline cannot be combined with" in result.output
@@ -0,0 +1,92 @@
+"""Tests of the retries with backoff and the rate limiting of the http requests."""
+import time
+from email.utils import formatdate
+
+import pytest
+from requests.exceptions import ConnectionError as RequestsConnectionError
+
+from conftest import StubResponse
+from utils import retries
+from utils.retries import TokenBucket, get_retry_delay, get_with_retries
+
+
+@pytest.fixture(autouse=True)
+def no_backoff_wait(monkeypatch):
+    """Keep the random backoff short, the Retry-After header is still honoured."""
+    monkeypatch.setattr(retries, "BACKOFF_BASE", 0.01)
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_temporary_errors_are_retried(stub_server, status_code):
+    server = stub_server(
+        lambda _, n: StubResponse(200, body=b"ok")
+        if n == 3
+        else StubResponse(status_code)
+    )
+    response = get_with_retries(f"{server.url}/page", retries=3)
+    assert response.status_code == 200
+    assert response.content == b"ok"
+    assert len(server.requests) == 3
+
+
+def test_last_response_is_returned_when_retries_run_out(stub_server):
+    server = stub_server(lambda *_: StubResponse(503))
+    response = get_with_retries(f"{server.url}/page", retries=2)
+    assert response.status_code == 503
+    assert len(server.requests) == 3
+
+
+def test_final_errors_are_not_retried(stub_server):
+    server = stub_server(lambda *_: StubResponse(404))
+    assert get_with_retries(f"{server.url}/page", retries=3).status_code == 404
+    assert len(server.requests) == 1
+
+
+def test_retry_after_is_honoured(stub_server):
+    server = stub_server(
+        lambda _, n: StubResponse(429, {"Retry-After": "1"})
+        if n == 1
+        else StubResponse(200)
+    )
+    assert get_with_retries(f"{server.url}/page", retries=1).status_code == 200
+    (first, _), (second, _) = server.requests
+    assert second - first >= 0.9
+
+
+def test_connection_errors_are_retried_then_raised(monkeypatch):
+    logged_retries = []
+    monkeypatch.setattr(
+        retries, "log_retrying_request", lambda *args: logged_retries.append(args)
+    )
+    # Nothing listens on port 1, the connections are refused
+    with pytest.raises(RequestsConnectionError):
+        get_with_retries("http://127.0.0.1:1/page", retries=2)
+    assert [attempt for _, attempt, _, _ in logged_retries] == [1, 2]
+
+
+def test_retry_delay():
+    assert get_retry_delay(0, "7") == 7
+    assert get_retry_delay(0, "100000") == retries.MAX_RETRY_AFTER
+    assert 8 <= get_retry_delay(0, formatdate(time.time() + 10, usegmt=True)) <= 10
+    # Without Retry-After, the delay is random up to an exponentially growing limit
+    for attempt in range(10):
+        limit = min(retries.MAX_BACKOFF, retries.BACKOFF_BASE * 2**attempt)
+        assert 0 <= get_retry_delay(attempt, "not a delay") <= limit
+
+
+def test_token_bucket_spaces_the_requests():
+    bucket = TokenBucket(rate=10)
+    delays = [bucket.reserve() for _ in range(5)]
+    # The first request uses the token in the bucket, the others wait their turn
+    assert delays[0] == 0
+    for expected, delay in zip([0.1, 0.2, 0.3, 0.4], delays[1:]):
+        assert delay == pytest.approx(expected, abs=0.01)
+    assert TokenBucket(rate=0).reserve() == 0
+
+
+def test_requests_to_a_host_are_rate_limited(stub_server):
+    server = stub_server(lambda *_: StubResponse(200))
+    for _ in range(5):
+        get_with_retries(f"{server.url}/page", rate=20)
+    times = [t for t, _ in server.requests]
+    assert times[-1] - times[0] >= 4 / 20 * 0.9
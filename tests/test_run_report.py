@@ -0,0 +1,15 @@
+from collections import Counter
+from datetime import date
+
+from utils.run_report import build_run_report, format_prometheus_metrics
+
+
+def test_metrics_have_no_date_label():
+    dates = [date(2023, 11, 27), date(2023, 11, 28)]
+    report = build_run_report("crawler", dates, [], Counter(), 0.0, 1.0)
+
+    metrics = format_prometheus_metrics(report, 1.0)
+
+    assert "date=" not in metrics
+    assert 'borme_run_dates_by_status{script="crawler",status="failed"} 2' in metrics
+    assert 'borme_run_dates_by_status{script="crawler",status="succeeded"} 0' in metrics
@@ -0,0 +1,131 @@
+"""Tests of the work queue shared by the workers of a distributed backfill."""
+import sqlite3
+import time
+from datetime import date
+
+import pytest
+
+from utils.work_queue import (
+    MAX_RETRY_DELAY,
+    claim_date,
+    connect_to_work_queue,
+    enqueue_dates,
+    get_queue_status,
+    release_date,
+    requeue_expired_leases,
+)
+
+DATE = date(2023, 11, 27)
+
+
+@pytest.fixture
+def queue_path(tmp_path) -> str:
+    """Return the path of a work queue with a single pending date."""
+    path = str(tmp_path / "work_queue.sqlite")
+    enqueue_dates(path, [DATE])
+    return path
+
+
+def expire_leases(path: str) -> None:
+    """Make every lease of the queue expire now."""
+    connection = connect_to_work_queue(path)
+    connection.execute("UPDATE work_items SET lease_expires_at = 0")
+    connection.close()
+
+
+def get_available_at(path: str) -> float:
+    """Return the time at which the date can be claimed again."""
+    connection = connect_to_work_queue(path)
+    (available_at,) = connection.execute(
+        "SELECT available_at FROM work_items"
+    ).fetchone()
+    connection.close()
+    return available_at
+
+
+def test_done_dates_are_never_claimed_again(queue_path):
+    assert claim_date(queue_path, "a", 60) == DATE
+    release_date(queue_path, DATE, "a", succeeded=True)
+    assert enqueue_dates(queue_path, [DATE]) == 0
+    assert claim_date(queue_path, "b", 60) is None
+    assert get_queue_status(queue_path)["done"] == 1
+
+
+def test_failed_dates_wait_for_a_growing_retry_delay(queue_path):
+    delays = []
+    for _ in range(3):
+        now = time.time()
+        assert claim_date(queue_path, "a", 60, max_attempts=10) == DATE
+        release_date(queue_path, DATE, "a", False, "error", 10, retry_delay=60)
+        delays.append(get_available_at(queue_path) - now)
+        # The date is pending, but not claimable until its delay is over
+        assert claim_date(queue_path, "b", 60, max_attempts=10) is None
+        assert get_queue_status(queue_path)["pending"] == 1
+
+        # Skip the delay
+        connection = connect_to_work_queue(queue_path)
+        connection.execute("UPDATE work_items SET available_at = 0")
+        connection.close()
+    assert [round(delay) for delay in delays] == [60, 120, 240]
+
+
+def test_retry_delay_is_capped(queue_path):
+    connection = connect_to_work_queue(queue_path)
+    connection.execute("UPDATE work_items SET attempts = 30")
+    connection.close()
+    assert claim_date(queue_path, "a", 60, max_attempts=100) == DATE
+    now = time.time()
+    release_date(queue_path, DATE, "a", False, "error", 100, retry_delay=60)
+    assert get_available_at(queue_path) - now <= MAX_RETRY_DELAY + 1
+
+
+def test_expired_leases_are_requeued_with_a_delay(queue_path):
+    assert claim_date(queue_path, "a", 60) == DATE
+    expire_leases(queue_path)
+    assert requeue_expired_leases(queue_path, max_attempts=3, retry_delay=60) == 1
+    assert get_queue_status(queue_path)["pending"] == 1
+    assert get_available_at(queue_path) > time.time() + 50
+    assert claim_date(queue_path, "b", 60) is None
+
+
+def test_expired_leases_of_exhausted_dates_fail(queue_path):
+    for _ in range(2):
+        assert claim_date(queue_path, "a", 60, max_attempts=2) == DATE
+        expire_leases(queue_path)
+        requeue_expired_leases(queue_path, max_attempts=2, retry_delay=0)
+    assert get_queue_status(queue_path) == {
+        "pending": 0,
+        "leased": 0,
+        "done": 0,
+        "failed": 1,
+    }
+    assert claim_date(queue_path, "b", 60, max_attempts=2) is None
+
+
+def test_lost_leases_cannot_release_the_date(queue_path):
+    assert claim_date(queue_path, "a", 60) == DATE
+    expire_leases(queue_path)
+    # Another worker claims the expired lease, the first worker cannot mark it as done
+    assert claim_date(queue_path, "b", 60) == DATE
+    release_date(queue_path, DATE, "a", succeeded=True)
+    assert get_queue_status(queue_path)["leased"] == 1
+
+
+def test_queues_without_the_retry_delay_are_migrated(tmp_path):
+    path = str(tmp_path / "old_queue.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        """
+        CREATE TABLE work_items (
+            borme_date TEXT PRIMARY KEY, status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT, lease_expires_at REAL, attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT, updated_at REAL NOT NULL
+        )
+        """
+    )
+    connection.execute(
+        "INSERT INTO work_items VALUES ('2023-11-27', 'pending', NULL, NULL, 0, NULL, 0)"
+    )
+    connection.commit()
+    connection.close()
+    assert claim_date(path, "a", 60) == DATE
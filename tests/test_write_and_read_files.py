@@ -0,0 +1,29 @@
+"""Tests of the reading and writing of the data files."""
+import json
+
+from utils.write_and_read_files import append_dict_to_jsonl, read_manifest
+
+
+def test_truncated_manifest_lines_are_skipped(tmp_path, caplog):
+    path = str(tmp_path / "manifest.jsonl")
+    complete = {"url": "http://a/1.pdf", "file": "1.pdf", "status": "complete"}
+    append_dict_to_jsonl(path, complete)
+    # The run was killed while appending the second entry
+    second = json.dumps(
+        {"url": "http://a/2.pdf", "file": "2.pdf", "status": "complete"}
+    )
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(second[: len(second) // 2])
+
+    assert read_manifest(path) == {"http://a/1.pdf": complete}
+    assert "line 2 of the manifest" in caplog.text
+
+
+def test_entries_without_url_are_skipped(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    path.write_text('[1, 2]\n{"file": "1.pdf"}\n\n{"url": "u", "status": "failed"}\n')
+    assert read_manifest(str(path)) == {"u": {"url": "u", "status": "failed"}}
+
+
+def test_missing_manifest_is_empty(tmp_path):
+    assert read_manifest(str(tmp_path / "manifest.jsonl")) == {}